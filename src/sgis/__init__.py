@@ -41,6 +41,7 @@ from .networkanalysis import NetworkAnalysis
 from .networkanalysisrules import NetworkAnalysisRules
 from .overlay import clean_shapely_overlay, overlay, overlay_update
 from .read_parquet import read_parquet_url
+from .runner import run_in_shards
 
 
 try:
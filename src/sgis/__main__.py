@@ -0,0 +1,8 @@
+"""Command line entry point, running a network analysis in shards.
+
+See sgis.runner.main, or run 'python -m sgis --help'.
+"""
+from .runner import main
+
+
+main()
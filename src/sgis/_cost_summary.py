@@ -0,0 +1,135 @@
+"""Summary statistics of network analysis costs that come in chunks."""
+import numpy as np
+import pandas as pd
+
+
+# values below this are counted as zeros in the QuantileSketch, which limits the
+# number of buckets
+_SMALLEST_NONZERO = 1e-9
+
+
+class CostSummary:
+    """Running count, mean, standard deviation and quantiles of a cost column.
+
+    The chunks are merged with Chan's parallel algorithm, so the mean and standard
+    deviation are the same as if calculated from all costs at once, without keeping
+    the costs in memory. The quantiles are estimated with a QuantileSketch.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.n_missing = 0
+        self.mean = 0.0
+        self._sum_sq_diff = 0.0
+        self.sketch = QuantileSketch()
+
+    def update(self, costs: pd.Series | np.ndarray) -> None:
+        costs = np.asarray(costs, dtype=float)
+        is_nan = np.isnan(costs)
+        self.n += len(costs)
+        self.n_missing += int(is_nan.sum())
+
+        costs = costs[~is_nan]
+        if not len(costs):
+            return
+
+        self.sketch.update(costs)
+
+        n_before = self.n_valid - len(costs)
+        chunk_mean = costs.mean()
+        delta = chunk_mean - self.mean
+        self.mean += delta * len(costs) / self.n_valid
+        chunk_sum_sq_diff = ((costs - chunk_mean) ** 2).sum()
+        self._sum_sq_diff += (
+            chunk_sum_sq_diff + delta**2 * n_before * len(costs) / self.n_valid
+        )
+
+    @property
+    def n_valid(self) -> int:
+        return self.n - self.n_missing
+
+    def to_dict(self, detailed: bool = False) -> dict:
+        """Log values with the same names and definitions as from a DataFrame."""
+        summary = {
+            "percent_missing": self.n_missing / self.n * 100 if self.n else np.nan,
+            "cost_mean": self.mean if self.n_valid else np.nan,
+        }
+        if detailed:
+            summary["cost_p25"] = self.sketch.quantile(0.25)
+            summary["cost_median"] = self.sketch.quantile(0.5)
+            summary["cost_p75"] = self.sketch.quantile(0.75)
+            summary["cost_std"] = (
+                np.sqrt(self._sum_sq_diff / (self.n_valid - 1))
+                if self.n_valid > 1
+                else np.nan
+            )
+        return summary
+
+
+class QuantileSketch:
+    """Sketch of the quantiles of non-negative values.
+
+    The values are counted in buckets with logarithmically increasing widths, like
+    in DDSketch, so that the estimated quantiles are within 'relative_accuracy' of
+    the true values, no matter how many values are added. Zeros, and values too small
+    to be distinguished from zero, are counted separately. The values can be added
+    in chunks, which gives the same sketch as if all values were added at once.
+
+    Args:
+        relative_accuracy: the highest relative error of the quantiles. Defaults to
+            0.001, meaning a 10 minute quantile is estimated within 0.01 minutes.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.001):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+        self.n = 0
+        self.n_zero = 0
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._first_key = 0
+
+    def update(self, values: np.ndarray) -> None:
+        """Add non-negative values without NaNs to the sketch."""
+        values = np.asarray(values, dtype=float)
+        is_zero = values < _SMALLEST_NONZERO
+        self.n += len(values)
+        self.n_zero += int(is_zero.sum())
+
+        keys = np.ceil(np.log(values[~is_zero]) / self._log_gamma).astype(np.int64)
+        if len(keys):
+            first_key = keys.min()
+            self._add_counts(first_key, np.bincount(keys - first_key))
+
+    def quantile(self, q: float) -> float:
+        """Estimate the quantile with linear interpolation between closest ranks."""
+        if not self.n:
+            return np.nan
+
+        rank = q * (self.n - 1)
+        lower = self._value_at_rank(int(np.floor(rank)))
+        upper = self._value_at_rank(int(np.ceil(rank)))
+        return lower + (upper - lower) * (rank - np.floor(rank))
+
+    def _value_at_rank(self, rank: int) -> float:
+        if rank < self.n_zero:
+            return 0.0
+        i = np.searchsorted(np.cumsum(self._counts), rank - self.n_zero, side="right")
+        key = self._first_key + i
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+    def _add_counts(self, first_key: int, counts: np.ndarray) -> None:
+        """Add bucket counts starting at first_key, widening the buckets if needed."""
+        if not len(self._counts):
+            self._first_key = first_key
+            self._counts = counts.astype(np.int64)
+            return
+
+        start = min(self._first_key, first_key)
+        end = max(self._first_key + len(self._counts), first_key + len(counts))
+        merged = np.zeros(end - start, dtype=np.int64)
+        merged[
+            self._first_key - start : self._first_key - start + len(self._counts)
+        ] += self._counts
+        merged[first_key - start : first_key - start + len(counts)] += counts
+        self._first_key = start
+        self._counts = merged
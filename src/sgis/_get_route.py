@@ -1,15 +1,22 @@
 import warnings
 
+import numpy as np
 import pandas as pd
 from geopandas import GeoDataFrame
 from igraph import Graph
+from shapely import reverse
 
 from .geopandas_utils import gdf_concat
-from .network import _edge_ids
+from .network import _backward_edge_ids, _edge_ids, _get_backward_weights
 
 
 # run functions for get_route, get_k_routes and get_route_frequencies
 
+_NO_PATHS_ERROR = (
+    "No paths were found. Try larger search_tolerance or search_factor. "
+    "Or close_network_holes() or remove_isolated()."
+)
+
 # TODO: clean up this mess, make smaller base functions and three nicely separated
 
 
@@ -25,11 +32,14 @@ def _get_route(
     rowwise: bool = False,
     k: int = 1,
     drop_middle_percent: int = 0,
+    raise_if_empty: bool = True,
 ):
     """Super function used in the NetworkAnalysis class.
 
     Big, ugly super function that is used in the get_route, get_k_routes
-    and get_route_frequencies methods of the NetworkAnalysis class.
+    and get_route_frequencies methods of the NetworkAnalysis class. If no paths are
+    found and raise_if_empty is False, None is returned. With summarise, a Series of
+    the number of visits per edge id is returned.
     """
     warnings.filterwarnings("ignore", category=RuntimeWarning)
 
@@ -38,50 +48,75 @@ def _get_route(
     else:
         func = _run_get_route
 
-    resultlist: list[GeoDataFrame] = []
+    # identical locations share one vertex, so the routes are found once per vertex
+    # pair and then expanded to the rows with the same locations
     if rowwise:
-        for ori_id, des_id in zip(origins["temp_idx"], destinations["temp_idx"]):
-            resultlist = resultlist + func(
-                ori_id, des_id, graph, roads, summarise, weight, k, drop_middle_percent
-            )
+        row_pairs = pd.DataFrame(
+            {
+                "origin": origins["temp_idx"].values,
+                "destination": destinations["temp_idx"].values,
+                "ori_vertex": origins["temp_vertex"].values,
+                "des_vertex": destinations["temp_vertex"].values,
+            }
+        )
+        vertex_pairs = row_pairs.groupby(
+            ["ori_vertex", "des_vertex"], sort=False
+        ).size()
     else:
-        for ori_id in origins["temp_idx"]:
-            for des_id in destinations["temp_idx"]:
-                resultlist = resultlist + func(
-                    ori_id,
-                    des_id,
-                    graph,
-                    roads,
-                    summarise,
-                    weight,
-                    k,
-                    drop_middle_percent,
-                )
+        ori_n = origins.groupby("temp_vertex", sort=False).size()
+        des_n = destinations.groupby("temp_vertex", sort=False).size()
+        vertex_pairs = pd.Series(
+            np.outer(ori_n.values, des_n.values).ravel(),
+            index=pd.MultiIndex.from_product([ori_n.index, des_n.index]),
+        )
+
+    resultlist: list[GeoDataFrame] = []
+    for (ori_id, des_id), n in vertex_pairs.items():
+        result = func(
+            ori_id, des_id, graph, roads, summarise, weight, k, drop_middle_percent
+        )
+        if summarise:
+            result = [df.assign(n=n) for df in result]
+        resultlist = resultlist + result
 
+    # with summarise, the number of times each edge is visited is returned, indexed
+    # by the edge ids
     if summarise:
-        counted = (
+        if not resultlist:
+            if not raise_if_empty:
+                return None
+            raise ValueError(_NO_PATHS_ERROR)
+
+        return (
             pd.concat(resultlist, ignore_index=True)
-            .assign(n=1)
             .groupby("source_target_weight")["n"]
-            .count()
+            .sum()
         )
 
-        roads["source_target_weight"] = _edge_ids(roads, weight)
-
-        roads["n"] = roads["source_target_weight"].map(counted)
-
-        roads_visited = roads.loc[
-            roads.n.notna(), roads.columns.difference(["source_target_weight"])
-        ]
-
-        return roads_visited
-
     try:
         results: GeoDataFrame = gdf_concat(resultlist)
     except Exception:
-        raise ValueError(
-            "No paths were found. Try larger search_tolerance or search_factor. "
-            "Or close_network_holes() or remove_isolated()."
+        if not raise_if_empty:
+            return None
+        raise ValueError(_NO_PATHS_ERROR)
+
+    results = results.rename(
+        columns={"origin": "ori_vertex", "destination": "des_vertex"}
+    )
+
+    if rowwise:
+        results = results.merge(row_pairs, on=["ori_vertex", "des_vertex"])
+    else:
+        results = results.merge(
+            origins[["temp_vertex", "temp_idx"]].rename(
+                columns={"temp_vertex": "ori_vertex", "temp_idx": "origin"}
+            ),
+            on="ori_vertex",
+        ).merge(
+            destinations[["temp_vertex", "temp_idx"]].rename(
+                columns={"temp_vertex": "des_vertex", "temp_idx": "destination"}
+            ),
+            on="des_vertex",
         )
 
     if cutoff:
@@ -129,6 +164,10 @@ def _run_get_route(
         ["geometry", weight, "source_target_weight"],
     ]
 
+    backward_lines = _get_backward_lines(roads, weight, source_target_weight)
+    if len(backward_lines):
+        line = pd.concat([line, backward_lines])
+
     # if len(line) != len(source_target_weight) - 2:
     #    raise ValueError("length mismatch", len(line), len(source_target_weight))
 
@@ -145,7 +184,30 @@ def _run_get_route(
     if k == 1:
         return [line]
     else:
-        return [line], graph.es[res[0]]["edge_tuples"]
+        return [line], source_target_weight
+
+
+def _get_backward_lines(
+    roads: GeoDataFrame, weight: str, source_target_weight: list[str]
+) -> GeoDataFrame:
+    """Get the lines going both ways that are used backwards in the route.
+
+    The lines are stored once for both directions, so the geometries are reversed
+    here, and only for the lines in the route.
+    """
+    rows, backward_edge_ids = _backward_edge_ids(roads, weight)
+    is_used = np.isin(backward_edge_ids, source_target_weight)
+    rows = rows[is_used]
+
+    return GeoDataFrame(
+        {
+            weight: _get_backward_weights(roads, weight)[rows],
+            "source_target_weight": np.array(backward_edge_ids, dtype=object)[is_used],
+        },
+        geometry=reverse(roads.geometry.values[rows]),
+        index=roads.index[rows],
+        crs=roads.crs,
+    )
 
 
 def _run_get_k_routes(
@@ -174,19 +236,20 @@ def _run_get_k_routes(
         if not isinstance(line, tuple):
             continue
 
-        line, edge_tuples = line
+        line, edge_ids = line
         line = line[0]
         line["k"] = i + 1
 
         lines.append(line)
 
-        keep_n = (len(edge_tuples) - len(edge_tuples) * drop_middle_percent / 100) / 2
+        keep_n = (len(edge_ids) - len(edge_ids) * drop_middle_percent / 100) / 2
 
         keep_n = int(round(keep_n, 0))
 
         keep_n = 1 if not keep_n else keep_n
 
-        to_be_dropped = edge_tuples[keep_n:-keep_n]
-        graph.delete_edges(to_be_dropped)
+        # deleting by id removes both directions of lines in undirected networks
+        to_be_dropped = set(edge_ids[keep_n:-keep_n])
+        graph.delete_edges(graph.es.select(source_target_weight_in=to_be_dropped))
 
     return lines
@@ -4,7 +4,174 @@ import pandas as pd
 from geopandas import GeoDataFrame
 from igraph import Graph
 from pandas import DataFrame
-from shapely import shortest_line
+from scipy.sparse import csr_matrix
+from shapely import get_coordinates, linestrings
+
+
+# number of origins searched at a time when only the upper triangle is calculated
+_SYMMETRIC_CHUNK_SIZE = 250
+
+
+def _get_search_direction(origins: GeoDataFrame, destinations: GeoDataFrame) -> str:
+    """Choose to search from the origins or destinations, whichever are fewest.
+
+    One shortest path search is run for each unique location, so the costs are
+    calculated fastest from the side with the fewest locations. Searching from the
+    destinations means following the edges backwards in a directed graph.
+    """
+    if destinations["temp_vertex"].nunique() < origins["temp_vertex"].nunique():
+        return "destinations"
+    return "origins"
+
+
+def _is_symmetric(
+    directed: bool,
+    origins: GeoDataFrame,
+    destinations: GeoDataFrame,
+    ori_codes: np.ndarray,
+    des_codes: np.ndarray,
+    rowwise: bool,
+) -> bool:
+    """Check if the cost matrix is symmetric.
+
+    This is the case when the network is undirected and the origins and
+    destinations are the same points in the same order. The origin and destination
+    vertices are then connected to the network in the same way, so the cost from
+    origin i to destination j equals the cost from origin j to destination i.
+
+    The matrix formats use the symmetry per chunk of origins. The long format only
+    uses it when all origins are run at once, not when the results are written in
+    chunks to a sink or reported to a progress_hook.
+    """
+    if directed or rowwise or len(origins) != len(destinations):
+        return False
+    if not np.array_equal(ori_codes, des_codes):
+        return False
+    return np.array_equal(
+        get_coordinates(origins.geometry.values),
+        get_coordinates(destinations.geometry.values),
+    )
+
+
+def _get_symmetric_distances(
+    graph: Graph, ori_vertices: pd.Index, des_vertices: pd.Index
+) -> np.ndarray:
+    """Calculate the upper triangle of a symmetric cost matrix and mirror it.
+
+    The origins are searched in chunks, each only to the destinations from the
+    chunk's first index and onwards. The searches end when all targets are reached,
+    so later chunks finish quickly, and the lists returned from igraph are half the
+    size. The chunks are searched one after the other. Running origins in parallel
+    is done with run_jobs or run_in_shards.
+    """
+    n = len(ori_vertices)
+    distances = np.empty((n, n), dtype=float)
+
+    for start in range(0, n, _SYMMETRIC_CHUNK_SIZE):
+        end = min(start + _SYMMETRIC_CHUNK_SIZE, n)
+        upper = np.array(
+            graph.distances(
+                weights="weight",
+                source=list(ori_vertices[start:end]),
+                target=list(des_vertices[start:]),
+            ),
+            dtype=float,
+        )
+        distances[start:, start:end] = upper.T
+        distances[start:end, start:] = upper
+
+    return distances
+
+
+def _od_cost_array(
+    distances: np.ndarray,
+    origins: GeoDataFrame,
+    destinations: GeoDataFrame,
+    ori_codes: np.ndarray,
+    des_codes: np.ndarray,
+    *,
+    cutoff: int | None,
+    destination_count: int | None,
+    sparse: bool,
+) -> np.ndarray | csr_matrix:
+    """Expand the vertex distances to a float32 matrix with a row per origin.
+
+    Trips removed by cutoff or destination_count are set to NaN, and NaNs are left
+    out of the matrix if sparse is True. The same rules as for the long format
+    apply, so the matrix holds the same costs as the od_cost_matrix DataFrame.
+    """
+    # filtering before the float32 conversion, so rounding doesn't change the result
+    distances = np.where(np.isinf(distances), np.nan, distances)
+
+    if cutoff:
+        distances[~(distances < cutoff)] = np.nan
+
+    costs = distances.astype(np.float32)[ori_codes][:, des_codes]
+
+    if destination_count:
+        ranks = pd.DataFrame(distances[ori_codes][:, des_codes]).rank(axis=1).values
+        costs[~(ranks <= destination_count)] = np.nan
+
+    # zero cost between identical locations, for the trips that are kept
+    ori_pos, des_pos = _get_identical_locations(origins, destinations)
+    if cutoff or destination_count:
+        is_kept = ~np.isnan(costs[ori_pos, des_pos])
+        ori_pos, des_pos = ori_pos[is_kept], des_pos[is_kept]
+    costs[ori_pos, des_pos] = 0
+
+    if not sparse:
+        return costs
+
+    rows, cols = np.nonzero(~np.isnan(costs))
+    return csr_matrix((costs[rows, cols], (rows, cols)), shape=costs.shape)
+
+
+def _mirror_lower_triangle(
+    matrix: csr_matrix, first_columns: np.ndarray, n_rows_done: int
+) -> csr_matrix:
+    """Fill the lower triangle of a symmetric sparse cost matrix from its upper part.
+
+    Each row is calculated from the column in 'first_columns' and onwards, so the
+    costs to the columns before are taken from the rows of these columns. Only the
+    rows that are done are filled.
+    """
+    upper = matrix.tocoo()
+    is_mirrored = (upper.row < first_columns[upper.col]) & (upper.col < n_rows_done)
+
+    return csr_matrix(
+        (
+            np.concatenate([upper.data, upper.data[is_mirrored]]),
+            (
+                np.concatenate([upper.row, upper.col[is_mirrored]]),
+                np.concatenate([upper.col, upper.row[is_mirrored]]),
+            ),
+        ),
+        shape=matrix.shape,
+    )
+
+
+def _get_identical_locations(
+    origins: GeoDataFrame, destinations: GeoDataFrame
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get the positions of origin-destination pairs with identical coordinates."""
+    ori_coords = get_coordinates(origins.geometry.values)
+    des_coords = get_coordinates(destinations.geometry.values)
+
+    _, location = np.unique(
+        np.concatenate([ori_coords, des_coords]), axis=0, return_inverse=True
+    )
+    location = location.ravel()
+
+    pairs = pd.merge(
+        pd.DataFrame(
+            {"location": location[: len(ori_coords)], "ori": range(len(ori_coords))}
+        ),
+        pd.DataFrame(
+            {"location": location[len(ori_coords) :], "des": range(len(des_coords))}
+        ),
+        on="location",
+    )
+    return pairs["ori"].values, pairs["des"].values
 
 
 def _od_cost_matrix(
@@ -17,38 +184,73 @@ def _od_cost_matrix(
     rowwise: bool = False,
     cutoff: int | None = None,
     destination_count: int | None = None,
-) -> DataFrame | GeoDataFrame:
+    search_from: str = "origins",
+    output: str = "long",
+    directed: bool = True,
+) -> DataFrame | GeoDataFrame | np.ndarray | csr_matrix:
     if rowwise and len(origins) != len(destinations):
         raise ValueError(
             "'origins' and 'destinations' must have the same length when rowwise=True"
         )
 
-    results = graph.distances(
-        weights="weight",
-        source=origins["temp_idx"],
-        target=destinations["temp_idx"],
-    )
+    # identical locations share one vertex, so each vertex is only searched once
+    ori_codes, ori_vertices = pd.factorize(origins["temp_vertex"])
+    des_codes, des_vertices = pd.factorize(destinations["temp_vertex"])
 
-    ori_idx, des_idx, costs = [], [], []
-    for i, f_idx in enumerate(origins["temp_idx"]):
-        for ii, t_idx in enumerate(destinations["temp_idx"]):
-            ori_idx.append(f_idx)
-            des_idx.append(t_idx)
-            costs.append(results[i][ii])
-
-    results = (
-        pd.DataFrame(data={"origin": ori_idx, "destination": des_idx, weight: costs})
-        .replace([np.inf, -np.inf], np.nan)
-        .reset_index(drop=True)
-    )
+    if _is_symmetric(directed, origins, destinations, ori_codes, des_codes, rowwise):
+        distances = _get_symmetric_distances(graph, ori_vertices, des_vertices)
+    elif search_from == "destinations":
+        # following the edges backwards from the destinations gives the same costs
+        # as searching from the origins
+        distances = np.array(
+            graph.distances(
+                weights="weight",
+                source=list(des_vertices),
+                target=list(ori_vertices),
+                mode="in",
+            ),
+            dtype=float,
+        ).T
+    else:
+        distances = np.array(
+            graph.distances(
+                weights="weight",
+                source=list(ori_vertices),
+                target=list(des_vertices),
+            ),
+            dtype=float,
+        )
 
-    # calculating all-to-all distances is much faster than looping rowwise,
-    # so doing the rowwise-filtering down here
-    if rowwise:
-        results_template = DataFrame(
-            {"origin": origins["temp_idx"], "destination": destinations["temp_idx"]}
+    if output != "long":
+        return _od_cost_array(
+            distances,
+            origins,
+            destinations,
+            ori_codes,
+            des_codes,
+            cutoff=cutoff,
+            destination_count=destination_count,
+            sparse=output == "sparse",
         )
-        results = results_template.merge(results, on=["origin", "destination"])
+
+    # expand the vertex distances to all rows of origins and destinations. The
+    # positions of the points are kept to get their coordinates after filtering
+    if rowwise:
+        costs = distances[ori_codes, des_codes]
+        ori_pos = np.arange(len(origins))
+        des_pos = np.arange(len(destinations))
+    else:
+        costs = distances[ori_codes][:, des_codes].ravel()
+        ori_pos = np.repeat(np.arange(len(origins)), len(destinations))
+        des_pos = np.tile(np.arange(len(destinations)), len(origins))
+
+    results = pd.DataFrame(
+        data={
+            "origin": origins["temp_idx"].values[ori_pos],
+            "destination": destinations["temp_idx"].values[des_pos],
+            weight: costs,
+        }
+    ).replace([np.inf, -np.inf], np.nan)
 
     if cutoff:
         results = results[results[weight] < cutoff]
@@ -58,28 +260,15 @@ def _od_cost_matrix(
         weight_ranked = results.groupby("origin")[weight].rank()
         results = results.loc[weight_ranked <= destination_count]
 
-    wkt_dict_origin = {
-        idx: geom.wkt
-        for idx, geom in zip(origins["temp_idx"], origins.geometry, strict=True)
-    }
-    wkt_dict_destination = {
-        idx: geom.wkt
-        for idx, geom in zip(
-            destinations["temp_idx"], destinations.geometry, strict=True
-        )
-    }
-    results["wkt_ori"] = results["origin"].map(wkt_dict_origin)
-    results["wkt_des"] = results["destination"].map(wkt_dict_destination)
+    ori_coords = get_coordinates(origins.geometry.values)[ori_pos[results.index]]
+    des_coords = get_coordinates(destinations.geometry.values)[des_pos[results.index]]
 
-    results[weight] = np.where(results.wkt_ori == results.wkt_des, 0, results[weight])
+    is_same_location = (ori_coords == des_coords).all(axis=1)
+    results[weight] = np.where(is_same_location, 0, results[weight])
 
     # straight lines between origin and destination
     if lines:
-        origin = gpd.GeoSeries.from_wkt(results["wkt_ori"], crs=25833)
-        destination = gpd.GeoSeries.from_wkt(results["wkt_des"], crs=25833)
-        results["geometry"] = shortest_line(origin, destination)
-        results = gpd.GeoDataFrame(results, geometry="geometry", crs=25833)
-
-    results = results.drop(["wkt_ori", "wkt_des"], axis=1, errors="ignore")
+        results["geometry"] = linestrings(np.stack([ori_coords, des_coords], axis=1))
+        results = gpd.GeoDataFrame(results, geometry="geometry", crs=origins.crs)
 
     return results.reset_index(drop=True)
@@ -0,0 +1,154 @@
+"""Writing network analysis results to parquet, or memory, one chunk at a time."""
+import json
+from typing import IO
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow as pa
+from geopandas import GeoDataFrame, GeoSeries
+from pandas import DataFrame
+from pyarrow import parquet
+
+
+# the geoparquet version of the metadata written by geopandas 0.12
+_GEOPARQUET_VERSION = "0.4.0"
+
+
+class ParquetSink:
+    """Writes (Geo)DataFrames to a parquet file, one row group per DataFrame.
+
+    The parquet schema is taken from the first DataFrame written. Geometries are
+    stored as WKB with geoparquet metadata, so the file can be read with
+    geopandas.read_parquet. The metadata is made like in geopandas.to_parquet, but
+    without the bounding box, since it would only cover the first chunk.
+
+    Args:
+        sink: path to a local parquet file, or a writable file object, e.g. from the
+            open method of an fsspec filesystem.
+    """
+
+    def __init__(self, sink: str | IO):
+        self.sink = sink
+        self._writer: parquet.ParquetWriter | None = None
+        self.n_rows = 0
+
+    def write(self, df: DataFrame | GeoDataFrame) -> None:
+        table = self._to_arrow(df)
+
+        if self._writer is None:
+            self._writer = parquet.ParquetWriter(
+                self.sink, table.schema, compression="snappy"
+            )
+        else:
+            table = table.cast(self._writer.schema)
+
+        self._writer.write_table(table, row_group_size=max(len(table), 1))
+        self.n_rows += len(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self) -> "ParquetSink":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @staticmethod
+    def _to_arrow(df: DataFrame | GeoDataFrame) -> pa.Table:
+        if not isinstance(df, GeoDataFrame):
+            return pa.Table.from_pandas(df, preserve_index=False)
+
+        df = df.reset_index(drop=True)
+        table = pa.Table.from_pandas(df.to_wkb(), preserve_index=False)
+
+        geo = {
+            "primary_column": df.geometry.name,
+            "columns": {
+                col: _geometry_metadata(df[col])
+                for col in df.columns[df.dtypes == "geometry"]
+            },
+            "version": _GEOPARQUET_VERSION,
+            "creator": {"library": "geopandas", "version": gpd.__version__},
+        }
+
+        return table.replace_schema_metadata(
+            {**table.schema.metadata, b"geo": json.dumps(geo).encode("utf-8")}
+        )
+
+
+class MemorySink:
+    """Collects (Geo)DataFrames in memory, with the same interface as ParquetSink.
+
+    Used when results are calculated in chunks, but should be returned, not written.
+    """
+
+    def __init__(self):
+        self._chunks: list[DataFrame | GeoDataFrame] = []
+        self.n_rows = 0
+
+    def write(self, df: DataFrame | GeoDataFrame) -> None:
+        self._chunks.append(df)
+        self.n_rows += len(df)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "MemorySink":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def result(self) -> DataFrame | GeoDataFrame | None:
+        """The chunks concatenated, with a new index. None if nothing was written."""
+        if not self._chunks:
+            return None
+        if len(self._chunks) == 1:
+            return self._chunks[0]
+        return pd.concat(self._chunks, ignore_index=True)
+
+
+def _geometry_metadata(geometries: GeoSeries) -> dict:
+    """The geoparquet metadata of a geometry column, without the bounding box."""
+    geometry_types = sorted(geometries.geom_type.dropna().unique())
+    return {
+        "encoding": "WKB",
+        "crs": _crs_to_json(geometries.crs) if geometries.crs else None,
+        "geometry_type": (
+            geometry_types[0] if len(geometry_types) == 1 else geometry_types
+        ),
+    }
+
+
+def _crs_to_json(crs) -> dict:
+    """The crs as PROJJSON, without the ids of datum ensemble members.
+
+    Like in geopandas.to_parquet, the ids are removed, since older PROJ versions
+    don't recognize the ids added in more recent PROJ databases.
+    """
+    json_dict = crs.to_json_dict()
+
+    def remove_member_ids(value) -> None:
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key == "members" and isinstance(item, list):
+                    for member in item:
+                        member.pop("id", None)
+                else:
+                    remove_member_ids(item)
+
+    remove_member_ids(json_dict)
+    return json_dict
+
+
+def _read_sink(path: str) -> DataFrame | GeoDataFrame:
+    """Read a parquet file written by ParquetSink.
+
+    Tables without geometries are converted to pandas column by column, freeing the
+    arrow memory along the way, so the data is only held in memory about once.
+    """
+    if b"geo" in (parquet.read_schema(path).metadata or {}):
+        return gpd.read_parquet(path)
+    return parquet.read_table(path).to_pandas(self_destruct=True, split_blocks=True)
@@ -1,9 +1,11 @@
 import numpy as np
+import pandas as pd
 from geopandas import GeoDataFrame
 from pandas import DataFrame
+from shapely import get_coordinates
 
-from .neighbors import get_k_nearest_neighbors
 from .helpers import return_two_vals
+from .network import Network
 from .networkanalysisrules import NetworkAnalysisRules
 
 
@@ -56,9 +58,13 @@ class Points:
     def _make_temp_idx(self) -> None:
         """Make a temporary id column thad don't overlap with the node ids.
 
-        The original ids are stored in a dict and mapped back to the results in the
-        end. This method has to be run after _get_id_col, because this determines the
-        id column differently for origins and destinations.
+        The original ids are taken back to the results in the end with _get_ids.
+        This method has to be run after _get_id_col, because this determines the id
+        column differently for origins and destinations.
+
+        Points with identical coordinates share the same graph vertex, which is stored
+        in the column 'temp_vertex' as the temp_idx of the first of the points. This
+        way, each location is only snapped to the network and searched from once.
         """
 
         self.gdf["temp_idx"] = np.arange(
@@ -66,18 +72,42 @@ class Points:
         )
         self.gdf["temp_idx"] = self.gdf["temp_idx"].astype(str)
 
-        if self.id_col:
-            self.id_dict = {
-                temp_idx: idx
-                for temp_idx, idx in zip(
-                    self.gdf.temp_idx, self.gdf[self.id_col], strict=True
-                )
-            }
+        coords = get_coordinates(self.gdf.geometry.values)
+        _, first_idx, inverse = np.unique(
+            coords, axis=0, return_index=True, return_inverse=True
+        )
+        self.gdf["temp_vertex"] = self.gdf["temp_idx"].values[first_idx[inverse]]
+
+    def _get_ids(self, temp_idx: pd.Series) -> np.ndarray | pd.Categorical:
+        """Get the ids of the points from their temporary ids.
+
+        The temporary ids are consecutive, so the ids can be taken from the position
+        of the points. Text ids are returned as a Categorical, and the row number of
+        the points is returned if there is no id column.
+        """
+        positions = temp_idx.astype(int).values - self.temp_idx_start
+
+        if not self.id_col:
+            return positions
+
+        ids = self.gdf[self.id_col]
+
+        if not pd.api.types.is_object_dtype(ids):
+            return ids.values[positions]
+
+        codes, categories = pd.factorize(ids)
+        return pd.Categorical.from_codes(codes[positions], categories=categories)
+
+    @property
+    def vertices(self) -> GeoDataFrame:
+        """The points with unique locations, i.e. one row per graph vertex."""
+        return self.gdf.loc[self.gdf["temp_vertex"] == self.gdf["temp_idx"]]
 
     def _get_n_missing(
         self,
         results: GeoDataFrame | DataFrame,
         col: str,
+        add: bool = False,
     ) -> None:
         """
         Get number of missing values for each point after a network analysis.
@@ -86,11 +116,15 @@ class Points:
             results: (Geo)DataFrame resulting from od_cost_matrix, get_route,
                 get_k_routes, get_route_frequencies or service_area.
             col: id column of the results. Either 'origin' or 'destination'.
+            add: If True, the missing values are added to the existing counts. Used
+                when the results come in chunks.
         """
-        self.gdf["missing"] = self.gdf["temp_idx"].map(
-            results.groupby(col).count().iloc[:, 0]
-            - results.dropna().groupby(col).count().iloc[:, 0]
+        n_missing = self.gdf["temp_idx"].map(
+            results.isna().any(axis=1).groupby(results[col]).sum()
         )
+        if add and "missing" in self.gdf.columns:
+            n_missing = self.gdf["missing"].add(n_missing, fill_value=0)
+        self.gdf["missing"] = n_missing
 
     @staticmethod
     def _dist_to_weight(dists, rules):
@@ -126,30 +160,82 @@ class Points:
 
         return dists
 
+    @staticmethod
+    def _add_split_vertices(
+        coords: np.ndarray,
+        point_idx: np.ndarray,
+        node_ids: np.ndarray,
+        dists: np.ndarray,
+        split_vertices: dict[tuple[float, float], tuple[str, float]],
+        rules: NetworkAnalysisRules,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Connect the points to the vertex on the closest line as well as nodes."""
+        snapped = [split_vertices.get((x, y)) for x, y in coords[:, :2]]
+
+        is_snapped = np.array([vertex is not None for vertex in snapped], dtype=bool)
+        snapped_dists = np.array(
+            [vertex[1] if vertex is not None else np.inf for vertex in snapped]
+        )
+
+        search_factor_mult = 1 + rules.search_factor / 100
+        keep = (
+            dists <= snapped_dists[point_idx] * search_factor_mult + rules.search_factor
+        )
+
+        vertices = np.array(
+            [vertex[0] for vertex in snapped if vertex is not None], dtype=object
+        )
+
+        return (
+            np.concatenate([point_idx[keep], np.flatnonzero(is_snapped)]),
+            np.concatenate([node_ids[keep].astype(object), vertices]),
+            np.concatenate([dists[keep], snapped_dists[is_snapped]]),
+        )
+
     def _make_edges(self, df, from_col, to_col):
         return [(f, t) for f, t in zip(df[from_col], df[to_col], strict=True)]
 
     def _get_edges_and_weights(
         self,
-        nodes: GeoDataFrame,
+        network: Network,
         rules: NetworkAnalysisRules,
         from_col: str,
         to_col: str,
+        split_vertices: dict | None = None,
     ):
-        df = get_k_nearest_neighbors(
-            gdf=self.gdf,
-            neighbors=nodes,
-            id_cols=("temp_idx", "node_id"),
-            k=50,
-            max_dist=rules.search_tolerance,
+        """Connects the points to the network nodes.
+
+        The snapping is done by the network, which keeps a spatial index of the nodes
+        and a cache of earlier snapping results.
+
+        If 'split_vertices' is given, the points are also connected to the vertex on
+        the closest line. The nodes are then only kept if they are within the
+        search_factor of the distance to this vertex.
+        """
+        vertices = self.vertices
+        coords = get_coordinates(vertices.geometry.values)
+
+        point_idx, node_ids, dists = network._get_node_candidates(
+            coords,
+            search_tolerance=rules.search_tolerance,
+            search_factor=rules.search_factor,
         )
 
-        search_factor_mult = 1 + rules.search_factor / 100
-        df = df.loc[df.dist <= df.dist_min * search_factor_mult + rules.search_factor]
+        if split_vertices is not None:
+            point_idx, node_ids, dists = self._add_split_vertices(
+                coords, point_idx, node_ids, dists, split_vertices, rules
+            )
+
+        df = DataFrame(
+            {
+                "temp_idx": vertices["temp_vertex"].values[point_idx],
+                "node_id": node_ids,
+            }
+        )
 
         edges = self._make_edges(df, from_col=from_col, to_col=to_col)
 
-        weighs = self._dist_to_weight(dists=list(df.dist), rules=rules)
+        weighs = self._dist_to_weight(dists=list(dists), rules=rules)
 
         return edges, weighs
 
@@ -168,12 +254,15 @@ class Origins(Points):
 
     def _get_edges_and_weights(
         self,
-        nodes: GeoDataFrame,
+        network: Network,
         rules: NetworkAnalysisRules,
         from_col="temp_idx",
         to_col="node_id",
+        split_vertices: dict | None = None,
     ):
-        return super()._get_edges_and_weights(nodes, rules, from_col, to_col)
+        return super()._get_edges_and_weights(
+            network, rules, from_col, to_col, split_vertices
+        )
 
 
 class Destinations(Points):
@@ -190,9 +279,12 @@ class Destinations(Points):
 
     def _get_edges_and_weights(
         self,
-        nodes: GeoDataFrame,
+        network: Network,
         rules: NetworkAnalysisRules,
         from_col="node_id",
         to_col="temp_idx",
+        split_vertices: dict | None = None,
     ):
-        return super()._get_edges_and_weights(nodes, rules, from_col, to_col)
+        return super()._get_edges_and_weights(
+            network, rules, from_col, to_col, split_vertices
+        )
@@ -0,0 +1,136 @@
+"""Stage timing and memory profiling of network analysis runs."""
+import tracemalloc
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from time import perf_counter
+
+
+class Profiler:
+    """Records wall time, peak memory and counts of the stages of analysis runs.
+
+    Each run gives one flat record with the method name, the total seconds and peak
+    memory of the run and the seconds and peak memory of each stage, e.g.
+    'search_seconds' and 'search_peak_mb'. Stages that are entered more than once
+    in a run get the sum of the seconds and the highest peak. Counts are added to
+    the record with the count method.
+
+    Memory is measured with tracemalloc, which is started at the start of the run
+    if it is not already tracing, and stopped at the end of the run. The peak memory
+    of a stage is the highest amount of memory allocated by Python during the stage,
+    in megabytes, relative to the memory in use when the stage started. Memory
+    allocated by C libraries like igraph is not traced. Runs that end without being
+    finished, e.g. by an exception, are discarded with the stop method, which also
+    stops the tracing.
+
+    Args:
+        enabled: If False, nothing is recorded.
+        hook: optional function that is called with the record of each run when the
+            run is finished, e.g. to send the record to a metrics system.
+    """
+
+    def __init__(
+        self, enabled: bool = True, hook: Callable[[dict], None] | None = None
+    ):
+        self.enabled = enabled
+        self.hook = hook
+        self.records: list[dict] = []
+        self._record: dict | None = None
+        self._started_tracing = False
+
+    def start(self) -> None:
+        """Start the record of a new run, discarding an unfinished run."""
+        if not self.enabled:
+            return
+
+        if self._record is None:
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+
+        tracemalloc.reset_peak()
+        self._record = {}
+        self._time_start = perf_counter()
+        self._memory_start = tracemalloc.get_traced_memory()[0]
+        self._peak = 0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Context manager that records the seconds and peak memory of a stage."""
+        if self._record is None:
+            yield
+            return
+
+        memory_start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        time_ = perf_counter()
+        try:
+            yield
+        finally:
+            seconds = perf_counter() - time_
+            peak = tracemalloc.get_traced_memory()[1]
+            self._peak = max(self._peak, peak - self._memory_start)
+
+            record = self._record
+            record[f"{name}_seconds"] = record.get(f"{name}_seconds", 0) + seconds
+            record[f"{name}_peak_mb"] = max(
+                record.get(f"{name}_peak_mb", 0), (peak - memory_start) / 1e6
+            )
+
+    def count(self, **counts: int) -> None:
+        """Add counts, e.g. the number of graph vertices, to the record of the run."""
+        if self._record is not None:
+            self._record.update(counts)
+
+    def finish(self, method: str) -> None:
+        """Finish the record of the run and pass it to the hook."""
+        if self._record is None:
+            return
+
+        self._peak = max(
+            self._peak, tracemalloc.get_traced_memory()[1] - self._memory_start
+        )
+        record = {
+            "endtime": datetime.now(),
+            "method": method,
+            "seconds": perf_counter() - self._time_start,
+            "peak_mb": self._peak / 1e6,
+        } | self._record
+
+        if self._started_tracing:
+            tracemalloc.stop()
+        self._record = None
+
+        self.records.append(record)
+
+        if self.hook is not None:
+            self.hook(record)
+
+    def stop(self) -> None:
+        """Discard an unfinished run, and stop tracing memory if the run started it."""
+        if self._record is None:
+            return
+
+        if self._started_tracing:
+            tracemalloc.stop()
+        self._record = None
+
+
+def stops_profiling(method: Callable) -> Callable:
+    """Decorator that stops the profiling of a run if the method doesn't finish it.
+
+    The methods of NetworkAnalysis start the profiling when preparing the analysis,
+    and finish it when the results are ready. If the method raises an exception in
+    between, the run is discarded, so that tracemalloc does not keep tracing for the
+    rest of the process.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._profiler.stop()
+
+    return wrapper
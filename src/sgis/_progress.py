@@ -0,0 +1,69 @@
+"""Progress reporting and cancellation of network analysis runs."""
+from collections.abc import Callable
+from time import perf_counter
+
+
+class Progress:
+    """Reports the progress of an analysis run after each chunk of origins.
+
+    The callback is called with a dict with the method name, the number of the
+    chunk, the number of origins done and in total, the number of result rows so
+    far, the seconds elapsed, the origins per second and the estimated seconds
+    remaining. If the callback returns True, the run is cancelled, and the results
+    of the chunks that are done are kept.
+
+    Args:
+        method: name of the NetworkAnalysis method that is run.
+        origins_total: number of origins in the run.
+        callback: optional function to call after each chunk. If None, the progress
+            is counted, but not reported.
+    """
+
+    def __init__(
+        self,
+        method: str,
+        origins_total: int,
+        callback: Callable[[dict], bool | None] | None,
+    ):
+        self.method = method
+        self.origins_total = origins_total
+        self.callback = callback
+        self.chunk = 0
+        self.origins_done = 0
+        self.cancelled = False
+        self._time_start = perf_counter()
+
+    def update(self, n_origins: int, rows: int) -> bool:
+        """Count a finished chunk and report it. Returns True if the run is cancelled.
+
+        Args:
+            n_origins: number of origins in the finished chunk.
+            rows: number of result rows of all finished chunks.
+        """
+        self.chunk += 1
+        self.origins_done += n_origins
+
+        if self.callback is None:
+            return False
+
+        seconds = perf_counter() - self._time_start
+        per_second = self.origins_done / seconds if seconds else float("inf")
+        self.cancelled = bool(
+            self.callback(
+                {
+                    "method": self.method,
+                    "chunk": self.chunk,
+                    "origins_done": self.origins_done,
+                    "origins_total": self.origins_total,
+                    "rows": rows,
+                    "seconds_elapsed": seconds,
+                    "origins_per_second": per_second,
+                    "seconds_remaining": (
+                        (self.origins_total - self.origins_done) / per_second
+                        if per_second
+                        else float("inf")
+                    ),
+                }
+            )
+        )
+        return self.cancelled
@@ -4,6 +4,7 @@ from geopandas import GeoDataFrame
 from igraph import Graph
 
 from .geopandas_utils import gdf_concat
+from .network import _goes_both_ways
 
 
 def _service_area(
@@ -12,19 +13,73 @@ def _service_area(
     weight: str,
     lines: GeoDataFrame,
     breaks: int | float | tuple[int | float],
+    original_lines: GeoDataFrame | None = None,
 ) -> GeoDataFrame:
     if isinstance(breaks, (str, int, float)):
         breaks = (float(breaks),)
 
-    # loop through every origin and every break
+    # the vertex names in the graph are strings
+    targets = lines["target"].astype(str)
+
+    # lines stored once for both directions are also reached from their source
+    sources = lines["source"].astype(str).where(_goes_both_ways(lines))
+
+    # the original lines of simplified networks get the cost to their nodes through
+    # the source or target of the merged line
+    if original_lines is not None:
+        vertex_index = pd.Index(graph.vs["name"])
+        merged_sources = vertex_index.get_indexer(
+            original_lines["_merged_source"].astype(str)
+        )
+        merged_targets = vertex_index.get_indexer(
+            original_lines["_merged_target"].astype(str)
+        )
+        original_nodes, _ = pd.factorize(
+            np.concatenate(
+                [original_lines["target"].values, original_lines["source"].values]
+            )
+        )
+        original_targets, original_sources = np.split(original_nodes, 2)
+        original_both_ways = _goes_both_ways(original_lines)
+        cost_to_node = np.concatenate(
+            [original_lines["_cost_to_target"], original_lines["_cost_to_source"]]
+        )
+        cost_from_node = np.concatenate(
+            [original_lines["_cost_from_target"], original_lines["_cost_from_source"]]
+        )
+        merged_sources = np.concatenate([merged_sources, merged_sources])
+        merged_targets = np.concatenate([merged_targets, merged_targets])
+        original_lines = original_lines.loc[
+            :, lambda df: ~df.columns.str.startswith(("_merged", "_cost"))
+        ]
+
+    # loop through every origin location and every break
     results: list[GeoDataFrame] = []
-    for i in origins["temp_idx"]:
+    for i in origins["temp_vertex"].unique():
         result = graph.distances(weights="weight", source=i)
 
         df = pd.DataFrame(
             data={"node_id": np.array(graph.vs["name"]), weight: result[0]}
         )
 
+        if original_lines is not None:
+            # vertices missing from the graph get the infinite distance at the end
+            distances = np.append(result[0], np.inf)
+            costs = np.minimum(
+                distances[merged_sources] + cost_to_node,
+                distances[merged_targets] + cost_from_node,
+            )
+
+            # like the other lines, the original lines are reached if their target is
+            # reached, which can be through other lines with the same node
+            node_costs = np.full(original_nodes.max() + 1, np.inf)
+            np.minimum.at(node_costs, original_nodes, costs)
+            original_costs = np.where(
+                original_both_ways,
+                np.minimum(node_costs[original_targets], node_costs[original_sources]),
+                node_costs[original_targets],
+            )
+
         for imp in breaks:
             indices = df.loc[df[weight] < imp]
 
@@ -34,10 +89,27 @@ def _service_area(
                 )
                 continue
 
-            service_area = lines.loc[lines.target.isin(indices.node_id)]
+            service_area = lines.loc[
+                targets.isin(indices.node_id) | sources.isin(indices.node_id)
+            ]
+
+            if original_lines is not None and (original_costs < imp).any():
+                service_area = gdf_concat(
+                    [service_area, original_lines.loc[original_costs < imp]]
+                )
 
             service_area["origin"] = i
             service_area[weight] = imp
             results.append(service_area)
 
-    return gdf_concat(results)
+    results = gdf_concat(results)
+
+    # expand the results from the locations to all origins with the same location
+    return (
+        results.rename(columns={"origin": "temp_vertex"})
+        .merge(
+            origins[["temp_vertex", "temp_idx"]].rename(columns={"temp_idx": "origin"}),
+            on="temp_vertex",
+        )
+        .drop("temp_vertex", axis=1)
+    )
@@ -2,6 +2,7 @@
 
 import warnings
 
+import numpy as np
 from geopandas import GeoDataFrame
 from shapely.constructive import reverse
 
@@ -88,6 +89,7 @@ class DirectedNetwork(Network):
         speed_col: str | None = None,
         flat_speed: int | None = None,
         reverse_tofrom: bool = True,
+        duplicate_both_ways: bool = True,
     ):
         """Flips the line geometries of roads going backwards and in both directions.
 
@@ -107,12 +109,20 @@ class DirectedNetwork(Network):
                 all roads.
             reverse_tofrom: If the geometries of the lines going backwards
                 (i.e. has the last value in 'direction_vals_bft'). Defaults to True.
+            duplicate_both_ways: If True (the default), the lines going both ways are
+                duplicated and the copies are reversed. If False, these lines are
+                kept once, with True in the column 'both_ways' and the minutes of the
+                backward direction in the column 'minutes_backward'. This uses about
+                half the memory for networks where most roads go both ways. The
+                network analysis then makes graph edges in both directions, and
+                reverses the geometries only of the lines used backwards in routes.
 
         Returns:
             The Network class, with the network attribute updated with flipped
                 geometries for lines going backwards and both directions.
             Adds the column 'minutes' if either 'speed_col', 'minute_col' or
-                'flat_speed' is specified.
+                'flat_speed' is specified, and the columns 'both_ways' and
+                'minutes_backward' if 'duplicate_both_ways' is False.
 
         Raises:
             ValueError: If 'flat_speed' or 'speed_col' is specified and the unit of the
@@ -138,34 +148,17 @@ class DirectedNetwork(Network):
         ft = gdf.loc[gdf[direction_col] == f]
         tf = gdf.loc[gdf[direction_col] == t]
         both_ways = gdf.loc[gdf[direction_col] == b]
-        both_ways2 = both_ways.copy()
+        both_ways2 = both_ways.copy() if duplicate_both_ways else None
 
         if minute_cols:
-            try:
-                min_f, min_t = return_two_vals(minute_cols)
-            except ValueError as e:
-                raise ValueError(
-                    "'minute_cols' should be column name (string) or tuple/list with "
-                    "values of directions forwards and backwards, in that order."
-                ) from e
-
-            # rename the two minute cols
-            both_ways = both_ways.rename(columns={min_f: "minutes"})
-            both_ways2 = both_ways2.rename(columns={min_t: "minutes"})
-
-            ft = ft.rename(columns={min_f: "minutes"})
-            tf = tf.rename(columns={min_t: "minutes"})
-
-            for gdf in [ft, tf, both_ways, both_ways2]:
-                if all(gdf["minutes"].fillna(0) <= 0):
-                    raise ValueError("All values in minute col is NaN or less than 0.")
-
-        both_ways2.geometry = reverse(both_ways2.geometry)
+            ft, tf, both_ways, both_ways2 = self._rename_minute_cols(
+                ft, tf, both_ways, both_ways2, minute_cols
+            )
 
         if reverse_tofrom:
             tf.geometry = reverse(tf.geometry)
 
-        self.gdf = gdf_concat([both_ways, both_ways2, ft, tf])
+        self.gdf = self._concat_directions(ft, tf, both_ways, both_ways2)
 
         if speed_col:
             self._get_speed_from_col(speed_col)
@@ -173,7 +166,9 @@ class DirectedNetwork(Network):
         if flat_speed:
             self.gdf["minutes"] = self.gdf.length / flat_speed * 16.6666666667
 
-        if "minutes" in self.gdf.columns:
+        if "minutes_backward" in self.gdf.columns:
+            self.gdf = self._drop_closed_directions(self.gdf)
+        elif "minutes" in self.gdf.columns:
             self.gdf = self.gdf.loc[self.gdf["minutes"] >= 0]
 
         self._make_node_ids()
@@ -182,11 +177,91 @@ class DirectedNetwork(Network):
 
         return self
 
+    @staticmethod
+    def _rename_minute_cols(ft, tf, both_ways, both_ways2, minute_cols):
+        """Renames the minute column of each direction to 'minutes'.
+
+        The lines going both ways get the backward minutes in the reversed copies,
+        or, if these are not duplicated (both_ways2 is None), in the column
+        'minutes_backward'.
+        """
+        try:
+            min_f, min_t = return_two_vals(minute_cols)
+        except ValueError as e:
+            raise ValueError(
+                "'minute_cols' should be column name (string) or tuple/list with "
+                "values of directions forwards and backwards, in that order."
+            ) from e
+
+        if both_ways2 is not None:
+            both_ways2 = both_ways2.rename(columns={min_t: "minutes"})
+            backward_minutes = both_ways2["minutes"]
+        else:
+            both_ways = both_ways.assign(minutes_backward=both_ways[min_t])
+            backward_minutes = both_ways["minutes_backward"]
+        both_ways = both_ways.rename(columns={min_f: "minutes"})
+
+        ft = ft.rename(columns={min_f: "minutes"})
+        tf = tf.rename(columns={min_t: "minutes"})
+
+        for minute_col in [
+            ft["minutes"],
+            tf["minutes"],
+            both_ways["minutes"],
+            backward_minutes,
+        ]:
+            if all(minute_col.fillna(0) <= 0):
+                raise ValueError("All values in minute col is NaN or less than 0.")
+
+        return ft, tf, both_ways, both_ways2
+
+    @staticmethod
+    def _concat_directions(ft, tf, both_ways, both_ways2) -> GeoDataFrame:
+        """Concats the directions, reversing the copies of the lines going both ways.
+
+        If the lines going both ways are not duplicated (both_ways2 is None), they are
+        kept once with True in the column 'both_ways'.
+        """
+        if both_ways2 is not None:
+            both_ways2.geometry = reverse(both_ways2.geometry)
+            return gdf_concat([both_ways, both_ways2, ft, tf])
+
+        both_ways = both_ways.assign(both_ways=True)
+        gdf = gdf_concat([both_ways, ft, tf])
+        gdf["both_ways"] = gdf["both_ways"].fillna(False).astype(bool)
+        return gdf
+
+    @staticmethod
+    def _drop_closed_directions(gdf: GeoDataFrame) -> GeoDataFrame:
+        """Removes the directions with negative or missing minutes.
+
+        Lines going both ways that are closed in one direction go only the other way,
+        and are reversed if they only go backwards.
+        """
+        both_ways = gdf["both_ways"].values
+        forwards = (gdf["minutes"] >= 0).values
+        backwards = both_ways & (gdf["minutes_backward"] >= 0).values
+
+        only_backwards = backwards & ~forwards
+        if only_backwards.any():
+            gdf.loc[only_backwards, "minutes"] = gdf.loc[
+                only_backwards, "minutes_backward"
+            ]
+            gdf.loc[only_backwards, gdf.geometry.name] = reverse(
+                gdf.geometry.values[only_backwards]
+            )
+
+        gdf["both_ways"] = forwards & backwards
+        gdf.loc[~gdf["both_ways"], "minutes_backward"] = np.nan
+
+        return gdf.loc[forwards | backwards]
+
     def make_directed_network_norway(
         self,
         direction_col: str = "oneway",
         direction_vals_bft: tuple[str, str, str] = ("B", "FT", "TF"),
         minute_cols: tuple[str, str] = ("drivetime_fw", "drivetime_bw"),
+        duplicate_both_ways: bool = True,
     ):
         """Runs method make_directed_network for Norwegian road data.
 
@@ -198,6 +273,7 @@ class DirectedNetwork(Network):
             direction_col=direction_col,
             direction_vals_bft=direction_vals_bft,
             minute_cols=minute_cols,
+            duplicate_both_ways=duplicate_both_ways,
         )
 
     def _warn_if_undirected(self):
@@ -23,3 +23,7 @@ class ZeroLinesError(Exception):
 
 class NotInJupyterError(Exception):
     """This functionality only works in Jupyter."""
+
+
+class MemoryLimitError(MemoryError):
+    """The analysis of one origin is estimated to need more than the memory limit."""
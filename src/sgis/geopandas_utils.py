@@ -15,6 +15,7 @@ from shapely import (
     Geometry,
     area,
     force_2d,
+    get_coordinates,
     get_exterior_ring,
     get_interior_ring,
     get_num_interior_rings,
@@ -1043,7 +1044,7 @@ def coordinate_array(
         [0.38045827, 0.87878816]])
 
     """
-    return np.array([(geom.x, geom.y) for geom in gdf.geometry])
+    return get_coordinates(gdf.geometry.values)
 
 
 def push_geom_col(gdf: GeoDataFrame) -> GeoDataFrame:
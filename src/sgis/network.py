@@ -9,12 +9,17 @@ from copy import copy, deepcopy
 
 import numpy as np
 from geopandas import GeoDataFrame
-from pandas import DataFrame
-from shapely import line_merge
+from pandas import DataFrame, Index
+from shapely import get_coordinates, line_merge
+from sklearn.neighbors import NearestNeighbors
 
 from .exceptions import ZeroLinesError
 from .geopandas_utils import clean_geoms
 from .network_functions import (
+    _get_chains,
+    _get_deadend_trees,
+    _get_endpoint_coords,
+    _merge_chains,
     close_network_holes,
     cut_lines,
     get_component_size,
@@ -23,6 +28,10 @@ from .network_functions import (
 )
 
 
+# the maximum number of point locations kept in the snapping cache of a network
+_SNAP_CACHE_MAX_POINTS = 1_000_000
+
+
 class Network:
     """Prepares a GeoDataFrame of lines for network analysis.
 
@@ -143,6 +152,10 @@ class Network:
                 "set 'allow_degree_units' to True."
             )
 
+        # counts the assignments to 'gdf', so that the nodes are only checked against
+        # the lines after the lines have changed
+        self._version = 0
+
         self.gdf = self._prepare_network(gdf, merge_lines)
 
         self._make_node_ids()
@@ -159,6 +172,10 @@ class Network:
         # for the base Network class, the graph will be undirected in network analysis
         self._as_directed = False
 
+        # the lines before simplify_topology and the chains they were merged into
+        self._original_gdf = None
+        self._chains = None
+
     def remove_isolated(self):
         """Removes lines not connected to the largest network component.
 
@@ -201,8 +218,7 @@ class Network:
         0             False          23.2466
         1              True           0.3994
         """
-        if not self._nodes_are_up_to_date():
-            self._make_node_ids()
+        self._update_nodes_if()
 
         self.gdf = get_largest_component(self.gdf)
 
@@ -364,6 +380,8 @@ class Network:
                 to adjust based on the length of the new lines, you can pass the name
                 of that column here. For example, if you have a column called
                 "minutes", the minute value will be halved if the line is halved.
+                The backward weights of lines going both ways, e.g. the column
+                "minutes_backward", are adjusted as well.
             ignore_index: If True, the resulting axis will be labeled 0, 1, …, n - 1.
                 Defaults to True
 
@@ -374,9 +392,6 @@ class Network:
             KeyError: If the specified 'adjust_weight_col' column is not present in the
                 GeoDataFrame of the network.
 
-        Note:
-            This method is time consuming for large networks and low 'max_length'.
-
         Examples
         --------
         >>> nw = Network(roads)
@@ -409,9 +424,101 @@ class Network:
         self.gdf = cut_lines(self.gdf, max_length=max_length, ignore_index=ignore_index)
 
         if adjust_weight_col:
-            self.gdf[adjust_weight_col] = self.gdf[adjust_weight_col] * (
-                self.gdf.length / self.gdf[adjust_weight_col]
+            for col in [adjust_weight_col, f"{adjust_weight_col}_backward"]:
+                if col not in self.gdf.columns:
+                    continue
+                self.gdf[col] = self.gdf[col] * (
+                    self.gdf.length / self.gdf["original_length"]
+                )
+            self.gdf = self.gdf.drop("original_length", axis=1)
+
+        return self
+
+    def simplify_topology(self, sum_cols: str | list[str] | None = None):
+        """Merges chains of lines that only meet each other into single lines.
+
+        Lines joined at nodes with exactly two neighbour nodes are merged into one
+        line from the first to the last node of the chain, which makes the graph
+        smaller and the network analysis faster. In a DirectedNetwork, lines are
+        only merged in the direction they can be travelled, so that one-way and
+        two-way roads are kept apart.
+
+        The merged lines get the columns of the first line of the chain, and the
+        'meters' column is updated. Other weight columns, like minutes, should be
+        given in 'sum_cols'. The backward weights of lines going both ways, like
+        'minutes_backward', are then summed as well.
+
+        The original lines are kept, so that service_area returns the original lines
+        that are reached, except for the merged lines split by 'split_lines'. The
+        original lines are dropped if the lines of the network are changed after
+        simplifying. Routes get the merged lines, which have the same geometry as
+        the original lines.
+
+        Note:
+            The points in the network analysis are connected to the nodes at the ends
+            of the merged lines. Set 'split_lines' to True in the NetworkAnalysisRules
+            to connect the points to the closest part of the lines instead. The costs
+            to these points follow the weights of the original lines.
+
+        Args:
+            sum_cols: column or columns to sum for the lines of each chain, e.g. the
+                minutes of a directed network. Defaults to None.
+
+        Returns:
+            Self
+
+        Examples
+        --------
+        >>> nw = DirectedNetwork(roads).make_directed_network_norway()
+        >>> nw = nw.simplify_topology(sum_cols="minutes")
+        >>> nwa = NetworkAnalysis(
+        ...     network=nw,
+        ...     rules=NetworkAnalysisRules(weight="minutes", split_lines=True),
+        ... )
+        """
+        self._update_nodes_if()
+
+        lines = self.gdf
+        chains = _get_chains(
+            lines["source"].values,
+            lines["target"].values,
+            both_ways=self._goes_both_ways(lines),
+        )
+
+        simplified = lines.iloc[chains.loc[chains["order"] == 0, "row"].values]
+        simplified = simplified.reset_index(drop=True)
+        simplified.geometry = _merge_chains(lines.geometry.values, chains)
+
+        if isinstance(sum_cols, str):
+            sum_cols = [sum_cols]
+        rows = chains["row"].values
+        is_reversed = chains["reversed"].values
+        chain_starts = np.flatnonzero(chains["order"].values == 0)
+        for col in sum_cols or []:
+            values = lines[col].values[rows]
+            backward_col = f"{col}_backward"
+            if not self._as_directed or backward_col not in lines.columns:
+                simplified[col] = np.add.reduceat(values, chain_starts)
+                continue
+
+            # lines going both ways can be reversed in the chain
+            backward_values = lines[backward_col].values[rows]
+            simplified[col] = np.add.reduceat(
+                np.where(is_reversed, backward_values, values), chain_starts
             )
+            simplified[backward_col] = np.add.reduceat(
+                np.where(is_reversed, values, backward_values), chain_starts
+            )
+
+        if "meters" in simplified.columns:
+            simplified["meters"] = simplified.length
+
+        self.gdf = simplified
+        self._make_node_ids()
+
+        self._original_gdf = lines
+        self._chains = chains
+        self._chains_version = self._version
 
         return self
 
@@ -427,6 +534,273 @@ class Network:
         """
         self.gdf, self._nodes = make_node_ids(self.gdf)
 
+        self._nodes_version = self._version
+        self._nodes_hash = _endpoints_hash(self.gdf)
+
+        # the spatial index, snapping results and dead-end trees are only valid for
+        # these nodes
+        self._node_index = None
+        self._snap_cache = {}
+        self._deadend_trees = None
+
+    def _goes_both_ways(self, gdf: GeoDataFrame) -> np.ndarray:
+        """Whether the lines can be travelled both ways in the network analysis.
+
+        All lines of undirected networks go both ways. In a DirectedNetwork, the lines
+        going both ways are either duplicated and reversed, or stored once with True
+        in the column 'both_ways'.
+        """
+        if not self._as_directed:
+            return np.ones(len(gdf), dtype=bool)
+        return _goes_both_ways(gdf)
+
+    def _get_deadend_trees(self) -> tuple[Index, np.ndarray, np.ndarray]:
+        """Finds the nodes in dead-end trees once for the current nodes.
+
+        Returns:
+            The node ids as strings, like the vertex names of the graph, whether the
+            nodes are in dead-end trees and the position of their parent nodes.
+        """
+        if self._deadend_trees is None:
+            nodes, is_deadend, parent = _get_deadend_trees(
+                self.gdf["source"].values, self.gdf["target"].values
+            )
+            self._deadend_trees = nodes.astype(str), is_deadend, parent
+
+        return self._deadend_trees
+
+    def _get_original_lines(self, weight: str) -> GeoDataFrame | None:
+        """The lines before simplify_topology, with their costs along the chains.
+
+        The cost of each merged line is shared between its original lines by their
+        weight, or length if the original lines do not have the weight column.
+
+        Returns:
+            None if the network is not simplified or the lines have changed since.
+            Otherwise the original lines with the columns '_merged_row',
+            '_merged_source' and '_merged_target', which are the row number and nodes
+            of the merged line, '_cost_to_target', which is the cost from the source
+            of the merged line to the target of the original line, and
+            '_cost_from_target', which is the cost from the target of the merged line,
+            or infinity if the chain cannot be travelled in that direction. The
+            columns '_cost_to_source' and '_cost_from_source' are the same for the
+            source of the original line.
+        """
+        if self._chains is None or self._chains_version != self._version:
+            return None
+
+        chains = self._chains
+        chain = chains["chain"].values
+        original = self._original_gdf.iloc[chains["row"].values]
+
+        is_reversed = chains["reversed"].values
+        chain_starts = np.flatnonzero(chains["order"].values == 0)
+
+        if weight in original.columns:
+            costs = original[weight].values.astype(float)
+            backward_costs = _get_backward_weights(original, weight, self._as_directed)
+        else:
+            costs = backward_costs = original.length.values
+
+        def get_shares(costs) -> tuple[np.ndarray, np.ndarray]:
+            """Share of the chain's cost before and after each line."""
+            with np.errstate(divide="ignore", invalid="ignore"):
+                shares = np.nan_to_num(
+                    costs / np.add.reduceat(costs, chain_starts)[chain]
+                )
+            cumulative = np.cumsum(shares)
+            share_after = cumulative - (cumulative - shares)[chain_starts][chain]
+            return share_after - shares, share_after
+
+        forward_before, forward_after = get_shares(
+            np.where(is_reversed, backward_costs, costs)
+        )
+        backward_before, backward_after = get_shares(
+            np.where(is_reversed, costs, backward_costs)
+        )
+        merged_costs = self.gdf[weight].values[chain]
+        merged_backward_costs = _get_backward_weights(
+            self.gdf, weight, self._as_directed
+        )[chain]
+
+        # lines going one way can only be reached backwards at the end of the chain
+        goes_both_ways = self._goes_both_ways(original)
+        is_last = np.append(chain[1:] != chain[:-1], True)
+
+        def get_costs(share_forward, share_backward, is_chain_end):
+            """The costs from the source and the target of the merged line."""
+            return share_forward * merged_costs, np.where(
+                goes_both_ways,
+                share_backward * merged_backward_costs,
+                np.where(is_chain_end, 0, np.inf),
+            )
+
+        cost_to_target, cost_from_target = get_costs(
+            np.where(is_reversed, forward_before, forward_after),
+            np.where(is_reversed, 1 - backward_before, 1 - backward_after),
+            is_chain_end=is_last & ~is_reversed,
+        )
+        cost_to_source, cost_from_source = get_costs(
+            np.where(is_reversed, forward_after, forward_before),
+            np.where(is_reversed, 1 - backward_after, 1 - backward_before),
+            is_chain_end=is_last & is_reversed,
+        )
+
+        return original.assign(
+            _merged_row=chain,
+            _merged_source=self.gdf["source"].values[chain],
+            _merged_target=self.gdf["target"].values[chain],
+            _cost_to_target=cost_to_target,
+            _cost_from_target=cost_from_target,
+            _cost_to_source=cost_to_source,
+            _cost_from_source=cost_from_source,
+        )
+
+    def _get_costs_along_lines(
+        self,
+        weight: str,
+        rows: np.ndarray,
+        fracs: np.ndarray,
+        backward: np.ndarray,
+    ) -> np.ndarray | None:
+        """The costs from the end of the merged lines to points along the lines.
+
+        The costs are interpolated between the nodes of the original lines, so that
+        the costs of each original line are kept when a merged line is split.
+
+        Args:
+            weight: the weight column.
+            rows: row numbers of the merged lines.
+            fracs: the positions along the lines as fractions of the line length,
+                from the source, or from the target if the line is travelled
+                backward.
+            backward: whether the lines are travelled from the target to the source.
+
+        Returns:
+            None if the network is not simplified or the lines have changed since.
+            Otherwise the cost from the source, or the target if backward, to each
+            position.
+        """
+        original = self._get_original_lines(weight)
+        if original is None:
+            return None
+
+        # the original lines are sorted by chain and order, from the merged source
+        merged_row = original["_merged_row"].values
+        is_first = np.append(True, merged_row[1:] != merged_row[:-1])
+        chain_starts = np.flatnonzero(is_first)
+        chain_idx = np.cumsum(is_first) - 1
+
+        length = original.length.values
+        length_after = np.cumsum(length)
+        length_after = length_after - (length_after - length)[chain_starts][chain_idx]
+        chain_length = np.add.reduceat(length, chain_starts)[chain_idx]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frac_end = np.nan_to_num(length_after / chain_length, nan=1.0)
+            frac_start = np.nan_to_num((length_after - length) / chain_length)
+
+        # the cost increases along the chain, so the larger cost is at the far node
+        cost_from_source = np.maximum(
+            original["_cost_to_source"].values, original["_cost_to_target"].values
+        )
+        cost_from_target = np.maximum(
+            original["_cost_from_source"].values, original["_cost_from_target"].values
+        )
+
+        # the merged lines are two apart on the x axis, so that each position is only
+        # interpolated between the nodes of its own line
+        x = 2 * merged_row
+        forward = _interpolate(
+            2 * rows + fracs,
+            np.concatenate([x[chain_starts], x + frac_end]),
+            np.concatenate([np.zeros(len(chain_starts)), cost_from_source]),
+        )
+        backward_costs = _interpolate(
+            2 * rows + 1 - fracs,
+            np.concatenate([x + frac_start, x[chain_starts] + 1]),
+            np.concatenate([cost_from_target, np.zeros(len(chain_starts))]),
+        )
+
+        return np.where(backward, backward_costs, forward)
+
+    def _get_node_index(self) -> NearestNeighbors:
+        """Returns a KD-tree of the nodes, which is fitted only once per set of nodes.
+
+        The tree is fitted with up to 50 neighbors, which is the maximum number of
+        nodes a point can be connected to in the network analysis.
+        """
+        if self._node_index is None:
+            k = min(50, len(self._nodes))
+            self._node_index = NearestNeighbors(n_neighbors=k, algorithm="kd_tree").fit(
+                get_coordinates(self._nodes.geometry.values)
+            )
+        return self._node_index
+
+    def _get_node_candidates(
+        self,
+        coords: np.ndarray,
+        search_tolerance: int | float,
+        search_factor: int | float,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Finds the nodes that each point should be connected to.
+
+        The nodes are the ones within the search_tolerance, that are no further away
+        than the closest node plus the search_factor (meters and percent). The results
+        are cached as sorted coordinate arrays per set of rules, so that only points that
+        are not snapped before, are queried against the node index.
+
+        Args:
+            coords: 2d array of point coordinates.
+            search_tolerance: maximum distance between a point and a node.
+            search_factor: meters and percent to add to the closest distance.
+
+        Returns:
+            Three arrays of equal length: the row number of the point in 'coords',
+            the node id and the distance between the point and the node.
+        """
+        # the coordinates as complex numbers, so they can be sorted and searched as one
+        # array
+        keys = coords[:, 0] + 1j * coords[:, 1]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+
+        rules_key = (search_tolerance, search_factor)
+        cache = self._snap_cache.get(rules_key, _snap_points(None))
+
+        is_new = ~_isin_sorted(unique_keys, cache["keys"])
+        if is_new.any():
+            new = _snap_points(
+                unique_keys[is_new],
+                self._get_node_index(),
+                search_tolerance,
+                search_factor,
+            )
+            cache = _merge_snap_results(cache, new)
+
+            # the cache is limited in size, so that long-lived networks used with
+            # many distinct points do not grow without limit
+            if (
+                sum(len(x["keys"]) for x in self._snap_cache.values())
+                + len(new["keys"])
+                > _SNAP_CACHE_MAX_POINTS
+            ):
+                self._snap_cache = {}
+                if len(new["keys"]) <= _SNAP_CACHE_MAX_POINTS:
+                    self._snap_cache[rules_key] = new
+            else:
+                self._snap_cache[rules_key] = cache
+
+        counts = np.diff(cache["offsets"])
+        positions = np.searchsorted(cache["keys"], unique_keys)[inverse]
+        point_counts = counts[positions]
+        point_idx = np.repeat(np.arange(len(keys)), point_counts)
+
+        indices = _segment_indices(cache["offsets"][:-1][positions], point_counts)
+
+        # the nodes are named by their ids as strings in the graph
+        node_ids = self._nodes["node_id"].values[cache["nodes"][indices]].astype(str)
+
+        return point_idx, node_ids, cache["dists"][indices]
+
     @staticmethod
     def _prepare_network(gdf: GeoDataFrame, merge_lines: bool = True) -> GeoDataFrame:
         """Make sure there are only singlepart LineStrings in the network.
@@ -495,45 +869,64 @@ class Network:
 
         Here we check how.
         """
-        self.gdf["meters"] = self.gdf["meters"].astype(str)
+        self.gdf["meters"] = self.gdf.length
+        source_target = np.sort(self.gdf[["source", "target"]].values, axis=1)
         no_dups = DataFrame(
-            np.sort(self.gdf[["source", "target", "meters"]].values, axis=1),
-            columns=[["source", "target", "meters"]],
+            {
+                "source": source_target[:, 0],
+                "target": source_target[:, 1],
+                "meters": self.gdf["meters"].values,
+            }
         ).drop_duplicates()
-        self.gdf["meters"] = self.gdf.length
 
-        percent_bidirectional = len(self.gdf) / len(no_dups) * 100 - 100
+        # the lines going both ways can be stored once
+        n_lines = len(self.gdf) + _goes_both_ways(self.gdf).sum()
+
+        percent_bidirectional = n_lines / len(no_dups) * 100 - 100
 
         return int(round(percent_bidirectional, 0))
 
     def _nodes_are_up_to_date(self) -> bool:
         """Check if nodes need to be updated.
 
-        Returns False if there are any source or target values not in the node-ids,
-        or any superfluous node-ids (meaning rows have been removed from the lines
-        gdf).
+        The nodes are up to date if 'gdf' has not been assigned to since the nodes
+        were made. If it has, the nodes are still up to date if the endpoints of the
+        lines are the same as when the nodes were made, e.g. if only columns have been
+        added or changed.
         """
-        new_or_missing = (~self.gdf.source.isin(self._nodes.node_id)) | (
-            ~self.gdf.target.isin(self._nodes.node_id)
-        )
+        if self._version == self._nodes_version:
+            return True
 
-        if any(new_or_missing):
+        if not all(col in self.gdf.columns for col in ["source", "target"]):
             return False
 
-        removed = ~(
-            (self._nodes.node_id.isin(self.gdf.source))
-            | (self._nodes.node_id.isin(self.gdf.target))
-        )
-
-        if any(removed):
+        if _endpoints_hash(self.gdf) != self._nodes_hash:
             return False
 
+        self._nodes_version = self._version
         return True
 
     def _update_nodes_if(self):
         if not self._nodes_are_up_to_date():
             self._make_node_ids()
 
+    @property
+    def gdf(self) -> GeoDataFrame:
+        """GeoDataFrame with the network lines.
+
+        Assigning a new GeoDataFrame to 'gdf' marks the lines as changed, and the
+        nodes are checked against the lines before the next analysis. Changes made in
+        place, e.g. with 'gdf.loc[...] = ...', are not tracked, so assign the
+        GeoDataFrame back to 'gdf' if the geometries or rows are changed in place.
+        """
+        return self._gdf
+
+    @gdf.setter
+    def gdf(self, gdf: GeoDataFrame) -> None:
+        if gdf is not getattr(self, "_gdf", None):
+            self._version += 1
+        self._gdf = gdf
+
     @property
     def nodes(self):
         """GeoDataFrame with the network nodes (line endpoints).
@@ -570,6 +963,94 @@ class Network:
         return iter(self.__dict__.items())
 
 
+def _endpoints_hash(gdf: GeoDataFrame) -> int:
+    """Hash of the coordinates of the first and last point of each line."""
+    endpoints = np.concatenate(_get_endpoint_coords(gdf.geometry.values))
+    return hash((len(gdf), endpoints.tobytes()))
+
+
+def _snap_points(
+    keys: np.ndarray | None,
+    node_index: NearestNeighbors | None = None,
+    search_tolerance: int | float | None = None,
+    search_factor: int | float | None = None,
+) -> dict[str, np.ndarray]:
+    """Finds the nodes within the search tolerance and factor of each point.
+
+    Args:
+        keys: sorted, unique coordinates as complex numbers. If None, empty results
+            are returned.
+        node_index: the fitted nearest neighbor index of the nodes.
+        search_tolerance: maximum distance between a point and a node.
+        search_factor: meters and percent to add to the closest distance.
+
+    Returns:
+        A dict with the keys, the offsets of the nodes of each key, the row numbers
+        of the nodes and the distances to the nodes.
+    """
+    if keys is None:
+        return {
+            "keys": np.array([], dtype=complex),
+            "offsets": np.zeros(1, dtype=int),
+            "nodes": np.array([], dtype=int),
+            "dists": np.array([], dtype=float),
+        }
+
+    dists, indices = node_index.kneighbors(np.column_stack([keys.real, keys.imag]))
+
+    search_factor_mult = 1 + search_factor / 100
+    dist_min = dists[:, [0]]
+    keep = (dists <= search_tolerance) & (
+        dists <= dist_min * search_factor_mult + search_factor
+    )
+
+    return {
+        "keys": keys,
+        "offsets": np.concatenate([[0], np.cumsum(keep.sum(axis=1))]),
+        "nodes": indices[keep],
+        "dists": dists[keep],
+    }
+
+
+def _merge_snap_results(
+    results1: dict[str, np.ndarray], results2: dict[str, np.ndarray]
+) -> dict[str, np.ndarray]:
+    """Merges two snapping results with different keys, keeping the keys sorted."""
+    keys = np.concatenate([results1["keys"], results2["keys"]])
+    counts = np.concatenate(
+        [np.diff(results1["offsets"]), np.diff(results2["offsets"])]
+    )
+    starts = np.concatenate(
+        [results1["offsets"][:-1], results2["offsets"][:-1] + len(results1["nodes"])]
+    )
+
+    order = np.argsort(keys, kind="stable")
+    indices = _segment_indices(starts[order], counts[order])
+
+    return {
+        "keys": keys[order],
+        "offsets": np.concatenate([[0], np.cumsum(counts[order])]),
+        "nodes": np.concatenate([results1["nodes"], results2["nodes"]])[indices],
+        "dists": np.concatenate([results1["dists"], results2["dists"]])[indices],
+    }
+
+
+def _segment_indices(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """The indices of consecutive segments with the given starts and lengths."""
+    ends = np.cumsum(counts)
+    return np.repeat(starts - ends + counts, counts) + np.arange(
+        ends[-1] if len(ends) else 0
+    )
+
+
+def _isin_sorted(values: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    """Whether each value is in an array of sorted values."""
+    positions = np.searchsorted(sorted_values, values)
+    is_in = positions < len(sorted_values)
+    is_in[is_in] = sorted_values[positions[is_in]] == values[is_in]
+    return is_in
+
+
 # TODO: put these a better place:
 
 
@@ -586,6 +1067,47 @@ def _edge_ids(
         return _edge_id_template(gdf, weight_arr=weight)
 
 
+def _goes_both_ways(gdf: GeoDataFrame) -> np.ndarray:
+    """Whether the lines of a DirectedNetwork are stored once for both directions."""
+    if "both_ways" not in gdf.columns:
+        return np.zeros(len(gdf), dtype=bool)
+    return gdf["both_ways"].fillna(False).values.astype(bool)
+
+
+def _get_backward_weights(
+    gdf: GeoDataFrame, weight: str, directed: bool = True
+) -> np.ndarray:
+    """The weights of the lines in the backward direction.
+
+    Lines going both ways in a DirectedNetwork can have different weights in the two
+    directions, with the backward weight in the column '{weight}_backward'. Otherwise,
+    the weight is the same both ways.
+    """
+    if directed and f"{weight}_backward" in gdf.columns:
+        return gdf[f"{weight}_backward"].values.astype(float)
+    return gdf[weight].values.astype(float)
+
+
+def _interpolate(x: np.ndarray, xp: np.ndarray, fp: np.ndarray) -> np.ndarray:
+    """Linear interpolation like np.interp, with the points sorted first."""
+    order = np.argsort(xp, kind="stable")
+    return np.interp(x, xp[order], fp[order])
+
+
+def _backward_edge_ids(gdf: GeoDataFrame, weight: str) -> tuple[np.ndarray, list[str]]:
+    """Edge ids of the backward direction of the lines stored once for both ways.
+
+    Returns:
+        The row numbers of the lines going both ways and their backward edge ids.
+    """
+    rows = np.flatnonzero(_goes_both_ways(gdf))
+    backward_weights = _get_backward_weights(gdf, weight)[rows]
+    return rows, _edge_id_template(
+        zip(gdf["target"].values[rows], gdf["source"].values[rows], strict=True),
+        weight_arr=backward_weights,
+    )
+
+
 def _edge_id_template(*source_target_arrs, weight_arr):
     """Edge identifiers represented with source and target ids and the weight."""
     return [
@@ -11,22 +11,29 @@ Note:
 """
 
 import geopandas as gpd
-import networkx as nx
 import numpy as np
 import pandas as pd
-from geopandas import GeoDataFrame, GeoSeries
+from geopandas import GeoDataFrame
 from pandas import DataFrame
-from shapely import force_2d, shortest_line
-from shapely.geometry import LineString, Point
-from shapely.ops import unary_union
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from shapely import (
+    STRtree,
+    force_2d,
+    get_coordinates,
+    get_point,
+    has_z,
+    line_locate_point,
+    linestrings,
+    shortest_line,
+)
+from shapely import length as shapely_length
+from shapely import points as shapely_points
 
-from .buffer_dissolve_explode import buff
-from .neighbors import get_k_nearest_neighbors, k_nearest_neighbors
+from .neighbors import k_nearest_neighbors
 from .geopandas_utils import (
     gdf_concat,
     push_geom_col,
-    snap_to,
-    to_gdf,
     coordinate_array,
 )
 
@@ -50,19 +57,9 @@ def get_largest_component(lines: GeoDataFrame) -> GeoDataFrame:
     if "source" not in lines.columns or "target" not in lines.columns:
         lines, _ = make_node_ids(lines)
 
-    edges = [
-        (str(source), str(target))
-        for source, target in zip(lines["source"], lines["target"], strict=True)
-    ]
-
-    graph = nx.Graph()
-    graph.add_edges_from(edges)
+    labels, sizes = _get_component_labels(lines)
 
-    largest_component = max(nx.connected_components(graph), key=len)
-
-    largest_component_dict = {node_id: 1 for node_id in largest_component}
-
-    lines["connected"] = lines.source.map(largest_component_dict).fillna(0)
+    lines["connected"] = (labels == np.argmax(sizes)).astype(float)
 
     return lines
 
@@ -86,22 +83,254 @@ def get_component_size(lines: GeoDataFrame) -> GeoDataFrame:
     if "source" not in lines.columns or "target" not in lines.columns:
         lines, _ = make_node_ids(lines)
 
-    edges = [
-        (str(source), str(target))
-        for source, target in zip(lines["source"], lines["target"], strict=True)
+    labels, sizes = _get_component_labels(lines)
+
+    lines["component_size"] = np.take(sizes, labels)
+
+    return lines
+
+
+def _get_component_labels(lines: GeoDataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """Finds the connected components of the undirected graph of the lines.
+
+    The node ids are factorized to integers from 0, so that the graph can be made as
+    a sparse matrix with one row and column per node.
+
+    Returns:
+        The component number of each line and the number of nodes in each component.
+    """
+    node_ids, _ = pd.factorize(
+        np.concatenate([lines["source"].values, lines["target"].values])
+    )
+    source, target = np.split(node_ids, 2)
+    n_nodes = len(node_ids) and node_ids.max() + 1
+
+    graph = coo_matrix(
+        (np.ones(len(source), dtype=np.int8), (source, target)),
+        shape=(n_nodes, n_nodes),
+    )
+    _, node_labels = connected_components(graph, directed=False)
+
+    return node_labels[source], np.bincount(node_labels)
+
+
+def _get_chains(
+    source: np.ndarray, target: np.ndarray, both_ways: np.ndarray
+) -> DataFrame:
+    """Finds chains of lines joined at nodes with exactly two neighbour nodes.
+
+    A node can be passed through in a chain if it has two neighbour nodes and either
+    one line in and one line out, or, for lines going both ways, two lines in from
+    and two lines out to the two neighbours, and if the lines of the node are either
+    all or none of the lines going both ways. The lines are linked to the next line
+    of their chain, and the chains are ordered with pointer jumping, so that the
+    number of iterations grows with the logarithm of the length of the longest chain.
+
+    Args:
+        source: the integer source node id of each line.
+        target: the integer target node id of each line.
+        both_ways: boolean array of whether each line can be passed in both
+            directions, like all lines of undirected networks. These lines can be
+            reversed in the chains.
+
+    Returns:
+        A DataFrame with the row number of the line ('row'), the number of its chain
+        ('chain'), its order in the chain ('order') and whether the line is reversed
+        in the chain ('reversed'), sorted by chain and order. Lines in rings without
+        other lines are chains of their own.
+    """
+    n_rows = len(source)
+    both_ways_rows = np.flatnonzero(both_ways)
+    edge_row = np.concatenate([np.arange(n_rows), both_ways_rows])
+    edge_source = np.concatenate([source, target[both_ways_rows]])
+    edge_target = np.concatenate([target, source[both_ways_rows]])
+    is_reversed = np.repeat([False, True], [n_rows, len(both_ways_rows)])
+
+    n_edges = len(edge_row)
+    n_nodes = max(edge_source.max(), edge_target.max()) + 1 if n_edges else 0
+
+    in_degree = np.bincount(edge_target, minlength=n_nodes)
+    out_degree = np.bincount(edge_source, minlength=n_nodes)
+    unique_in = np.unique(np.column_stack([edge_target, edge_source]), axis=0)
+    unique_out = np.unique(np.column_stack([edge_source, edge_target]), axis=0)
+    n_in_neighbours = np.bincount(unique_in[:, 0], minlength=n_nodes)
+    n_out_neighbours = np.bincount(unique_out[:, 0], minlength=n_nodes)
+    n_neighbours = np.bincount(
+        np.unique(np.concatenate([unique_in, unique_out]), axis=0)[:, 0],
+        minlength=n_nodes,
+    )
+    # the lines going one way and both ways are not merged
+    is_one_way = ~both_ways[edge_row]
+    has_both_ways = np.bincount(edge_source[~is_one_way], minlength=n_nodes) > 0
+    has_one_way = (
+        np.bincount(
+            np.concatenate([edge_source[is_one_way], edge_target[is_one_way]]),
+            minlength=n_nodes,
+        )
+        > 0
+    )
+    can_pass = (
+        (n_neighbours == 2)
+        & (in_degree == n_in_neighbours)
+        & (out_degree == n_out_neighbours)
+        & (in_degree == out_degree)
+        & (in_degree <= 2)
+        & ~(has_both_ways & has_one_way)
+    )
+
+    # the next line is the one going out of the target node, but not back again
+    out_edges = np.argsort(edge_source, kind="stable")
+    first_out = np.searchsorted(edge_source[out_edges], np.arange(n_nodes))
+    passing = np.flatnonzero(can_pass[edge_target])
+    node = edge_target[passing]
+    candidate = out_edges[np.minimum(first_out[node], n_edges - 1)]
+    other = out_edges[np.minimum(first_out[node] + 1, n_edges - 1)]
+    goes_back = edge_target[candidate] == edge_source[passing]
+    next_edge = np.where(goes_back, other, candidate)
+
+    prev_edge = np.arange(n_edges)
+    prev_edge[next_edge] = passing
+    order = (prev_edge != np.arange(n_edges)).astype(int)
+
+    # jump to the first line of the chain, adding up the number of lines passed
+    for _ in range(int(np.ceil(np.log2(max(n_edges, 2)))) + 1):
+        order = order + order[prev_edge]
+        prev_edge = prev_edge[prev_edge]
+    chain = prev_edge
+
+    # lines in rings have not reached a first line, and are kept as they are
+    in_ring = prev_edge[chain] != chain
+    chain = np.where(in_ring, np.arange(n_edges), chain)
+    order = np.where(in_ring, 0, order)
+
+    chains = DataFrame(
+        {
+            "row": edge_row,
+            "chain": chain,
+            "order": order,
+            "reversed": is_reversed,
+        }
+    ).sort_values(["chain", "order"])
+
+    # chains of lines going both ways are found in both directions. Keeping the one
+    # starting with the lowest row number, or the unreversed line for chains of one
+    # line. Lines going one way can not be passed through from lines going both ways,
+    # so the chains have either kind of line
+    first_row = chains.groupby("chain")["row"].transform("first")
+    last_row = chains.groupby("chain")["row"].transform("last")
+    is_single = first_row == last_row
+    chains = chains.loc[
+        ~both_ways[chains["row"].values]
+        | (is_single & ~chains["reversed"])
+        | (~is_single & (first_row < last_row))
     ]
 
-    graph = nx.Graph()
-    graph.add_edges_from(edges)
-    components = [list(x) for x in nx.connected_components(graph)]
+    chains["chain"] = pd.factorize(chains["chain"])[0]
 
-    componentsdict = {
-        idx: len(component) for component in components for idx in component
-    }
+    return chains.reset_index(drop=True)
 
-    lines["component_size"] = lines.source.map(componentsdict)
 
-    return lines
+def _merge_chains(geoms: np.ndarray, chains: DataFrame) -> np.ndarray:
+    """Merges the lines of each chain into one LineString.
+
+    The coordinates of the lines are ordered by the chain, the order in the chain and
+    the position in the line, which is reversed for reversed lines. The first point
+    of each line after the first is dropped, since it is the last point of the line
+    before.
+
+    Args:
+        geoms: array of LineStrings.
+        chains: DataFrame from _get_chains with one row per line.
+
+    Returns:
+        An array with one LineString per chain.
+    """
+    coords, coord_row = get_coordinates(
+        geoms, return_index=True, include_z=bool(has_z(geoms).any())
+    )
+
+    row = chains["row"].values
+    row_chain = np.empty(len(geoms), dtype=int)
+    row_chain[row] = chains["chain"].values
+    row_order = np.empty(len(geoms), dtype=int)
+    row_order[row] = chains["order"].values
+    row_reversed = np.empty(len(geoms), dtype=bool)
+    row_reversed[row] = chains["reversed"].values
+
+    first_coord = np.searchsorted(coord_row, np.arange(len(geoms)))
+    position = np.arange(len(coords)) - first_coord[coord_row]
+    position = np.where(row_reversed[coord_row], -position, position)
+
+    sorter = np.lexsort((position, row_order[coord_row], row_chain[coord_row]))
+    coords = coords[sorter]
+    coord_row = coord_row[sorter]
+
+    is_line_start = np.diff(coord_row, prepend=-1) != 0
+    keep = ~(is_line_start & (row_order[coord_row] > 0))
+
+    return linestrings(coords[keep], indices=row_chain[coord_row][keep])
+
+
+def _get_deadend_trees(
+    source: np.ndarray, target: np.ndarray
+) -> tuple[pd.Index, np.ndarray, np.ndarray]:
+    """Finds the nodes of trees that hang off the rest of the network.
+
+    Nodes with one neighbour node are removed one at a time, until all remaining nodes
+    have at least two neighbours. The removed nodes are in dead-end trees, and get
+    their last neighbour as parent, which is the next node towards the rest of the
+    network. The direction of the lines is ignored, since a route into a dead-end tree
+    must leave through the same node.
+
+    Args:
+        source: array of source node ids.
+        target: array of target node ids.
+
+    Returns:
+        The unique node ids, a boolean array of whether each node is in a dead-end
+        tree and an array of the position of the parent node, which is -1 for nodes
+        not in dead-end trees and for the last node of isolated trees.
+    """
+    codes, nodes = pd.factorize(np.concatenate([source, target]))
+    source, target = np.split(codes, 2)
+    n_nodes = len(nodes)
+
+    # the neighbours are counted once, no matter the number of lines between them
+    pairs = np.unique(
+        np.minimum(source, target).astype(np.int64) * n_nodes
+        + np.maximum(source, target)
+    )
+    first, second = np.divmod(pairs, n_nodes)
+    is_loop = first == second
+    first, second = first[~is_loop], second[~is_loop]
+
+    degree = np.bincount(first, minlength=n_nodes) + np.bincount(
+        second, minlength=n_nodes
+    )
+
+    # the xor of the neighbours is the last neighbour when only one is left
+    neighbours_xor = np.zeros(n_nodes, dtype=np.int64)
+    np.bitwise_xor.at(neighbours_xor, first, second)
+    np.bitwise_xor.at(neighbours_xor, second, first)
+
+    is_deadend = np.zeros(n_nodes, dtype=bool)
+    parent = np.full(n_nodes, -1, dtype=np.int64)
+
+    leaves = np.flatnonzero(degree <= 1)
+    while len(leaves):
+        is_deadend[leaves] = True
+        leaves = leaves[degree[leaves] == 1]
+        parents = neighbours_xor[leaves]
+        parent[leaves] = parents
+
+        degree[leaves] = 0
+        np.subtract.at(degree, parents, 1)
+        np.bitwise_xor.at(neighbours_xor, parents, leaves)
+
+        parents = np.unique(parents)
+        leaves = parents[(degree[parents] <= 1) & ~is_deadend[parents]]
+
+    return pd.Index(nodes), is_deadend, parent
 
 
 def split_lines_at_closest_point(
@@ -109,10 +338,14 @@ def split_lines_at_closest_point(
     points: GeoDataFrame,
     max_dist: int | None = None,
 ) -> DataFrame:
-    """Snaps points to lines and splits the lines in two at the snap point.
+    """Snaps points to lines and splits the lines at the snap points.
+
+    Each point splits its closest line at the closest point on the line. Lines with
+    more than one point are split at all of them, and the parts meet at the exact
+    snapped points. Points snapped to the endpoints of a line do not split it.
 
     Args:
-        lines: GeoDataFrame of lines that will be split
+        lines: GeoDataFrame of singlepart lines that will be split
         points: GeoDataFrame of points to split the lines with
         max_dist: the maximum distance between the point and the line.
             Points further away than max_dist will not split any lines.
@@ -120,126 +353,65 @@ def split_lines_at_closest_point(
 
     Returns:
         A GeoDataFrame with the same columns as the input lines, but with the lines
-        split at the closest point to the points.
+        split at the closest point to the points. The split lines get the value 1 in
+        the column 'splitted'.
 
     Raises:
         ValueError: If the crs of the input data differs.
     """
-    BUFFDIST = 0.000001
-
     if points.crs != lines.crs:
         raise ValueError("crs mismatch:", points.crs, "and", lines.crs)
 
-    lines["temp_idx_"] = lines.index
+    # need consistent coordinate dimensions in the new lines
+    geoms = force_2d(lines.geometry.values)
 
-    # move the points to the nearest exact point of the line (to_node=False)
-    # and get the line index ('id_col')
-    snapped = snap_to(
-        points,
-        lines,
-        max_dist=max_dist,
-        to_node=False,
-        id_col="temp_idx_",
+    # find the closest line of each point and how far along the line it is
+    point_geoms = force_2d(points.geometry.values)
+    point_idx, line_idx = STRtree(geoms).query_nearest(
+        point_geoms, max_distance=max_dist, all_matches=False
     )
+    split_distances = line_locate_point(geoms[line_idx], point_geoms[point_idx])
 
-    condition = lines["temp_idx_"].isin(snapped["temp_idx_"])
-    relevant_lines = lines.loc[condition]
-    the_other_lines = lines.loc[~condition]
-
-    # need consistent coordinate dimensions later
-    # (doing it down here to not overwrite the original data)
-    relevant_lines.geometry = force_2d(relevant_lines.geometry)
-    snapped.geometry = force_2d(snapped.geometry)
-
-    # split the lines with buffer + difference, since shaply.split usually doesn't work
-    splitted = relevant_lines.overlay(
-        buff(snapped, BUFFDIST), how="difference"
-    ).explode(ignore_index=True)
-
-    # the endpoints of the new lines are now sligtly off. To get the exact snapped
-    # point coordinates, using get_k_nearest_neighbors. This will map the sligtly
-    # off line endpoints with the point the line was split by.
-
-    # columns that will be used as id_cols in get_k_nearest_neighbors
-    splitted["splitidx"] = splitted.index
-    snapped["point_coords"] = [(geom.x, geom.y) for geom in snapped.geometry]
-
-    # get the endpoints of the lines as columns
-    splitted = make_edge_coords_cols(splitted)
-
-    # create geodataframes with the source and target points as geometries
-    splitted_source = to_gdf(
-        {
-            "splitidx": splitted["splitidx"],
-            "geometry": splitted["source_coords"],
-        },
-        crs=lines.crs,
+    # points snapped to the ends of the lines do not split them
+    is_inside = (split_distances > 0) & (
+        split_distances < shapely_length(geoms[line_idx])
     )
-    splitted_target = to_gdf(
-        {
-            "splitidx": splitted["splitidx"],
-            "geometry": splitted["target_coords"],
-        },
-        crs=lines.crs,
+    splits = DataFrame(
+        {"line": line_idx[is_inside], "distance": split_distances[is_inside]}
     )
 
-    # find the nearest snapped point for each source and target of the lines
-    # low 'max_dist' makes sure we only get either source or target of the split lines
-    dists_source = get_k_nearest_neighbors(
-        splitted_source,
-        snapped,
-        k=1,
-        max_dist=BUFFDIST * 2,
-        id_cols=("splitidx", "point_coords"),
+    # each split line goes from 0 to the first split distance, then to the next and
+    # so on, and the last part ends at the end of the line
+    split_rows = splits["line"].unique()
+    cuts = (
+        pd.concat(
+            [
+                splits,
+                DataFrame({"line": split_rows, "distance": 0.0}),
+                DataFrame({"line": split_rows, "distance": np.inf}),
+            ]
+        )
+        .drop_duplicates()
+        .sort_values(["line", "distance"])
     )
-    dists_target = get_k_nearest_neighbors(
-        splitted_target,
-        snapped,
-        k=1,
-        max_dist=BUFFDIST * 2,
-        id_cols=("splitidx", "point_coords"),
+    cut_line = cuts["line"].values
+    cut_distance = cuts["distance"].values
+    is_same_line = cut_line[1:] == cut_line[:-1]
+
+    part_line = cut_line[1:][is_same_line]
+
+    splitted = lines.iloc[part_line]
+    splitted.geometry = _line_substrings(
+        geoms,
+        part_line,
+        start=cut_distance[:-1][is_same_line],
+        end=cut_distance[1:][is_same_line],
     )
-
-    # use the id columns from k-neighbours to map line id with snapped point
-    splitdict_source = {
-        idx: coords
-        for idx, coords in zip(
-            dists_source["splitidx"], dists_source["point_coords"], strict=True
-        )
-    }
-    splitdict_target = {
-        idx: coords
-        for idx, coords in zip(
-            dists_target["splitidx"], dists_target["point_coords"], strict=True
-        )
-    }
-
-    # now, we can finally replace the source/target coordinate with the coordinates of
-    # the snapped points.
-
-    # loop for each line where the source is the endpoint that was split
-    # change the first point of the line to the point it was split by
-    for idx in dists_source.splitidx:
-        line = splitted.loc[idx, "geometry"]
-        coordslist = list(line.coords)
-        coordslist[0] = splitdict_source[idx]
-        splitted.loc[idx, "geometry"] = LineString(coordslist)
-
-    # same for the lines where the target was split, but change the last point of the
-    # line
-    for idx in dists_target.splitidx:
-        line = splitted.loc[idx, "geometry"]
-        coordslist = list(line.coords)
-        coordslist[-1] = splitdict_target[idx]
-        splitted.loc[idx, "geometry"] = LineString(coordslist)
-
     splitted["splitted"] = 1
 
-    lines = gdf_concat([the_other_lines, splitted]).drop(
-        ["temp_idx_", "splitidx", "source_coords", "target_coords"], axis=1
-    )
+    the_other_lines = lines.loc[~np.isin(np.arange(len(lines)), split_rows)]
 
-    return lines
+    return gdf_concat([the_other_lines, splitted])
 
 
 def cut_lines(gdf: GeoDataFrame, max_length: int, ignore_index=True) -> GeoDataFrame:
@@ -255,56 +427,131 @@ def cut_lines(gdf: GeoDataFrame, max_length: int, ignore_index=True) -> GeoDataF
         A GeoDataFrame with lines cut to the maximum distance.
 
     Note:
-        This method is time consuming for large networks and low 'max_length'.
+        The lines are cut in one pass. Each line is cut every 'max_length' from its
+        start, so all pieces except the last of each line are 'max_length' long.
     """
     gdf["geometry"] = force_2d(gdf.geometry)
 
     gdf = gdf.explode(ignore_index=ignore_index)
 
-    long_lines = gdf.loc[gdf.length > max_length]
+    is_long = (gdf.length > max_length).values
 
-    if not len(long_lines):
+    if not any(is_long):
         return gdf
 
-    def cut(line, distance):
-        """From the shapely docs, but added unary_union in the returns."""
-        if distance <= 0.0 or distance >= line.length:
-            return line
-        coords = list(line.coords)
-        for i, p in enumerate(coords):
-            prd = line.project(Point(p))
-            if prd == distance:
-                return unary_union(
-                    [LineString(coords[: i + 1]), LineString(coords[i:])]
-                )
-            if prd > distance:
-                cp = line.interpolate(distance)
-                return unary_union(
-                    [
-                        LineString(coords[:i] + [(cp.x, cp.y)]),
-                        LineString([(cp.x, cp.y)] + coords[i:]),
-                    ]
-                )
+    long_lines = gdf.loc[is_long]
 
-    cut_vectorised = np.vectorize(cut)
+    # cut every 'max_length' from the start of each line
+    n_pieces = np.ceil(long_lines.length.values / max_length).astype(int)
+    line_idx = np.repeat(np.arange(len(long_lines)), n_pieces)
+    piece_number = np.arange(len(line_idx)) - np.repeat(
+        np.cumsum(n_pieces) - n_pieces, n_pieces
+    )
+    is_last_piece = piece_number == n_pieces[line_idx] - 1
+
+    pieces = _line_substrings(
+        long_lines.geometry.values,
+        line_idx,
+        start=piece_number * max_length,
+        end=np.where(is_last_piece, np.inf, (piece_number + 1) * max_length),
+    )
 
-    for x in [10, 5, 1]:
-        max_ = max(long_lines.length)
-        while max_ > max_length * x + 1:
-            max_ = max(long_lines.length)
+    long_lines = long_lines.iloc[line_idx]
+    long_lines.geometry = pieces
 
-            long_lines["geometry"] = cut_vectorised(long_lines.geometry, max_length)
+    short_lines = gdf.loc[~is_long]
 
-            long_lines = long_lines.explode(ignore_index=ignore_index)
+    return pd.concat([short_lines, long_lines], ignore_index=ignore_index)
 
-            if max_ == max(long_lines.length):
-                break
 
-    long_lines = long_lines.explode(ignore_index=ignore_index)
+def _line_substrings(
+    geoms: np.ndarray,
+    line_idx: np.ndarray,
+    start: np.ndarray,
+    end: np.ndarray,
+    normalized: bool = False,
+) -> np.ndarray:
+    """Makes the parts of LineStrings between a start and end distance along the lines.
 
-    short_lines = gdf.loc[gdf.length <= max_length]
+    The distance of each vertex from the start of the first line is accumulated
+    over all lines at once, so that the vertices of all parts can be found with
+    searchsorted on the cumulative distances. The start and end points are
+    interpolated between the vertices before and after them, so that parts that meet
+    at the same distance get the exact same point. Parts starting at 0 and ending at
+    the length of the line (or beyond) get the line's own endpoints.
 
-    return pd.concat([short_lines, long_lines], ignore_index=ignore_index)
+    Args:
+        geoms: array of singlepart LineStrings.
+        line_idx: the position in 'geoms' of the line of each part.
+        start: the distance along the line where each part starts.
+        end: the distance along the line where each part ends.
+        normalized: If True, the distances are fractions of the line lengths.
+
+    Returns:
+        An array of LineStrings with the same length as 'line_idx'.
+    """
+    coords, vertex_line = get_coordinates(geoms, return_index=True)
+
+    first = np.searchsorted(vertex_line, np.arange(len(geoms)), side="left")
+    last = np.searchsorted(vertex_line, np.arange(len(geoms)), side="right") - 1
+
+    segment_lengths = np.zeros(len(coords))
+    segment_lengths[1:] = np.hypot(*(coords[1:] - coords[:-1]).T)
+    segment_lengths[first[first < len(coords)]] = 0
+    distances = np.cumsum(segment_lengths)
+
+    line_idx = np.asarray(line_idx)
+    line_start = distances[first[line_idx]]
+    line_length = distances[last[line_idx]] - line_start
+
+    if normalized:
+        start = np.asarray(start) * line_length
+        end = np.asarray(end) * line_length
+
+    start = np.clip(start, 0, line_length)
+    end = np.clip(end, start, line_length)
+
+    def interpolate(distance: np.ndarray) -> np.ndarray:
+        vertex_before = np.clip(
+            np.searchsorted(distances, line_start + distance, side="right") - 1,
+            first[line_idx],
+            np.maximum(last[line_idx] - 1, first[line_idx]),
+        )
+        vertex_after = np.minimum(vertex_before + 1, last[line_idx])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = np.nan_to_num(
+                (line_start + distance - distances[vertex_before])
+                / segment_lengths[vertex_after]
+            )
+        points = coords[vertex_before] + fraction[:, None] * (
+            coords[vertex_after] - coords[vertex_before]
+        )
+        points[distance <= 0] = coords[first[line_idx]][distance <= 0]
+        is_end = distance >= line_length
+        points[is_end] = coords[last[line_idx]][is_end]
+        return points
+
+    start_points = interpolate(start)
+    end_points = interpolate(end)
+
+    # each part goes from its start point to its end point through the vertices
+    # between them
+    inner_from = np.searchsorted(distances, line_start + start, side="right")
+    inner_to = np.searchsorted(distances, line_start + end, side="left")
+    n_coords = np.maximum(inner_to - inner_from, 0) + 2
+
+    part_of_coord = np.repeat(np.arange(len(line_idx)), n_coords)
+    position = np.arange(len(part_of_coord)) - np.repeat(
+        np.cumsum(n_coords) - n_coords, n_coords
+    )
+    vertex = np.clip(
+        inner_from[part_of_coord] + position - 1, 0, max(len(coords) - 1, 0)
+    )
+    part_coords = coords[vertex]
+    part_coords[position == 0] = start_points
+    part_coords[position == n_coords[part_of_coord] - 1] = end_points
+
+    return linestrings(part_coords, indices=part_of_coord)
 
 
 def close_network_holes(
@@ -356,13 +603,14 @@ def close_network_holes(
     if not len(new_lines):
         return lines
 
-    new_lines = make_edge_wkt_cols(new_lines)
-
-    wkt_id_dict = {
-        wkt: id for wkt, id in zip(nodes["wkt"], nodes["node_id"], strict=True)
-    }
-    new_lines["source"] = new_lines["source_wkt"].map(wkt_id_dict)
-    new_lines["target"] = new_lines["target_wkt"].map(wkt_id_dict)
+    # the new lines start and end in existing nodes
+    node_ids = pd.Series(
+        nodes["node_id"].values,
+        index=pd.MultiIndex.from_arrays(get_coordinates(nodes.geometry.values).T),
+    )
+    for col, i in [("source", 0), ("target", -1)]:
+        coords = get_coordinates(get_point(new_lines.geometry.values, i))
+        new_lines[col] = node_ids.reindex(pd.MultiIndex.from_arrays(coords.T)).values
 
     if hole_col:
         new_lines[hole_col] = 1
@@ -374,18 +622,28 @@ def close_network_holes(
 def make_node_ids(
     lines: GeoDataFrame,
     wkt: bool = True,
+    tolerance: float | None = None,
 ) -> tuple[GeoDataFrame, GeoDataFrame]:
     """Gives the lines unique node ids and returns lines (edges) and nodes.
 
     Takes the first and last point of each line and creates a GeoDataFrame of
-    nodes (points) with a column 'node_id'. The node ids are then assigned to the
-    input GeoDataFrame of lines as the columns 'source' and 'target'.
+    nodes (points) with the integer column 'node_id'. The node ids are then assigned
+    to the input GeoDataFrame of lines as the columns 'source' and 'target'.
+
+    The nodes are the unique endpoint coordinates, so endpoints get the same node id
+    only if the coordinates are identical, or within the same multiple of the
+    tolerance.
 
     Args:
         lines: GeoDataFrame with line geometries
-        wkt: If True (the default), the resulting nodes will include the column 'wkt',
-            containing the well-known text representation of the geometry. If False, it
-            will include the column 'coords', a tuple with x and y geometries.
+        wkt: If True, the lines will get the columns 'source_wkt' and 'target_wkt'
+            and the nodes the column 'wkt', containing the well-known text
+            representation of the endpoints. Defaults to True.
+        tolerance: optional distance to round the endpoint coordinates to before
+            finding the unique nodes. Endpoints that are rounded to the same
+            coordinates get the same node id, and the node gets the coordinates of
+            the first of these endpoints. Defaults to None, meaning the coordinates
+            must be identical.
 
     Returns:
         A tuple of two GeoDataFrames, one with the lines and one with the nodes.
@@ -393,57 +651,47 @@ def make_node_ids(
     Note:
         The lines must be singlepart linestrings.
     """
-    if wkt:
-        lines = make_edge_wkt_cols(lines)
-        geomcol1, geomcol2, geomcol_final = "source_wkt", "target_wkt", "wkt"
-    else:
-        lines = make_edge_coords_cols(lines)
-        geomcol1, geomcol2, geomcol_final = "source_coords", "target_coords", "coords"
+    lines, source_coords, target_coords = _prepare_make_edge_cols(lines)
 
-    # remove identical lines in opposite directions
-    lines["meters_"] = lines.length.astype(str)
+    # the coordinates of the sources followed by the targets
+    coords = np.concatenate([source_coords, target_coords])
 
-    sources = lines[[geomcol1, geomcol2, "meters_"]].rename(
-        columns={geomcol1: geomcol_final, geomcol2: "temp"}
-    )
-    targets = lines[[geomcol1, geomcol2, "meters_"]].rename(
-        columns={geomcol2: geomcol_final, geomcol1: "temp"}
-    )
+    keys = coords if tolerance is None else np.round(coords / tolerance)
+    _, first, node_ids = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    node_ids = node_ids.ravel()
+    source, target = node_ids[: len(lines)], node_ids[len(lines) :]
 
-    nodes = (
-        pd.concat([sources, targets], axis=0, ignore_index=True)
-        .drop_duplicates([geomcol_final, "temp", "meters_"])
-        .drop("meters_", axis=1)
+    # the number of lines per node, where identical lines in opposite directions are
+    # counted once
+    unique_edges = DataFrame(
+        {
+            "node": node_ids,
+            "other_end": np.concatenate([target, source]),
+            "length": np.tile(lines.length.values, 2),
+        }
+    ).drop_duplicates()
+    n = np.bincount(unique_edges["node"].values, minlength=len(first))
+
+    lines["source"] = source
+    lines["target"] = target
+    lines["n_source"] = n[source]
+    lines["n_target"] = n[target]
+
+    nodes = GeoDataFrame(
+        {
+            "node_id": np.arange(len(first)),
+            "n": n,
+            "geometry": shapely_points(coords[first]),
+        },
+        geometry="geometry",
+        crs=lines.crs,
     )
 
-    lines = lines.drop("meters_", axis=1)
-
-    nodes["n"] = nodes.assign(n=1).groupby(geomcol_final)["n"].transform("sum")
-
-    nodes = nodes.drop_duplicates(subset=[geomcol_final]).reset_index(drop=True)
-
-    nodes["node_id"] = nodes.index
-    nodes["node_id"] = nodes["node_id"].astype(str)
-
-    id_dict = {
-        geom: node_id
-        for geom, node_id in zip(nodes[geomcol_final], nodes["node_id"], strict=True)
-    }
-    lines["source"] = lines[geomcol1].map(id_dict)
-    lines["target"] = lines[geomcol2].map(id_dict)
-
-    n_dict = {geom: n for geom, n in zip(nodes[geomcol_final], nodes["n"], strict=True)}
-    lines["n_source"] = lines[geomcol1].map(n_dict)
-    lines["n_target"] = lines[geomcol2].map(n_dict)
-
     if wkt:
-        nodes["geometry"] = gpd.GeoSeries.from_wkt(nodes[geomcol_final], crs=lines.crs)
-    else:
-        nodes["geometry"] = GeoSeries(
-            [Point(geom) for geom in nodes[geomcol_final]], crs=lines.crs
-        )
-    nodes = gpd.GeoDataFrame(nodes, geometry="geometry", crs=lines.crs)
-    nodes = nodes.reset_index(drop=True)
+        node_wkt = np.array([f"POINT ({x} {y})" for x, y in coords[first]])
+        nodes.insert(0, "wkt", node_wkt)
+        lines["source_wkt"] = node_wkt[source]
+        lines["target_wkt"] = node_wkt[target]
 
     lines = push_geom_col(lines)
 
@@ -451,31 +699,30 @@ def make_node_ids(
 
 
 def make_edge_coords_cols(lines: GeoDataFrame) -> GeoDataFrame:
-    """Get the wkt of the first and last points of lines as columns.
+    """Get the coordinates of the first and last points of lines as columns.
 
-    It takes a GeoDataFrame of LineStrings and returns a GeoDataFrame with two new
-    columns, source_coords and target_coords, which are the x and y coordinates of the
-    first and last points of the LineStrings in a tuple. The lines all have to be
+    It takes a GeoDataFrame of LineStrings and returns a GeoDataFrame with four new
+    columns, source_x, source_y, target_x and target_y, which are the x and y
+    coordinates of the first and last points of the LineStrings. The lines all have
+    to be singlepart LineStrings.
 
     Args:
         lines (GeoDataFrame): the GeoDataFrame with the lines
 
     Returns:
-        A GeoDataFrame with new columns 'source_coords' and 'target_coords'
+        A GeoDataFrame with new columns 'source_x', 'source_y', 'target_x' and
+        'target_y'
     """
-    lines, endpoints = _prepare_make_edge_cols(lines)
+    lines, source, target = _prepare_make_edge_cols(lines)
 
-    coords = [(geom.x, geom.y) for geom in endpoints.geometry]
-    lines["source_coords"], lines["target_coords"] = (
-        coords[0::2],
-        coords[1::2],
-    )
+    lines["source_x"], lines["source_y"] = source[:, 0], source[:, 1]
+    lines["target_x"], lines["target_y"] = target[:, 0], target[:, 1]
 
     return lines
 
 
 def make_edge_wkt_cols(lines: GeoDataFrame) -> GeoDataFrame:
-    """Get coordinate tuples of the first and last points of lines as columns.
+    """Get the wkt of the first and last points of lines as columns.
 
     It takes a GeoDataFrame of LineStrings and returns a GeoDataFrame with two new
     columns, source_wkt and target_wkt, which are the WKT representations of the first
@@ -487,15 +734,10 @@ def make_edge_wkt_cols(lines: GeoDataFrame) -> GeoDataFrame:
     Returns:
         A GeoDataFrame with new columns 'source_wkt' and 'target_wkt'
     """
-    lines, endpoints = _prepare_make_edge_cols(lines)
+    lines, source, target = _prepare_make_edge_cols(lines)
 
-    wkt_geom = [
-        f"POINT ({x} {y})" for x, y in zip(endpoints.x, endpoints.y, strict=True)
-    ]
-    lines["source_wkt"], lines["target_wkt"] = (
-        wkt_geom[0::2],
-        wkt_geom[1::2],
-    )
+    lines["source_wkt"] = [f"POINT ({x} {y})" for x, y in source]
+    lines["target_wkt"] = [f"POINT ({x} {y})" for x, y in target]
 
     return lines
 
@@ -528,101 +770,87 @@ def _find_holes_all_lines(
     Returns:
         A GeoDataFrame with the shortest line between the two points.
     """
-    # wkt: well-known text, e.g. "POINT (60 10)"
-
     crs = nodes.crs
 
     # remove duplicates of lines going both directions
-    lines["sorted"] = [
-        "_".join(sorted([s, t]))
-        for s, t in zip(lines["source"], lines["target"], strict=True)
-    ]
-
-    no_dups = lines.drop_duplicates("sorted")
+    sorted_ids = np.sort(lines[["source", "target"]].values, axis=1)
+    no_dups = lines.loc[~DataFrame(sorted_ids).duplicated().values]
 
     # make new node ids without bidirectional lines
-    no_dups, nodes = make_node_ids(no_dups)
-
-    # deadends are the target endpoints of the lines appearing once
-    deadends_target = no_dups.loc[no_dups.n_target == 1].rename(
-        columns={"target_wkt": "wkt", "source_wkt": "wkt_other_end"}
+    no_dups, nodes = make_node_ids(no_dups, wkt=False)
+
+    # deadends are the endpoints of the lines appearing once. The node ids are the
+    # row numbers of the nodes
+    is_deadend_source = (no_dups["n_source"] == 1).values
+    is_deadend_target = (no_dups["n_target"] == 1).values
+    deadend_ids = np.concatenate(
+        [
+            no_dups["source"].values[is_deadend_source],
+            no_dups["target"].values[is_deadend_target],
+        ]
     )
-    deadends_source = no_dups.loc[no_dups.n_source == 1].rename(
-        columns={"source_wkt": "wkt", "target_wkt": "wkt_other_end"}
+    other_end_ids = np.concatenate(
+        [
+            no_dups["target"].values[is_deadend_source],
+            no_dups["source"].values[is_deadend_target],
+        ]
+    )
+    deadends_lengths = np.concatenate(
+        [
+            no_dups.length.values[is_deadend_source],
+            no_dups.length.values[is_deadend_target],
+        ]
     )
 
-    deadends = pd.concat([deadends_source, deadends_target], ignore_index=True)
-
-    if len(deadends) <= 1:
+    if len(deadend_ids) <= 1:
         return []
 
-    deadends_lengths = deadends.length
-
-    deadends_other_end = deadends.copy()
-    deadends_other_end["geometry"] = gpd.GeoSeries.from_wkt(
-        deadends_other_end["wkt_other_end"], crs=crs
-    )
-
-    deadends["geometry"] = gpd.GeoSeries.from_wkt(deadends["wkt"], crs=crs)
+    nodes_array = get_coordinates(nodes.geometry.values)
+    deadends_array = nodes_array[deadend_ids]
+    other_end_array = nodes_array[other_end_ids]
 
-    deadends_array = coordinate_array(deadends)
+    all_dists, all_indices = k_nearest_neighbors(deadends_array, nodes_array, k=k)
 
-    nodes_array = coordinate_array(nodes)
+    # the first neighbour is the deadend itself
+    dists = all_dists[:, 1:]
+    indices = all_indices[:, 1:]
 
-    all_dists, all_indices = k_nearest_neighbors(deadends_array, nodes_array, k=k)
+    # the distance from the other end of the deadends to the k neighbours
+    dists_other_end = np.linalg.norm(
+        nodes_array[indices] - other_end_array[:, np.newaxis, :], axis=2
+    )
 
-    # now to find the lines that go in the right direction. Collecting the startpoints
-    # and endpoints of the new lines in lists, looping through the k neighbour points
-    new_sources: list[str] = []
-    new_targets: list[str] = []
-    for i in np.arange(1, k):
-        # to break out of the loop if no new_targets that meet the condition are found
-        len_now = len(new_sources)
-
-        # selecting the arrays for the k neighbour
-        indices = all_indices[:, i]
-        dists = all_dists[:, i]
-
-        # get the distance from the other end of the deadends to the k neighbours
-        dists_source = deadends_other_end.distance(nodes.loc[indices], align=False)
-
-        # select the distances between min_dist and max_dist that are also shorter than
-        # the distance from the other side of the line, meaning the new line will go
-        # forward. All arrays have the same shape, and can be easily filtered by index
-        # The node wkts have to be extracted after indexing 'indices'
-        condition = (
-            (dists < max_dist)
-            & (dists > min_dist)
-            & (dists < dists_source - deadends_lengths * length_factor / 100)
+    # the new line must be between min_dist and max_dist and shorter than the
+    # distance from the other end of the deadend line, meaning it will go forward
+    is_valid = (
+        (dists < max_dist)
+        & (dists > min_dist)
+        & (
+            dists
+            < dists_other_end - deadends_lengths[:, np.newaxis] * length_factor / 100
         )
-        from_wkt = deadends.loc[condition, "wkt"]
-        to_idx = indices[condition]
-        to_wkt = nodes.loc[to_idx, "wkt"]
-
-        # now add the wkts to the lists of new sources and targets. If the source
-        # is already added, the new wks will not be added again
-        new_targets = new_targets + [
-            t for f, t in zip(from_wkt, to_wkt, strict=True) if f not in new_sources
-        ]
-        new_sources = new_sources + [
-            f for f, _ in zip(from_wkt, to_wkt, strict=True) if f not in new_sources
-        ]
+    )
 
-        # break out of the loop when no new new_targets meet the condition
-        if len_now == len(new_sources):
-            break
+    # each deadend is connected to its closest valid neighbour. Neighbours further
+    # away than the first rank where no deadends get their first valid neighbour are
+    # not considered
+    has_valid = is_valid.any(axis=1)
+    first_valid = np.argmax(is_valid, axis=1)
+    n_per_rank = np.bincount(first_valid[has_valid], minlength=indices.shape[1] + 1)
+    last_rank = np.argmin(n_per_rank)
+    keep = has_valid & (first_valid < last_rank)
+
+    # order the new lines by the rank of the neighbour, then by deadend
+    deadend_idx = np.flatnonzero(keep)
+    deadend_idx = deadend_idx[np.argsort(first_valid[deadend_idx], kind="stable")]
+    to_idx = indices[deadend_idx, first_valid[deadend_idx]]
 
     # make GeoDataFrame with straight lines
-    new_sources = gpd.GeoSeries.from_wkt(new_sources, crs=crs)
-    new_targets = gpd.GeoSeries.from_wkt(new_targets, crs=crs)
-    new_lines = shortest_line(new_sources, new_targets)
+    new_lines = linestrings(
+        np.stack([deadends_array[deadend_idx], nodes_array[to_idx]], axis=1)
+    )
     new_lines = gpd.GeoDataFrame({"geometry": new_lines}, geometry="geometry", crs=crs)
 
-    if not len(new_lines):
-        return new_lines
-
-    new_lines = make_edge_wkt_cols(new_lines)
-
     return new_lines
 
 
@@ -683,11 +911,21 @@ def _find_holes_deadends(
 
 def _prepare_make_edge_cols(
     lines: GeoDataFrame,
-) -> tuple[GeoDataFrame, GeoDataFrame]:
+) -> tuple[GeoDataFrame, np.ndarray, np.ndarray]:
+    """Removes rings and returns the lines and the coordinates of their endpoints.
+
+    Returns:
+        The lines without LinearRings, closed LineStrings and empty geometries, and
+        two arrays of shape (n, 2) with the x and y coordinates of the first and
+        last points of the lines.
+
+    Raises:
+        ValueError: If the lines are not singlepart LineStrings.
+    """
     lines = lines.loc[lines.geom_type != "LinearRing"]
 
     if not all(lines.geom_type == "LineString"):
-        if all(lines.geom_type.isin(["LineString", "MultiLinestring"])):
+        if all(lines.geom_type.isin(["LineString", "MultiLineString"])):
             raise ValueError(
                 "MultiLineStrings have more than two endpoints. "
                 "Try explode() to get LineStrings."
@@ -698,20 +936,30 @@ def _prepare_make_edge_cols(
                 "allowed in make_edge_wkt_cols."
             )
 
-    # some LinearRings are coded as LineStrings and need to be removed manually
-    boundary = lines.geometry.boundary
-    circles = boundary.loc[boundary.is_empty]
-    lines = lines[~lines.index.isin(circles.index)]
+    lines = lines.loc[~lines.is_empty.values]
 
-    endpoints = lines.geometry.boundary.explode(ignore_index=True)
+    source, target = _get_endpoint_coords(lines.geometry.values)
+
+    # some LinearRings are coded as LineStrings and need to be removed manually, as
+    # well as lines of zero length. These start and end in the same point
+    is_closed = (source == target).all(axis=1)
+    if is_closed.any():
+        lines = lines.loc[~is_closed]
+        source, target = source[~is_closed], target[~is_closed]
+
+    return lines, source, target
 
-    if len(endpoints) / len(lines) != 2:
-        raise ValueError(
-            "The lines should have only two endpoints each. "
-            "Try splitting multilinestrings with explode."
-        )
 
-    return lines, endpoints
+def _get_endpoint_coords(geoms: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the coordinates of the first and last point of non-empty geometries.
+
+    The coordinates are taken from one array of all coordinates, which is faster than
+    making the endpoints as points first.
+    """
+    coords, geom_idx = get_coordinates(geoms, return_index=True)
+    is_first = np.diff(geom_idx, prepend=-1) != 0
+    is_last = np.diff(geom_idx, append=-1) != 0
+    return coords[is_first], coords[is_last]
 
 
 def _roundabouts_to_intersections(roads, query="ROADTYPE=='Rundkjøring'"):
@@ -5,8 +5,14 @@ get_route_frequencies and service_area.
 """
 
 
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import compress, repeat
+from pathlib import Path
+from tempfile import TemporaryDirectory
 from time import perf_counter
+from typing import IO
 
 import igraph
 import numpy as np
@@ -14,18 +20,54 @@ import pandas as pd
 from geopandas import GeoDataFrame
 from igraph import Graph
 from pandas import DataFrame
-
-from ._get_route import _get_route
-from ._od_cost_matrix import _od_cost_matrix
+from scipy.sparse import csr_matrix, vstack
+from shapely import STRtree, get_coordinates, get_num_coordinates, line_locate_point
+from shapely import points as shapely_points
+from shapely import reverse
+
+from ._cost_summary import CostSummary
+from ._get_route import _NO_PATHS_ERROR, _get_route
+from ._od_cost_matrix import (
+    _get_search_direction,
+    _is_symmetric,
+    _mirror_lower_triangle,
+    _od_cost_matrix,
+)
+from ._parquet_sink import MemorySink, ParquetSink, _read_sink
 from ._points import Destinations, Origins
+from ._profiler import Profiler, stops_profiling
+from ._progress import Progress
 from ._service_area import _service_area
 from .directednetwork import DirectedNetwork
+from .exceptions import MemoryLimitError
 from .geopandas_utils import gdf_concat, push_geom_col
-from .network import Network, _edge_ids
-from .network_functions import split_lines_at_closest_point
+from .network import (
+    Network,
+    _backward_edge_ids,
+    _edge_ids,
+    _get_backward_weights,
+    _goes_both_ways,
+)
+from .network_functions import _line_substrings
 from .networkanalysisrules import NetworkAnalysisRules
 
 
+# approximate number of result rows per chunk when writing to a sink or reporting
+# progress. Service areas are counted per origin
+_OD_ROWS_PER_CHUNK = 1_000_000
+_ROUTES_PER_CHUNK = 10_000
+_SERVICE_AREAS_PER_CHUNK = 100
+
+# rough number of bytes in memory while calculating, used to choose the chunk sizes
+# from the memory_limit. Routes are estimated to pass the square root of the number
+# of edges
+_BYTES_PER_OD_PAIR = 150
+_BYTES_PER_OD_LINE = 250
+_BYTES_PER_ROUTE_EDGE = 100
+_BYTES_PER_COORDINATE = 50
+_BYTES_PER_VERTEX = 100
+
+
 class NetworkAnalysis:
     """Class for doing network analysis.
 
@@ -35,6 +77,8 @@ class NetworkAnalysis:
         network: the Network instance
         rules: the NetworkAnalysisRules instance
         log: A DataFrame with information about each analysis run
+        profile: A DataFrame with the seconds and peak memory of each stage of the
+            analysis runs, if 'profile' is True.
         origins: the origins used in the latest analysis run, in the form of an Origins
             class instance. The GeoDataFrame is stored in the 'gdf' attribute, with a
             column 'missing' that can be used for investigation/debugging. So, write
@@ -193,6 +237,12 @@ class NetworkAnalysis:
         rules: NetworkAnalysisRules,
         log: bool = True,
         detailed_log: bool = True,
+        float32_costs: bool = False,
+        profile: bool = False,
+        profile_hook: Callable[[dict], None] | None = None,
+        memory_limit: int | None = None,
+        progress_hook: Callable[[dict], bool | None] | None = None,
+        prune_deadends: bool = False,
     ):
         """Checks types and does some validation.
 
@@ -206,6 +256,44 @@ class NetworkAnalysis:
             detailed_log: If True (the default), will include all arguments passed to
                 the analysis methods and the standard deviation, 25th, 50th and 75th
                 percentile of the weight column in the results.
+            float32_costs: If True, the weight column of the results will be float32
+                instead of float64, which halves its memory use. Defaults to False.
+            profile: If True, the wall time and peak memory of each stage of the
+                analysis runs are stored in the 'profile' attribute, along with the
+                number of graph vertices and edges, sources searched from and costs
+                or routes found. The stages are 'validate_weight', 'points',
+                'check_changes', 'update_nodes', 'snap', 'prune', 'graph', 'search',
+                'ids', 'geometry' and 'write'. Memory is measured with tracemalloc, which
+                slows down the analysis. Defaults to False.
+            profile_hook: optional function that is called with the profile record
+                of each analysis run as a dict, e.g. to send it to a metrics system.
+                Only used if profile is True.
+            memory_limit: optional number of bytes that od_cost_matrix, get_route,
+                get_k_routes, get_route_frequencies and service_area should use while
+                calculating.
+                The memory use per origin is estimated from the number of
+                destinations, the network and the requested output, and the origins
+                are run in chunks that fit within the limit. Long od_cost_matrix and
+                get_route results are then written to a temporary parquet file chunk
+                by chunk and read back, so the chunks and the full results are not in
+                memory at the same time. The results themselves must fit in memory,
+                unless written to a sink. Defaults to None, meaning no limit.
+            progress_hook: optional function that od_cost_matrix, get_route,
+                get_k_routes and service_area call after each chunk of origins is
+                done, with a dict with the keys 'method', 'chunk', 'origins_done',
+                'origins_total', 'rows', 'seconds_elapsed', 'origins_per_second' and
+                'seconds_remaining'. The origins are then run in chunks. If the
+                function returns True, the run is cancelled, and the results of the
+                chunks that are done are returned, or kept in the sink. The log then
+                gets the column 'cancelled'. Defaults to None.
+            prune_deadends: If True, the dead-end trees of the network without any
+                origins or destinations are left out of the graph in od_cost_matrix,
+                get_route, get_k_routes and get_route_frequencies, since no route
+                between the points can pass through them. This makes the searches
+                faster on networks with many dead ends, without changing the costs,
+                although another route of the same cost can be chosen.
+                The dead-end trees are found once for each network. Service areas
+                always use the whole network. Defaults to False.
 
         Raises:
             TypeError: if 'rules' is not of type NetworkAnalysisRules
@@ -215,6 +303,13 @@ class NetworkAnalysis:
         self.rules = rules
         self._log = log
         self.detailed_log = detailed_log
+        self.float32_costs = float32_costs
+        self.memory_limit = memory_limit
+        self.progress_hook = progress_hook
+        self.prune_deadends = prune_deadends
+        self._graph_is_pruned = False
+        self._batch_vertices = None
+        self._profiler = Profiler(enabled=profile, hook=profile_hook)
 
         if not isinstance(rules, NetworkAnalysisRules):
             raise TypeError(
@@ -237,9 +332,39 @@ class NetworkAnalysis:
         self._update_wkts()
         self.rules._update_rules()
 
-        if log:
-            self.log = DataFrame()
+        # the log is kept as a list of one dict per run, and made into a DataFrame
+        # when accessed
+        self._log_records: list[dict] = []
+        self._log_frame: DataFrame | None = None
+
+    @property
+    def log(self) -> DataFrame:
+        """DataFrame with information about each analysis run, one row per run."""
+        if not self._log:
+            raise AttributeError(
+                "The NetworkAnalysis has no log. Set log=True when creating it."
+            )
+        if self._log_frame is None or len(self._log_frame) != len(self._log_records):
+            self._log_frame = DataFrame(self._log_records)
+        return self._log_frame
+
+    @log.setter
+    def log(self, df: DataFrame) -> None:
+        self._log_records = df.to_dict("records")
+        self._log_frame = None
+
+    @property
+    def profile(self) -> DataFrame:
+        """DataFrame with one row per analysis run with the profiled stages.
+
+        The columns are the method, the total seconds and peak memory in megabytes,
+        the seconds and peak memory of each stage, e.g. 'search_seconds' and
+        'search_peak_mb', and the counts 'vertices', 'edges', 'sources' and
+        'reached'. Empty if the NetworkAnalysis was created with profile=False.
+        """
+        return DataFrame(self._profiler.records)
 
+    @stops_profiling
     def od_cost_matrix(
         self,
         origins: GeoDataFrame,
@@ -250,7 +375,14 @@ class NetworkAnalysis:
         rowwise: bool = False,
         cutoff: int | None = None,
         destination_count: int | None = None,
-    ) -> DataFrame | GeoDataFrame:
+        output: str = "long",
+        sink: str | IO | None = None,
+    ) -> (
+        DataFrame
+        | GeoDataFrame
+        | tuple[np.ndarray | csr_matrix, np.ndarray, np.ndarray]
+        | None
+    ):
         """Fast calculation of many-to-many travel costs.
 
         Finds the the lowest cost (minutes, meters, etc.) from a set of origins to a
@@ -262,8 +394,8 @@ class NetworkAnalysis:
             destinations: GeoDataFrame of points from where the trips will terminate
             id_col: column(s) to be used as identifier for the origins and
                 destinations. If two different columns, put it in a tuple as
-                ("origin_col", "destination_col") If None, an arbitrary id will be
-                returned.
+                ("origin_col", "destination_col") If None, the row number of the
+                points will be returned. Text ids are returned as Categoricals.
             lines: if True, returns a geometry column with straight lines between
                 origin and destination. Defaults to False.
             rowwise: if False (the default), it will calculate the cost from each
@@ -276,11 +408,32 @@ class NetworkAnalysis:
                 If None (the default), all trips will be included. The number of
                 destinations might be higher than the destination count if trips have
                 equal cost.
+            output: 'long' (the default) to return a long DataFrame with one row per
+                trip. 'array' to return a float32 numpy matrix with one row per
+                origin and one column per destination, with NaN for missing or removed
+                trips. 'sparse' to return a scipy csr_matrix without the missing or
+                removed trips, which is most memory efficient when cutoff or
+                destination_count is specified. The matrices are calculated for
+                chunks of origins, so only the final matrix is held in full size. The
+                matrix formats cannot be combined with lines, rowwise or sink.
+            sink: optional path to a local parquet file, or a writable file object,
+                e.g. from the open method of an fsspec filesystem. If specified, the
+                results are calculated for chunks of origins and written to the
+                parquet file as one row group per chunk, so the full results are never
+                held in memory. Geometries are written as WKB. Defaults to None.
 
         Returns:
             A DataFrame with the columns 'origin', 'destination' and the weight column.
             If lines is True, adds a geometry column with straight lines between origin
-            and destination.
+            and destination. If output is 'array' or 'sparse', a tuple of the cost
+            matrix and arrays with the ids of the matrix rows (origins) and columns
+            (destinations). None if sink is specified.
+
+        Raises:
+            ValueError: If output is not 'long', 'array' or 'sparse', or if a matrix
+                output is combined with lines, rowwise or sink.
+            MemoryLimitError: If the NetworkAnalysis has a memory_limit, and one
+                origin is estimated to need more memory than the limit.
 
         Examples
         --------
@@ -365,37 +518,134 @@ class NetworkAnalysis:
 
         [228579 rows x 3 columns]
 
+        Get the costs as a matrix with the origin and destination ids. Each row holds
+        the costs from one origin.
+
+        >>> matrix, origin_ids, destination_ids = nwa.od_cost_matrix(
+        ...     points, points, id_col="idx", output="array"
+        ... )
+        >>> matrix.shape
+        (1000, 1000)
+
         """
+        if output not in ["long", "array", "sparse"]:
+            raise ValueError("'output' should be 'long', 'array' or 'sparse'.")
+        if output != "long" and (lines or rowwise or sink is not None):
+            raise ValueError(
+                f"output={output!r} cannot be combined with lines, rowwise or sink."
+            )
+
         if self._log:
             time_ = perf_counter()
 
         self._prepare_network_analysis(origins, destinations, id_col)
 
-        results = _od_cost_matrix(
-            graph=self.graph,
-            origins=self.origins.gdf,
-            destinations=self.destinations.gdf,
-            weight=self.rules.weight,
-            lines=lines,
-            cutoff=cutoff,
-            destination_count=destination_count,
-            rowwise=rowwise,
+        rows_per_chunk = self._get_rows_per_chunk(
+            _BYTES_PER_OD_PAIR + (_BYTES_PER_OD_LINE if lines else 0), rowwise
         )
 
-        self.origins._get_n_missing(results, "origin")
-        self.destinations._get_n_missing(results, "destination")
+        # results that don't fit the memory_limit are spilled to a temporary file
+        spill = (
+            TemporaryDirectory()
+            if rows_per_chunk and sink is None and output == "long"
+            else None
+        )
+        if spill is not None:
+            sink = str(Path(spill.name) / "od_cost_matrix.parquet")
+
+        if sink is not None or (output == "long" and self.progress_hook is not None):
+            search_directions = set()
+
+            def results_in_chunks():
+                for ori, des in self._get_chunks(
+                    rowwise,
+                    min(rows_per_chunk or _OD_ROWS_PER_CHUNK, _OD_ROWS_PER_CHUNK),
+                ):
+                    search_from = _get_search_direction(ori, des)
+                    search_directions.add(search_from)
+                    with self._profiler.stage("search"):
+                        results = _od_cost_matrix(
+                            graph=self.graph,
+                            origins=ori,
+                            destinations=des,
+                            weight=self.rules.weight,
+                            lines=lines,
+                            cutoff=cutoff,
+                            destination_count=destination_count,
+                            rowwise=rowwise,
+                            search_from=search_from,
+                            directed=self.network._as_directed,
+                        )
+                    yield len(ori), results
+
+            results, summary, cancelled = self._write_chunks(
+                "od_cost_matrix", results_in_chunks(), sink
+            )
+            self._finish_profile("od_cost_matrix", summary.n_valid)
+
+            if self._log:
+                minutes_elapsed = round((perf_counter() - time_) / 60, 1)
+                self._runlog(
+                    "od_cost_matrix",
+                    summary,
+                    minutes_elapsed,
+                    search_from=", ".join(sorted(search_directions)),
+                    lines=lines,
+                    cutoff=cutoff,
+                    destination_count=destination_count,
+                    rowwise=rowwise,
+                    cancelled=cancelled,
+                )
+
+            if spill is None:
+                return results
+            with spill:
+                return _read_sink(sink)
+
+        # the matrices are made for chunks of origins, so only the final matrix is
+        # held in full size
+        if output != "long":
+            matrix, search_from, cancelled = self._od_cost_matrix_in_chunks(
+                min(rows_per_chunk or _OD_ROWS_PER_CHUNK, _OD_ROWS_PER_CHUNK),
+                output,
+                cutoff,
+                destination_count,
+            )
+            return self._od_cost_array_results(
+                matrix,
+                time_ if self._log else None,
+                search_from,
+                cutoff,
+                destination_count,
+                cancelled,
+            )
 
-        if id_col:
-            results["origin"] = results["origin"].map(self.origins.id_dict)
-            results["destination"] = results["destination"].map(
-                self.destinations.id_dict
+        search_from = _get_search_direction(self.origins.gdf, self.destinations.gdf)
+        with self._profiler.stage("search"):
+            results = _od_cost_matrix(
+                graph=self.graph,
+                origins=self.origins.gdf,
+                destinations=self.destinations.gdf,
+                weight=self.rules.weight,
+                lines=lines,
+                cutoff=cutoff,
+                destination_count=destination_count,
+                rowwise=rowwise,
+                search_from=search_from,
+                directed=self.network._as_directed,
             )
 
+        with self._profiler.stage("ids"):
+            self.origins._get_n_missing(results, "origin")
+            self.destinations._get_n_missing(results, "destination")
+            results = self._get_ids_and_cost_dtype(results)
+
         if lines:
             results = push_geom_col(results)
 
-        if self.rules.split_lines:
-            self._unsplit_network()
+        self._finish_profile(
+            "od_cost_matrix", results[self.rules.weight].notna().sum(), search_from
+        )
 
         if self._log:
             minutes_elapsed = round((perf_counter() - time_) / 60, 1)
@@ -403,6 +653,7 @@ class NetworkAnalysis:
                 "od_cost_matrix",
                 results,
                 minutes_elapsed,
+                search_from=search_from,
                 lines=lines,
                 cutoff=cutoff,
                 destination_count=destination_count,
@@ -411,6 +662,7 @@ class NetworkAnalysis:
 
         return results
 
+    @stops_profiling
     def get_route(
         self,
         origins: GeoDataFrame,
@@ -420,7 +672,8 @@ class NetworkAnalysis:
         rowwise: bool = False,
         cutoff: int | None = None,
         destination_count: int | None = None,
-    ) -> GeoDataFrame:
+        sink: str | IO | None = None,
+    ) -> GeoDataFrame | None:
         """Returns the geometry of the low-cost route between origins and destinations.
 
         Finds the route with the lowest cost (minutes, meters, etc.) from a set of
@@ -431,7 +684,7 @@ class NetworkAnalysis:
             origins: GeoDataFrame of points from where the routes will originate
             destinations: GeoDataFrame of points from where the routes will terminate
             id_col: optional column to be used as identifier of the service areas. If
-                None, an arbitrary id will be used.
+                None, the row number of the points will be used.
             rowwise: if False (the default), it will calculate the cost from each
                 origins to each destination. If true, it will calculate the cost from
                 origin 1 to destination 1, origin 2 to destination 2 and so on.
@@ -442,10 +695,17 @@ class NetworkAnalysis:
                 If None (the default), all trips will be included. The number of
                 destinations might be higher than the destination count if trips have
                 equal cost.
+            sink: optional path to a local parquet file, or a writable file object,
+                e.g. from the open method of an fsspec filesystem. If specified, the
+                results are calculated for chunks of origins and written to the
+                parquet file as one row group per chunk, so the full results are never
+                held in memory. Geometries are written as WKB. Defaults to None.
 
         Returns:
             A GeoDataFrame with the columns 'origin', 'destination', the weight
             column and the geometry of the route between origin and destination.
+            None if sink is specified, or if the run was cancelled by the
+            progress_hook before any routes were found.
 
         Raises:
             ValueError: if no paths were found.
@@ -477,44 +737,16 @@ class NetworkAnalysis:
 
         self._prepare_network_analysis(origins, destinations, id_col)
 
-        results = _get_route(
-            graph=self.graph,
-            origins=self.origins.gdf,
-            destinations=self.destinations.gdf,
-            weight=self.rules.weight,
-            roads=self.network.gdf,
+        return self._get_routes(
+            "get_route",
+            time_ if self._log else None,
+            rowwise=rowwise,
             cutoff=cutoff,
             destination_count=destination_count,
-            rowwise=rowwise,
+            sink=sink,
         )
 
-        self.origins._get_n_missing(results, "origin")
-        self.destinations._get_n_missing(results, "destination")
-
-        if id_col:
-            results["origin"] = results["origin"].map(self.origins.id_dict)
-            results["destination"] = results["destination"].map(
-                self.destinations.id_dict
-            )
-
-        results = push_geom_col(results)
-
-        if self.rules.split_lines:
-            self._unsplit_network()
-
-        if self._log:
-            minutes_elapsed = round((perf_counter() - time_) / 60, 1)
-            self._runlog(
-                "get_route",
-                results,
-                minutes_elapsed,
-                cutoff=cutoff,
-                destination_count=destination_count,
-                rowwise=rowwise,
-            )
-
-        return results
-
+    @stops_profiling
     def get_k_routes(
         self,
         origins: GeoDataFrame,
@@ -551,7 +783,7 @@ class NetworkAnalysis:
                 If set to 0, all but the first and last edge will be removed. The
                 graph is copied for each od pair.
             id_col: optional column to be used as identifier of the service areas. If
-                None, an arbitrary id will be used.
+                None, the row number of the points will be used.
             rowwise: if False (the default), it will calculate the cost from each
                 origins to each destination. If true, it will calculate the cost from
                 origin 1 to destination 1, origin 2 to destination 2 and so on.
@@ -566,6 +798,8 @@ class NetworkAnalysis:
         Returns:
             A GeoDataFrame with the columns 'origin', 'destination', the weight
             column and the geometry of the route between origin and destination.
+            None if the run was cancelled by the progress_hook before any routes
+            were found.
 
         Raises:
             ValueError: if no paths were found.
@@ -627,46 +861,17 @@ class NetworkAnalysis:
 
         self._prepare_network_analysis(origins, destinations, id_col)
 
-        results = _get_route(
-            graph=self.graph,
-            origins=self.origins.gdf,
-            destinations=self.destinations.gdf,
-            weight=self.rules.weight,
-            roads=self.network.gdf,
+        return self._get_routes(
+            "get_k_routes",
+            time_ if self._log else None,
+            rowwise=rowwise,
             cutoff=cutoff,
             destination_count=destination_count,
-            rowwise=rowwise,
             k=k,
             drop_middle_percent=drop_middle_percent,
         )
 
-        self.origins._get_n_missing(results, "origin")
-        self.destinations._get_n_missing(results, "destination")
-
-        if id_col:
-            results["origin"] = results["origin"].map(self.origins.id_dict)
-            results["destination"] = results["destination"].map(
-                self.destinations.id_dict
-            )
-
-        results = push_geom_col(results)
-
-        if self.rules.split_lines:
-            self._unsplit_network()
-
-        if self._log:
-            minutes_elapsed = round((perf_counter() - time_) / 60, 1)
-            self._runlog(
-                "get_k_routes",
-                results,
-                minutes_elapsed,
-                cutoff=cutoff,
-                destination_count=destination_count,
-                rowwise=rowwise,
-            )
-
-        return results
-
+    @stops_profiling
     def get_route_frequencies(
         self,
         origins: GeoDataFrame,
@@ -692,6 +897,8 @@ class NetworkAnalysis:
 
         Raises:
             ValueError: if no paths were found.
+            MemoryLimitError: If the NetworkAnalysis has a memory_limit, and one
+                origin is estimated to need more memory than the limit.
 
         Examples
         --------
@@ -720,21 +927,54 @@ class NetworkAnalysis:
 
         self._prepare_network_analysis(origins, destinations, None)
 
-        results = _get_route(
-            graph=self.graph,
-            origins=self.origins.gdf,
-            destinations=self.destinations.gdf,
-            weight=self.rules.weight,
-            roads=self.network.gdf,
-            summarise=True,
+        roads = self._get_lines()
+
+        n_pairs = len(self.origins.gdf) * len(self.destinations.gdf)
+        rows_per_chunk = self._get_rows_per_chunk(
+            self._route_edges() * _BYTES_PER_ROUTE_EDGE, rowwise=False
         )
 
+        # the visits of each edge are counted for chunks of origins and added up
+        counted = []
+        for ori, des in self._get_chunks(False, rows_per_chunk or n_pairs):
+            with self._profiler.stage("search"):
+                counted.append(
+                    _get_route(
+                        graph=self.graph,
+                        origins=ori,
+                        destinations=des,
+                        weight=self.rules.weight,
+                        roads=roads,
+                        summarise=True,
+                        raise_if_empty=False,
+                    )
+                )
+
+        counted = [n for n in counted if n is not None]
+        if not counted:
+            raise ValueError(_NO_PATHS_ERROR)
+        counted = pd.concat(counted).groupby(level=0).sum()
+
+        n = pd.Series(_edge_ids(roads, self.rules.weight)).map(counted)
+
+        # lines going both ways are counted in both directions
+        if self.network._as_directed:
+            rows, backward_edge_ids = _backward_edge_ids(roads, self.rules.weight)
+            n.iloc[rows] = n.iloc[rows].add(
+                pd.Series(backward_edge_ids, index=n.index[rows]).map(counted),
+                fill_value=0,
+            )
+
+        roads = roads.assign(n=n.values)
+        results = roads.loc[
+            roads["n"].notna(), roads.columns.difference(["source_target_weight"])
+        ]
+
         results = push_geom_col(results)
 
         results = results.sort_values("n")
 
-        if self.rules.split_lines:
-            self._unsplit_network()
+        self._finish_profile("get_route_frequencies", len(results))
 
         if self._log:
             minutes_elapsed = round((perf_counter() - time_) / 60, 1)
@@ -746,6 +986,7 @@ class NetworkAnalysis:
 
         return results
 
+    @stops_profiling
     def service_area(
         self,
         origins: GeoDataFrame,
@@ -768,7 +1009,7 @@ class NetworkAnalysis:
                 maximum weight for the service areas. Calculates multiple areas for
                 each origins if multiple breaks.
             id_col: optional column to be used as identifier of the service areas.
-                If None, an arbitrary id will be used.
+                If None, the row number of the points will be used.
             drop_duplicates: If True (the default), duplicate lines from the same
                 origin will be removed. Priority is given to the lower break values,
                 meaning the highest break will only cover the outermost ring of the
@@ -790,6 +1031,10 @@ class NetworkAnalysis:
             the columns of the network.gdf as well. The columns 'source' and 'target'
             can be used to remove duplicates, or count occurences.
 
+        Raises:
+            MemoryLimitError: If the NetworkAnalysis has a memory_limit, and one
+                origin is estimated to need more memory than the limit.
+
         Examples
         --------
         Service areas of 5, 10 and 15 minutes from three origin points.
@@ -815,46 +1060,96 @@ class NetworkAnalysis:
         if self._log:
             time_ = perf_counter()
 
-        self._prepare_network_analysis(origins, id_col=id_col)
+        # the dead ends are part of the service areas, so they are not pruned
+        self._prepare_network_analysis(origins, id_col=id_col, can_prune=False)
 
         # sort the breaks as an np.ndarray
         breaks = self._sort_breaks(breaks)
 
-        results = _service_area(
-            graph=self.graph,
-            origins=self.origins.gdf,
-            weight=self.rules.weight,
-            lines=self.network.gdf,
-            breaks=breaks,
-        )
+        lines = self._get_lines(replace_split_lines=True)
 
-        if drop_duplicates:
-            results = results.drop_duplicates(["source", "target", "origin"])
+        # the merged lines of a simplified network are replaced by the original lines
+        original_lines = self.network._get_original_lines(self.rules.weight)
+        if original_lines is not None:
+            if self._split_edges is None:
+                lines = lines.iloc[:0]
+            else:
+                original_lines = original_lines.loc[
+                    ~original_lines["_merged_row"].isin(self._split_edges["row"])
+                ]
+                lines = self._get_split_lines()
+
+        # the lines are copied for each break before duplicates are dropped
+        rows_per_chunk = self._get_rows_per_chunk(
+            self.graph.vcount() * _BYTES_PER_VERTEX
+            + (len(lines) + len(original_lines if original_lines is not None else []))
+            * np.size(breaks)
+            * 8
+            * len(lines.columns),
+            rowwise=False,
+        )
 
-        if dissolve:
-            results = (
-                results.dissolve(by=["origin", self.rules.weight])
-                .reset_index()
-                .loc[:, ["origin", self.rules.weight, "geometry"]]
+        if self.progress_hook is not None:
+            rows_per_chunk = min(
+                rows_per_chunk or _SERVICE_AREAS_PER_CHUNK, _SERVICE_AREAS_PER_CHUNK
             )
 
-        # add missing rows as NaNs
-        missing = self.origins.gdf.loc[
-            ~self.origins.gdf["temp_idx"].isin(results["origin"])
+        # the service areas are made for chunks of origins
+        chunks = []
+        n_reached = 0
+        progress = Progress("service_area", len(self.origins.gdf), self.progress_hook)
+        for ori, _ in self._get_chunks(False, rows_per_chunk or len(self.origins.gdf)):
+            with self._profiler.stage("search"):
+                results = _service_area(
+                    graph=self.graph,
+                    origins=ori,
+                    weight=self.rules.weight,
+                    lines=lines,
+                    breaks=breaks,
+                    original_lines=original_lines,
+                )
+
+            n_reached += len(results)
+
+            with self._profiler.stage("geometry"):
+                if drop_duplicates:
+                    results = results.drop_duplicates(["source", "target", "origin"])
+
+                if dissolve:
+                    results = (
+                        results.dissolve(by=["origin", self.rules.weight])
+                        .reset_index()
+                        .loc[:, ["origin", self.rules.weight, "geometry"]]
+                    )
+
+            chunks.append(results)
+
+            if progress.update(len(ori), sum(len(chunk) for chunk in chunks)):
+                break
+
+        results = chunks[0] if len(chunks) == 1 else gdf_concat(chunks)
+
+        # add missing rows as NaNs for the origins that were run
+        origins_done = self.origins.gdf.iloc[: progress.origins_done]
+        missing = origins_done.loc[
+            ~origins_done["temp_idx"].isin(results["origin"])
         ].rename(columns={"temp_idx": "origin"})[["origin"]]
 
         if len(missing):
             missing["geometry"] = np.nan
             results = pd.concat([results, missing], ignore_index=True)
 
+        with self._profiler.stage("ids"):
+            results["origin"] = self.origins._get_ids(results["origin"])
+        if self.float32_costs:
+            results[self.rules.weight] = results[self.rules.weight].astype("float32")
+
         if id_col:
-            results[id_col] = results["origin"].map(self.origins.id_dict)
-            results = results.drop("origin", axis=1)
+            results = results.rename(columns={"origin": id_col})
 
         results = push_geom_col(results)
 
-        if self.rules.split_lines:
-            self._unsplit_network()
+        self._finish_profile("service_area", n_reached)
 
         if self._log:
             minutes_elapsed = round((perf_counter() - time_) / 60, 1)
@@ -862,14 +1157,15 @@ class NetworkAnalysis:
                 "service_area",
                 results,
                 minutes_elapsed,
+                cancelled=progress.cancelled,
                 breaks=breaks,
                 dissolve=dissolve,
             )
 
         return results
 
-    def _log_df_template(self, method: str, minutes_elapsed: float) -> DataFrame:
-        """Creates a DataFrame with one row and the main columns.
+    def _log_record_template(self, method: str, minutes_elapsed: float) -> dict:
+        """Creates a dict with the main log columns.
 
         To be run after each network analysis.
 
@@ -878,58 +1174,610 @@ class NetworkAnalysis:
             minutes_elapsed: time use of the method
 
         Returns:
-            A one-row DataFrame with log info columns
+            A dict with log info, to be one row in the log.
 
         Note:
             The 'isolated_removed' column does not account for
             preperation done before initialising the (Directed)Network class.
         """
-        df = DataFrame(
-            {
-                "endtime": pd.to_datetime(datetime.now()).floor("S").to_pydatetime(),
-                "minutes_elapsed": minutes_elapsed,
-                "method": method,
-                "origins_count": np.nan,
-                "destinations_count": np.nan,
-                "percent_missing": np.nan,
-                "cost_mean": np.nan,
-                "isolated_removed": self.network._isolated_removed,
-                "percent_bidirectional": self.network.percent_bidirectional,
-            },
-            index=[0],
-        )
+        record = {
+            "endtime": datetime.now().replace(microsecond=0),
+            "minutes_elapsed": minutes_elapsed,
+            "method": method,
+            "origins_count": np.nan,
+            "destinations_count": np.nan,
+            "percent_missing": np.nan,
+            "cost_mean": np.nan,
+            "isolated_removed": self.network._isolated_removed,
+            "percent_bidirectional": self.network.percent_bidirectional,
+        }
 
         for key, value in self.rules.__dict__.items():
             if key.startswith("_") or key.endswith("_"):
                 continue
-            df = pd.concat([df, pd.DataFrame({key: [value]})], axis=1)
+            record[key] = value
+
+        return record
+
+    def run_jobs(
+        self,
+        jobs: list[tuple[str, GeoDataFrame, GeoDataFrame | None, dict]],
+        n_jobs: int = 1,
+    ) -> list[DataFrame | GeoDataFrame | None]:
+        """Runs many analyses with the graph and snapping prepared only once.
+
+        The points of all jobs are snapped to the network and added to the graph in
+        one go. The jobs then only look up the graph vertices of their points, instead
+        of checking the network and points and possibly remaking the graph for each
+        analysis.
+
+        Note:
+            With split_lines=True, the lines are split at the points of all jobs, so
+            the service areas and route frequencies can consist of more and shorter
+            line pieces than when the jobs are run one by one. The costs are the same.
+
+            The points of one job must not be passed through on the way between the
+            points of another job. The graph is therefore directed with the lines in
+            both directions also for undirected networks. In an undirected graph, a
+            point snapped to several nodes connects these nodes, so the costs can be
+            lower when undirected networks are analysed without run_jobs.
+
+        Args:
+            jobs: list of tuples of the method name, the origins, the destinations
+                (None for service_area) and optionally a dict of keyword arguments to
+                the method. The methods can be 'od_cost_matrix', 'get_route',
+                'get_k_routes', 'get_route_frequencies' and 'service_area'. The results
+                can be written to parquet by passing 'sink' to od_cost_matrix or
+                get_route.
+            n_jobs: number of worker processes to run the jobs in. Defaults to 1,
+                meaning the jobs are run one after the other in this process.
+
+        Returns:
+            A list with the results of each job, in the same order as the jobs.
+            The log gets one row per job, with the job's position in the column 'job'.
+
+        Raises:
+            ValueError: If a job has an unknown method, or destinations are missing
+                or given when they shouldn't be.
+
+        Examples
+        --------
+        Travel times within two municipalities and service areas in one of them.
+
+        >>> jobs = [
+        ...     ("od_cost_matrix", points_oslo, points_oslo, {"id_col": "idx"}),
+        ...     ("od_cost_matrix", points_baerum, points_baerum, {"id_col": "idx"}),
+        ...     ("service_area", points_oslo, None, {"breaks": [5, 10]}),
+        ... ]
+        >>> od_oslo, od_baerum, service_areas = nwa.run_jobs(jobs)
+        """
+        return list(self.iter_jobs(jobs, n_jobs=n_jobs))
+
+    def iter_jobs(
+        self,
+        jobs: list[tuple[str, GeoDataFrame, GeoDataFrame | None, dict]],
+        n_jobs: int = 1,
+        raise_if_empty: bool = True,
+    ) -> Iterator[DataFrame | GeoDataFrame | None]:
+        """Runs the jobs like run_jobs, but yields the results as they finish.
+
+        The results are yielded in the same order as the jobs, so that the results
+        of a job can be saved or used before the later jobs are done. The log row of
+        a job is added when the job's results are yielded.
+
+        Args:
+            jobs: list of tuples of the method name, the origins, the destinations
+                (None for service_area) and optionally a dict of keyword arguments to
+                the method. See run_jobs.
+            n_jobs: number of worker processes to run the jobs in. Defaults to 1.
+            raise_if_empty: If True (the default), a job where no paths are found
+                raises a ValueError, like the methods do. If False, the results of
+                the job are None, and the later jobs are still run.
+
+        Yields:
+            The results of each job, in the same order as the jobs. None for jobs
+            without results if 'raise_if_empty' is False.
+
+        Raises:
+            ValueError: If a job has an unknown method, or destinations are missing
+                or given when they shouldn't be.
+        """
+        jobs = [self._validate_job(job) for job in jobs]
+
+        self._prepare_batch(jobs)
+
+        executor = (
+            ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=(self,))
+            if n_jobs != 1
+            else None
+        )
+
+        try:
+            if executor is None:
+                outputs = (_run_job(self, job, raise_if_empty) for job in jobs)
+            else:
+                outputs = executor.map(_run_job_in_worker, jobs, repeat(raise_if_empty))
+
+            for i, (results, log, records) in enumerate(outputs):
+                # the logs and profiles of the worker processes are added to these
+                if executor is not None:
+                    self._profiler.records.extend(records)
+                    self._log_records.extend(log)
+                # jobs without paths are not logged
+                if self._log and log:
+                    self._log_records[-1]["job"] = i
+                    self._log_frame = None
+                yield results
+        finally:
+            self._batch_vertices = None
+            self._profiler.stop()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _validate_job(
+        job: tuple,
+    ) -> tuple[str, GeoDataFrame, GeoDataFrame | None, dict]:
+        method, origins, destinations, *kwargs = job
+        kwargs = kwargs[0] if kwargs else {}
+
+        if method not in _JOB_METHODS:
+            raise ValueError(
+                f"Unknown method {method!r}. Should be one of {', '.join(_JOB_METHODS)}"
+            )
+        if (method == "service_area") != (destinations is None):
+            raise ValueError(
+                "Destinations should be None for service_area, and given for the other "
+                "methods."
+            )
+
+        return method, origins, destinations, kwargs
+
+    def _prepare_batch(self, jobs: list[tuple]) -> None:
+        """Make the graph with all unique point locations of the jobs.
+
+        The locations are added as both origins and destinations, and the graph
+        vertices of each location are stored for lookup in _use_batch_vertices.
+        """
+        points = [job[1] for job in jobs] + [
+            job[2] for job in jobs if job[2] is not None
+        ]
+        coords = np.unique(
+            np.concatenate([get_coordinates(gdf.geometry.values) for gdf in points]),
+            axis=0,
+        )
+        locations = GeoDataFrame(
+            geometry=shapely_points(coords), crs=points[0].crs
+        ).reset_index(drop=True)
+
+        self._prepare_network_analysis(
+            locations,
+            locations,
+            can_prune=all(job[0] != "service_area" for job in jobs),
+            shared_vertices=True,
+        )
+        self._profiler.finish("prepare_batch")
+
+        index = pd.MultiIndex.from_arrays(coords.T)
+        self._batch_vertices = {
+            "origins": pd.Series(self.origins.gdf["temp_vertex"].values, index=index),
+            "destinations": pd.Series(
+                self.destinations.gdf["temp_vertex"].values, index=index
+            ),
+        }
+
+    def _use_batch_vertices(self) -> None:
+        """Give the points the graph vertices of their locations."""
+        for what in ["origins", "destinations"]:
+            if self[what] is None:
+                continue
+            vertices = self._batch_vertices[what]
+            coords = get_coordinates(self[what].gdf.geometry.values)
+            positions = vertices.index.get_indexer(pd.MultiIndex.from_arrays(coords.T))
+            self[what].gdf["temp_vertex"] = vertices.values[positions]
+
+    def _get_routes(
+        self,
+        method: str,
+        time_: float | None,
+        rowwise: bool,
+        cutoff: int | None,
+        destination_count: int | None,
+        sink: str | IO | None = None,
+        k: int = 1,
+        drop_middle_percent: int = 0,
+    ) -> GeoDataFrame | None:
+        """Find the routes of get_route and get_k_routes.
+
+        The routes are found for chunks of origins if they are written to a sink,
+        don't fit within the memory_limit or the progress is reported.
+        """
+        roads = self._get_lines()
+
+        def find_routes(ori, des, raise_if_empty: bool = True):
+            with self._profiler.stage("search"):
+                return _get_route(
+                    graph=self.graph,
+                    origins=ori,
+                    destinations=des,
+                    weight=self.rules.weight,
+                    roads=roads,
+                    cutoff=cutoff,
+                    destination_count=destination_count,
+                    rowwise=rowwise,
+                    k=k,
+                    drop_middle_percent=drop_middle_percent,
+                    raise_if_empty=raise_if_empty,
+                )
+
+        rows_per_chunk = self._get_rows_per_chunk(self._bytes_per_route() * k, rowwise)
+
+        # results that don't fit the memory_limit are spilled to a temporary file
+        spill = TemporaryDirectory() if rows_per_chunk and sink is None else None
+        if spill is not None:
+            sink = str(Path(spill.name) / f"{method}.parquet")
+
+        if sink is None and self.progress_hook is None:
+            results = find_routes(self.origins.gdf, self.destinations.gdf)
+
+            with self._profiler.stage("ids"):
+                self.origins._get_n_missing(results, "origin")
+                self.destinations._get_n_missing(results, "destination")
+                results = self._get_ids_and_cost_dtype(results)
+
+            results = push_geom_col(results)
+            summary, n_routes, cancelled = results, len(results), False
+        else:
+            max_rows = max(_ROUTES_PER_CHUNK // k, 1)
+            results, summary, cancelled = self._write_chunks(
+                method,
+                (
+                    (len(ori), find_routes(ori, des, raise_if_empty=False))
+                    for ori, des in self._get_chunks(
+                        rowwise, min(rows_per_chunk or max_rows, max_rows)
+                    )
+                ),
+                sink,
+            )
+            if not summary.n and not cancelled:
+                raise ValueError(_NO_PATHS_ERROR)
+            n_routes = summary.n
+
+        self._finish_profile(method, n_routes)
+
+        if self._log:
+            minutes_elapsed = round((perf_counter() - time_) / 60, 1)
+            self._runlog(
+                method,
+                summary,
+                minutes_elapsed,
+                cancelled=cancelled,
+                cutoff=cutoff,
+                destination_count=destination_count,
+                rowwise=rowwise,
+            )
+
+        if spill is None:
+            return results
+        with spill:
+            return _read_sink(sink) if n_routes else None
+
+    def _get_chunks(
+        self, rowwise: bool, rows_per_chunk: int
+    ) -> Iterator[tuple[GeoDataFrame, GeoDataFrame]]:
+        """Split the origins in chunks of about 'rows_per_chunk' result rows.
+
+        The destinations are split along with the origins if rowwise is True. The
+        destinations are None if there are none, like in service_area.
+        """
+        origins = self.origins.gdf
+        destinations = self.destinations.gdf if self.destinations is not None else None
+
+        if rowwise or destinations is None:
+            chunk_size = rows_per_chunk
+        else:
+            chunk_size = max(1, rows_per_chunk // max(len(destinations), 1))
+
+        for i in range(0, len(origins), chunk_size):
+            origins_chunk = origins.iloc[i : i + chunk_size]
+            if rowwise:
+                yield origins_chunk, destinations.iloc[i : i + chunk_size]
+            else:
+                yield origins_chunk, destinations
+
+    def _get_rows_per_chunk(self, bytes_per_row: float, rowwise: bool) -> int | None:
+        """Number of result rows to calculate at a time to stay within memory_limit.
+
+        The rows are od pairs, or origins if there are no destinations or rowwise is
+        True. Returns None if there is no memory_limit or all rows fit within it.
 
-        return df
+        Raises:
+            MemoryLimitError: If the rows of one origin need more than memory_limit.
+        """
+        if self.memory_limit is None:
+            return None
+
+        rows_per_origin = (
+            1
+            if rowwise or self.destinations is None
+            else max(len(self.destinations.gdf), 1)
+        )
+        if rows_per_origin * bytes_per_row > self.memory_limit:
+            raise MemoryLimitError(
+                f"One origin is estimated to need {rows_per_origin * bytes_per_row:.0f} "
+                f"bytes, which is more than the memory_limit of {self.memory_limit}. "
+                "Use fewer destinations, or a higher memory_limit."
+            )
+
+        rows_per_chunk = int(self.memory_limit // bytes_per_row)
+        if rows_per_chunk >= len(self.origins.gdf) * rows_per_origin:
+            return None
+        return rows_per_chunk
+
+    def _route_edges(self) -> float:
+        """Rough estimate of the number of edges in a route."""
+        return np.sqrt(self.graph.ecount())
+
+    def _bytes_per_route(self) -> float:
+        """Rough estimate of the memory of a route with its geometry."""
+        coords_per_line = get_num_coordinates(self.network.gdf.geometry.values).mean()
+        return self._route_edges() * (
+            _BYTES_PER_ROUTE_EDGE + coords_per_line * _BYTES_PER_COORDINATE
+        )
+
+    def _od_cost_matrix_in_chunks(
+        self,
+        rows_per_chunk: int,
+        output: str,
+        cutoff: int | None,
+        destination_count: int | None,
+    ) -> tuple[np.ndarray | csr_matrix, str, bool]:
+        """Calculate the cost matrix for chunks of origins and stack the chunks.
+
+        If the costs are symmetric, each chunk is only searched to the destinations
+        from the chunk's first origin and onwards, and the costs to the destinations
+        before are mirrored from the earlier chunks. This is not done with
+        destination_count, since an origin can be among the closest destinations of
+        another origin, but not the other way around.
+
+        Returns the matrix, the search directions used and whether the run was
+        cancelled by the progress_hook. The rows of origins that were not run
+        because of cancellation are NaN, or empty in the sparse matrix.
+        """
+        origins, destinations = self.origins.gdf, self.destinations.gdf
+        shape = (len(origins), len(destinations))
+        is_symmetric = not destination_count and _is_symmetric(
+            self.network._as_directed,
+            origins,
+            destinations,
+            pd.factorize(origins["temp_vertex"])[0],
+            pd.factorize(destinations["temp_vertex"])[0],
+            rowwise=False,
+        )
+        if output == "array":
+            matrix = np.full(shape, np.nan, dtype=np.float32)
+        chunks = []
+        first_columns = np.zeros(shape[0], dtype=int)
+        search_directions = set()
+        progress = Progress("od_cost_matrix", shape[0], self.progress_hook)
+        start = 0
+        for ori, des in self._get_chunks(False, rows_per_chunk):
+            end = start + len(ori)
+            first_column = start if is_symmetric else 0
+            first_columns[start:end] = first_column
+            des = des.iloc[first_column:]
+
+            search_from = _get_search_direction(ori, des)
+            search_directions.add(search_from)
+            with self._profiler.stage("search"):
+                chunk = _od_cost_matrix(
+                    graph=self.graph,
+                    origins=ori,
+                    destinations=des,
+                    weight=self.rules.weight,
+                    cutoff=cutoff,
+                    destination_count=destination_count,
+                    search_from=search_from,
+                    output=output,
+                    directed=self.network._as_directed,
+                )
+            if output == "array":
+                matrix[start:end, first_column:] = chunk
+                matrix[start:end, :first_column] = matrix[:first_column, start:end].T
+            else:
+                chunks.append(
+                    csr_matrix(
+                        (chunk.data, chunk.indices + first_column, chunk.indptr),
+                        shape=(len(ori), shape[1]),
+                    )
+                )
+            start = end
+
+            n_rows = start * shape[1]
+            if progress.update(len(ori), n_rows):
+                break
+
+        if output != "array":
+            if start < shape[0]:
+                chunks.append(
+                    csr_matrix((shape[0] - start, shape[1]), dtype=np.float32)
+                )
+            matrix = vstack(chunks, format="csr")
+            if is_symmetric:
+                matrix = _mirror_lower_triangle(matrix, first_columns, start)
+
+        return matrix, ", ".join(sorted(search_directions)), progress.cancelled
+
+    def _write_chunks(
+        self,
+        method: str,
+        results_in_chunks: Iterable[tuple[int, DataFrame | None]],
+        sink: str | IO | None,
+    ) -> tuple[DataFrame | GeoDataFrame | None, CostSummary, bool]:
+        """Write results to parquet, or collect them, one chunk at a time.
+
+        The chunks are tuples of the number of origins and the results, which are
+        None if no routes were found. The missing values of the origins and
+        destinations and the summary of the costs are added up chunk by chunk. The
+        progress is reported to the progress_hook after each chunk.
+
+        Returns:
+            The collected results if sink is None, the summary of the costs and
+            whether the run was cancelled by the progress_hook.
+        """
+        summary = CostSummary()
+        progress = Progress(method, len(self.origins.gdf), self.progress_hook)
+
+        with MemorySink() if sink is None else ParquetSink(sink) as writer:
+            for n_origins, results in results_in_chunks:
+                if results is not None:
+                    with self._profiler.stage("ids"):
+                        self.origins._get_n_missing(results, "origin", add=True)
+                        self.destinations._get_n_missing(
+                            results, "destination", add=True
+                        )
+                        results = self._get_ids_and_cost_dtype(results)
+
+                    summary.update(results[self.rules.weight])
+
+                    if isinstance(results, GeoDataFrame):
+                        results = push_geom_col(results)
+
+                    with self._profiler.stage("write"):
+                        writer.write(results)
+
+                if progress.update(n_origins, writer.n_rows):
+                    break
+
+        results = writer.result() if sink is None else None
+
+        return results, summary, progress.cancelled
+
+    def _get_ids_and_cost_dtype(self, results: DataFrame) -> DataFrame:
+        """Get the original ids from the temporary ids and make costs float32 if set.
+
+        The ids are the values of the id column, or the row numbers of the origins
+        and destinations if there is no id column.
+        """
+        results["origin"] = self.origins._get_ids(results["origin"])
+        results["destination"] = self.destinations._get_ids(results["destination"])
+
+        if self.float32_costs:
+            results[self.rules.weight] = results[self.rules.weight].astype("float32")
+
+        return results
+
+    def _od_cost_array_results(
+        self,
+        matrix: np.ndarray | csr_matrix,
+        time_: float | None,
+        search_from: str,
+        cutoff: int | None,
+        destination_count: int | None,
+        cancelled: bool,
+    ) -> tuple[np.ndarray | csr_matrix, np.ndarray, np.ndarray]:
+        """Count missing values, log and get the ids of the od_cost_matrix matrix."""
+        is_filtered = bool(cutoff or destination_count)
+
+        n_reached = (
+            matrix.nnz
+            if isinstance(matrix, csr_matrix)
+            else np.count_nonzero(~np.isnan(matrix))
+        )
+        self._finish_profile("od_cost_matrix", n_reached, search_from)
+
+        # the long format has no rows for the trips removed by cutoff or
+        # destination_count, so only unfiltered NaNs are counted as missing
+        if isinstance(matrix, csr_matrix):
+            costs = matrix.data
+            n_missing = [
+                matrix.shape[1] - matrix.getnnz(axis=1),
+                matrix.shape[0] - matrix.getnnz(axis=0),
+            ]
+        else:
+            is_nan = np.isnan(matrix)
+            costs = matrix[~is_nan] if is_filtered else matrix.ravel()
+            n_missing = [is_nan.sum(axis=1), is_nan.sum(axis=0)]
+
+        self.origins.gdf["missing"] = 0 if is_filtered else n_missing[0]
+        self.destinations.gdf["missing"] = 0 if is_filtered else n_missing[1]
+
+        # the row numbers of the points are the ids if there is no id column, like in
+        # the long format
+        origin_ids = (
+            self.origins.gdf[self.origins.id_col].values
+            if self.origins.id_col
+            else np.arange(len(self.origins.gdf))
+        )
+        destination_ids = (
+            self.destinations.gdf[self.destinations.id_col].values
+            if self.destinations.id_col
+            else np.arange(len(self.destinations.gdf))
+        )
+
+        if self._log:
+            minutes_elapsed = round((perf_counter() - time_) / 60, 1)
+            summary = CostSummary()
+            summary.update(costs)
+            self._runlog(
+                "od_cost_matrix",
+                summary,
+                minutes_elapsed,
+                search_from=search_from,
+                cutoff=cutoff,
+                destination_count=destination_count,
+                output="sparse" if isinstance(matrix, csr_matrix) else "array",
+                cancelled=cancelled,
+            )
+
+        return matrix, origin_ids, destination_ids
+
+    def _finish_profile(
+        self, method: str, n_reached: int, search_from: str = "origins"
+    ) -> None:
+        """Count the sources searched from and the costs or routes found."""
+        if not self._profiler.enabled:
+            return
+        sources = self[search_from]
+        self._profiler.count(
+            sources=sources.gdf["temp_vertex"].nunique(), reached=int(n_reached)
+        )
+        self._profiler.finish(method)
 
     def _runlog(
         self,
         fun: str,
-        results: DataFrame | GeoDataFrame,
+        results: DataFrame | GeoDataFrame | CostSummary,
         minutes_elapsed: float,
+        search_from: str | None = None,
+        cancelled: bool = False,
         **kwargs,
     ) -> None:
-        df = self._log_df_template(fun, minutes_elapsed)
+        record = self._log_record_template(fun, minutes_elapsed)
+
+        # whether the shortest paths were searched from the origins or destinations
+        if search_from:
+            record["search_from"] = search_from
 
-        df["origins_count"] = len(self.origins.gdf)
+        # only runs with a progress_hook can be cancelled
+        if self.progress_hook is not None:
+            record["cancelled"] = cancelled
 
-        if self.rules.weight in results.columns:
-            df["percent_missing"] = results[self.rules.weight].isna().mean() * 100
-            df["cost_mean"] = results[self.rules.weight].mean()
-            if self.detailed_log:
-                df["cost_p25"] = results[self.rules.weight].quantile(0.25)
-                df["cost_median"] = results[self.rules.weight].median()
-                df["cost_p75"] = results[self.rules.weight].quantile(0.75)
-                df["cost_std"] = results[self.rules.weight].std()
+        record["origins_count"] = len(self.origins.gdf)
+
+        # the cost statistics are calculated in one pass over the costs, or along the
+        # way for results that are written in chunks
+        if isinstance(results, CostSummary):
+            record |= results.to_dict(self.detailed_log)
+        elif self.rules.weight in results.columns:
+            summary = CostSummary()
+            summary.update(results[self.rules.weight])
+            record |= summary.to_dict(self.detailed_log)
 
         if fun == "service_area":
-            df["percent_missing"] = results["geometry"].isna().mean() * 100
+            record["percent_missing"] = results["geometry"].isna().mean() * 100
         else:
-            df["destinations_count"] = len(self.destinations.gdf)
+            record["destinations_count"] = len(self.destinations.gdf)
 
         if self.detailed_log:
             for key, value in kwargs.items():
@@ -938,63 +1786,116 @@ class NetworkAnalysis:
                 if isinstance(value, (list, tuple)):
                     value = [str(x) for x in value]
                     value = ", ".join(value)
-                df[key] = value
+                record[key] = value
 
-        self.log = pd.concat([self.log, df], ignore_index=True)
+        self._log_records.append(record)
 
     def _prepare_network_analysis(
-        self, origins, destinations=None, id_col: str | None = None
+        self,
+        origins,
+        destinations=None,
+        id_col: str | None = None,
+        can_prune: bool = True,
+        shared_vertices: bool = False,
     ) -> None:
         """Prepares the weight column, node ids, origins, destinations and graph.
 
         Updates the graph only if it is not yet created and no parts of the analysis
         has changed. this method is run inside od_cost_matrix, get_route and
         service_area.
+
+        The dead-end trees are pruned from the graph if prune_deadends is True, unless
+        'can_prune' is False.
+
+        If 'shared_vertices' is True, the vertices of the points are shared by many
+        analyses, like in run_jobs. The graph is then directed also for undirected
+        networks, so that the points cannot be passed through.
         """
-        self.network.gdf = self.rules._validate_weight(
-            self.network.gdf, raise_error=True
-        )
+        prune = self.prune_deadends and can_prune
+        directed = self.network._as_directed or shared_vertices
 
-        self.origins = Origins(
-            origins,
-            id_col=id_col,
-            temp_idx_start=max(self.network.nodes.node_id.astype(int)) + 1,
-        )
+        self._profiler.start()
+
+        # in run_jobs, the network and graph are prepared beforehand
+        if self._batch_vertices is None:
+            with self._profiler.stage("validate_weight"):
+                self.network.gdf = self.rules._validate_weight(
+                    self.network.gdf, raise_error=True
+                )
 
-        if destinations is not None:
-            self.destinations = Destinations(
-                destinations,
+        with self._profiler.stage("points"):
+            self.origins = Origins(
+                origins,
                 id_col=id_col,
-                temp_idx_start=max(self.origins.gdf.temp_idx.astype(int)) + 1,
+                temp_idx_start=max(self.network.nodes.node_id.astype(int)) + 1,
             )
 
-        else:
-            self.destinations = None
+            if destinations is not None:
+                self.destinations = Destinations(
+                    destinations,
+                    id_col=id_col,
+                    temp_idx_start=max(self.origins.gdf.temp_idx.astype(int)) + 1,
+                )
 
-        if not self._graph_is_up_to_date() or not self.network._nodes_are_up_to_date():
-            self.network._update_nodes_if()
+            else:
+                self.destinations = None
 
-            edges, weights = self._get_edges_and_weights()
+            if self._batch_vertices is not None:
+                self._use_batch_vertices()
 
-            self.graph = self._make_graph(
-                edges=edges, weights=weights, directed=self.network._as_directed
+        if self._batch_vertices is not None:
+            self._profiler.count(
+                vertices=self.graph.vcount(), edges=self.graph.ecount()
             )
+            return
 
-            self._add_missing_vertices()
+        with self._profiler.stage("check_changes"):
+            is_up_to_date = (
+                self._graph_is_up_to_date()
+                and self._graph_is_pruned == prune
+                and self.graph.is_directed() == directed
+                and self.network._nodes_are_up_to_date()
+            )
 
-        self._update_wkts()
-        self.rules._update_rules()
+        if not is_up_to_date:
+            with self._profiler.stage("update_nodes"):
+                self.network._update_nodes_if()
 
-    def _get_edges_and_weights(self) -> tuple[list[tuple[str, str]], list[float]]:
-        """Creates lists of edges and weights which will be used to make the graph.
+            with self._profiler.stage("snap"):
+                edges, weights, edge_ids = self._get_edges_and_weights(directed)
+
+            if prune:
+                with self._profiler.stage("prune"):
+                    edges, weights, edge_ids = self._prune_deadends(
+                        edges, weights, edge_ids
+                    )
+            self._graph_is_pruned = prune
+
+            with self._profiler.stage("graph"):
+                self.graph = self._make_graph(
+                    edges=edges, weights=weights, edge_ids=edge_ids, directed=directed
+                )
+                self._add_missing_vertices()
+
+        with self._profiler.stage("check_changes"):
+            self._update_wkts()
+            self.rules._update_rules()
+
+        self._profiler.count(vertices=self.graph.vcount(), edges=self.graph.ecount())
+
+    def _get_edges_and_weights(
+        self, directed: bool
+    ) -> tuple[list[tuple[str, str]], list[float], list[str]]:
+        """Creates lists of edges, weights and edge ids to make the graph with.
 
         Edges and weights between origins and nodes and nodes and destinations are
         also added.
-        """
-        if self.rules.split_lines:
-            self._split_lines()
-            self.network._make_node_ids()
 
+        If the graph is directed and the network undirected, the lines get edges in
+        both directions, so that the origins and destinations can only be passed from
+        and to, not through on the way between other nodes. The reversed edges get the
+        ids of the lines they were made from.
+        """
         edges = [
             (str(source), str(target))
             for source, target in zip(
@@ -1004,60 +1905,325 @@ class NetworkAnalysis:
 
         weights = list(self.network.gdf[self.rules.weight])
 
+        # lines going both ways can be stored once in a DirectedNetwork, and then get
+        # an edge in the backward direction with the backward weight
+        if self.network._as_directed:
+            rows = np.flatnonzero(_goes_both_ways(self.network.gdf))
+            edges = edges + [edges[row][::-1] for row in rows]
+            weights = weights + list(
+                _get_backward_weights(self.network.gdf, self.rules.weight)[rows]
+            )
+
+        # the split lines are created from the edges, and only if needed
+        self._split_lines_gdf = None
+
+        if self.rules.split_lines:
+            split_vertices = self._split_lines()
+            edges = edges + [
+                (source, target)
+                for source, target in zip(
+                    self._split_edges["source"],
+                    self._split_edges["target"],
+                    strict=True,
+                )
+            ]
+            weights = weights + list(self._split_edges[self.rules.weight])
+        else:
+            self._split_edges = None
+            split_vertices = None
+
+        edge_ids = _edge_ids(edges, weights)
+
+        if directed and not self.network._as_directed:
+            edges = edges + [(target, source) for source, target in edges]
+            weights = weights + weights
+            edge_ids = edge_ids + edge_ids
+
         edges_start, weights_start = self.origins._get_edges_and_weights(
-            nodes=self.network.nodes,
+            network=self.network,
             rules=self.rules,
+            split_vertices=split_vertices,
         )
         edges = edges + edges_start
         weights = weights + weights_start
+        edge_ids = edge_ids + _edge_ids(edges_start, weights_start)
 
         if self.destinations is None:
-            return edges, weights
+            return edges, weights, edge_ids
 
         edges_end, weights_end = self.destinations._get_edges_and_weights(
-            nodes=self.network.nodes,
+            network=self.network,
             rules=self.rules,
+            split_vertices=split_vertices,
         )
 
         edges = edges + edges_end
         weights = weights + weights_end
+        edge_ids = edge_ids + _edge_ids(edges_end, weights_end)
+
+        return edges, weights, edge_ids
+
+    def _prune_deadends(
+        self, edges: list[tuple[str, str]], weights: list[float], edge_ids: list[str]
+    ) -> tuple[list[tuple[str, str]], list[float], list[str]]:
+        """Removes the edges of the dead-end trees that have no points.
+
+        The dead-end trees of the network are cached in the Network, so only the
+        nodes the points are connected to have to be checked for each set of points.
+        These nodes are the network nodes of the edges to and from the points and
+        split lines, and the paths from them towards the rest of the network are kept.
+        """
+        nodes, is_deadend, parent = self.network._get_deadend_trees()
+
+        # vertices that are not network nodes, i.e. points and split lines, get -1
+        vertices = nodes.get_indexer(np.array(edges, dtype=object).ravel())
+        vertices = vertices.reshape(-1, 2)
+
+        is_to_point = (vertices < 0).any(axis=1)
+        connected_nodes = vertices[is_to_point].ravel()
+        connected_nodes = np.unique(connected_nodes[connected_nodes >= 0])
+
+        keep = np.zeros(len(nodes), dtype=bool)
+        current = connected_nodes[is_deadend[connected_nodes]]
+        while len(current):
+            keep[current] = True
+            current = np.unique(parent[current])
+            current = current[current >= 0]
+            current = current[is_deadend[current] & ~keep[current]]
+
+        # the -1 of the points and split lines gets the last value, which is False
+        is_removed = np.append(is_deadend & ~keep, False)
+        keep_edge = ~is_removed[vertices].any(axis=1)
+
+        return (
+            list(compress(edges, keep_edge)),
+            list(compress(weights, keep_edge)),
+            list(compress(edge_ids, keep_edge)),
+        )
+
+    def _split_lines(self) -> dict[tuple[float, float], tuple[str, float]]:
+        """Splits the closest line of each point in the graph, not in the network.
 
-        return edges, weights
+        Each point gets a virtual vertex at the closest part of the closest line,
+        given as a fraction of the line's length. The line is split in the graph only,
+        as virtual edges from the source to the vertex and from the vertex to the target
+        with the weight prorated by the fraction. Lines merged by simplify_topology are
+        split by the weights of the original lines instead, so that the costs are the
+        same as in the network before simplifying. Multiple points on the same line
+        are chained in the order they appear along the line, and lines going in the
+        opposite direction with the same length (i.e. two-way roads) get the same
+        vertices.
 
-    def _split_lines(self) -> None:
+        The virtual edges are stored in the '_split_edges' attribute. The line
+        geometries are only made if needed, by the _get_split_lines method.
+
+        Returns:
+            A dict with point coordinates as keys and a tuple of the vertex id and the
+            distance between point and line as values.
+        """
+        points = [self.origins.gdf]
         if self.destinations is not None:
-            points = gdf_concat([self.origins.gdf, self.destinations.gdf])
-        else:
-            points = self.origins.gdf
+            points.append(self.destinations.gdf)
+
+        coords = np.unique(
+            np.concatenate([get_coordinates(gdf.geometry.values) for gdf in points]),
+            axis=0,
+        )
 
-        points = points.drop_duplicates("geometry")
+        lines = self.network.gdf
 
-        self.network.gdf["meters"] = self.network.gdf.length
+        tree = STRtree(lines.geometry.values)
+        (point_idx, line_idx), dists = tree.query_nearest(
+            shapely_points(coords),
+            max_distance=self.rules.search_tolerance,
+            return_distance=True,
+            all_matches=False,
+        )
 
-        # create an id from before the split to be able to revert the split later
-        self.network.gdf["temp_idx__"] = range(len(self.network.gdf))
+        # vertex ids continue where the temporary point ids stopped
+        last_points = points[-1]
+        vertex_idx_start = max(last_points["temp_idx"].astype(int)) + 1
+        vertices = (np.arange(len(point_idx)) + vertex_idx_start).astype(str)
+
+        source = lines["source"].values.astype(str)
+        target = lines["target"].values.astype(str)
+        length = lines.length.values
+        weights = lines[self.rules.weight].values
+        line_rows = np.arange(len(lines))
+
+        # the backward direction of lines stored once for both ways get row numbers
+        # after the lines, like their edges in the graph
+        if self.network._as_directed:
+            rows = np.flatnonzero(_goes_both_ways(lines))
+            source, target = (
+                np.concatenate([source, target[rows]]),
+                np.concatenate([target, source[rows]]),
+            )
+            length = np.concatenate([length, length[rows]])
+            weights = np.concatenate(
+                [weights, _get_backward_weights(lines, self.rules.weight)[rows]]
+            )
+            line_rows = np.concatenate([line_rows, rows])
+        is_backward = np.arange(len(source)) >= len(lines)
 
-        lines = split_lines_at_closest_point(
-            lines=self.network.gdf,
-            points=points,
-            max_dist=self.rules.search_tolerance,
+        snapped = DataFrame(
+            {
+                "vertex": vertices,
+                "row": line_idx,
+                "frac": line_locate_point(
+                    lines.geometry.values[line_idx],
+                    shapely_points(coords[point_idx]),
+                    normalized=True,
+                ),
+                "source": source[line_idx],
+                "target": target[line_idx],
+                "length": length[line_idx],
+            }
         )
 
-        # save the unsplit lines for later
-        splitted = lines.loc[lines["splitted"] == 1, "temp_idx__"]
-        self.network._not_splitted = self.network.gdf.loc[
-            self.network.gdf["temp_idx__"].isin(splitted)
+        # the same line in the opposite direction gets the same vertex
+        opposite = DataFrame(
+            {
+                "row_opposite": np.arange(len(source)),
+                "source": target,
+                "target": source,
+                "length_opposite": length,
+            }
+        )
+        twins = snapped.merge(opposite, on=["source", "target"])
+        twins = twins.loc[
+            (twins["row"] != twins["row_opposite"])
+            & (np.isclose(twins["length"], twins["length_opposite"]))
         ]
+        twins = twins.assign(row=twins["row_opposite"], frac=1 - twins["frac"])
+
+        split = pd.concat(
+            [snapped[["vertex", "row", "frac"]], twins[["vertex", "row", "frac"]]],
+            ignore_index=True,
+        ).sort_values(["row", "frac"], kind="stable")
+
+        # chain the vertices of each line, starting in the source and ending in target
+        row = split["row"].values
+        weight = weights[row]
+        is_first = ~split["row"].duplicated(keep="first").values
+        is_last = ~split["row"].duplicated(keep="last").values
+
+        prev_vertex = np.where(is_first, source[row], split["vertex"].shift().values)
+        prev_frac = np.where(is_first, 0, split["frac"].shift().values)
+
+        # the weights are prorated by length, except on merged lines
+        costs = self.network._get_costs_along_lines(
+            self.rules.weight,
+            line_rows[row],
+            split["frac"].values,
+            is_backward[row],
+        )
+        if costs is None:
+            to_vertex_weights = weight * (split["frac"].values - prev_frac)
+            to_target_weights = weight[is_last] * (1 - split["frac"].values[is_last])
+        else:
+            to_vertex_weights = costs - np.where(is_first, 0, np.roll(costs, 1))
+            to_target_weights = weight[is_last] - costs[is_last]
+
+        to_vertex = DataFrame(
+            {
+                "source": prev_vertex,
+                "target": split["vertex"].values,
+                self.rules.weight: to_vertex_weights,
+                "row": row,
+                "frac_start": prev_frac,
+                "frac_end": split["frac"].values,
+            }
+        )
+        to_target = DataFrame(
+            {
+                "source": split["vertex"].values[is_last],
+                "target": target[row][is_last],
+                self.rules.weight: to_target_weights,
+                "row": row[is_last],
+                "frac_start": split["frac"].values[is_last],
+                "frac_end": 1.0,
+            }
+        )
 
-        self.network.gdf = lines
+        self._split_edges = pd.concat([to_vertex, to_target], ignore_index=True)
 
-    def _unsplit_network(self):
-        """Remove the splitted lines and add the unsplitted ones."""
-        lines = self.network.gdf.loc[self.network.gdf.splitted != 1]
-        self.network.gdf = gdf_concat([lines, self.network._not_splitted]).drop(
-            "temp_idx__", axis=1
+        return {
+            (x, y): (vertex, dist)
+            for (x, y), vertex, dist in zip(
+                coords[point_idx], vertices, dists, strict=True
+            )
+        }
+
+    def _get_split_lines(self) -> GeoDataFrame:
+        """Creates the line geometries of the virtual edges made in _split_lines.
+
+        Only the lines that are split are copied from the network. The geometries are
+        cut at the fractions of the virtual edges, and the source, target and weight
+        are replaced by the ones in the graph.
+        """
+        if self._split_lines_gdf is not None:
+            return self._split_lines_gdf
+
+        edges = self._split_edges
+        lines = self.network.gdf
+
+        # the rows after the lines are the backward direction of lines going both ways
+        row = edges["row"].values
+        frac_start = edges["frac_start"].values
+        frac_end = edges["frac_end"].values
+        is_backward = row >= len(lines)
+        if is_backward.any():
+            both_ways_rows = np.flatnonzero(_goes_both_ways(lines))
+            row = row.copy()
+            row[is_backward] = both_ways_rows[row[is_backward] - len(lines)]
+            frac_start, frac_end = (
+                np.where(is_backward, 1 - frac_end, frac_start),
+                np.where(is_backward, 1 - frac_start, frac_end),
+            )
+
+        split_lines = lines.iloc[row].copy()
+
+        geometries = _line_substrings(
+            lines.geometry.values,
+            row,
+            start=frac_start,
+            end=frac_end,
+            normalized=True,
         )
-        del self.network._not_splitted
+        geometries[is_backward] = reverse(geometries[is_backward])
+        split_lines.geometry = geometries
+
+        if "both_ways" in split_lines.columns:
+            split_lines["both_ways"] = False
+
+        split_lines["source"] = edges["source"].values
+        split_lines["target"] = edges["target"].values
+        split_lines[self.rules.weight] = edges[self.rules.weight].values
+        split_lines["splitted"] = 1
+
+        self._split_lines_gdf = split_lines
+
+        return split_lines
+
+    def _get_lines(self, replace_split_lines: bool = False) -> GeoDataFrame:
+        """Returns the network lines with the split lines added if split_lines is True.
+
+        Args:
+            replace_split_lines: If True, the lines that are split are removed, so that
+                they are only represented by the split lines. If False (the default),
+                both the whole and the split lines are kept, like in the graph.
+        """
+        if self._split_edges is None:
+            return self.network.gdf
+
+        lines = self.network.gdf
+
+        if replace_split_lines:
+            is_split = np.isin(np.arange(len(lines)), self._split_edges["row"])
+            lines = lines.iloc[~is_split]
+
+        return gdf_concat([lines, self._get_split_lines()])
 
     def _add_missing_vertices(self):
         """Adds the missing points.
@@ -1065,22 +2231,21 @@ class NetworkAnalysis:
         Nodes that had no nodes within the search_tolerance are added to the graph.
         To not get an error when running the distance calculation.
         """
-        # TODO: either check if any() beforehand, or add fictional edges before
-        # making the graph, to make things faster
-        # (this method took 64.660 out of 500 seconds)
+        vertices_in_graph = set(self.graph.vs["name"])
+
         self.graph.add_vertices(
             [
                 idx
-                for idx in self.origins.gdf["temp_idx"]
-                if idx not in self.graph.vs["name"]
+                for idx in self.origins.vertices["temp_vertex"]
+                if idx not in vertices_in_graph
             ]
         )
         if self.destinations is not None:
             self.graph.add_vertices(
                 [
                     idx
-                    for idx in self.destinations.gdf["temp_idx"]
-                    if idx not in self.graph.vs["name"]
+                    for idx in self.destinations.vertices["temp_vertex"]
+                    if idx not in vertices_in_graph
                 ]
             )
 
@@ -1089,14 +2254,20 @@ class NetworkAnalysis:
         edges: list[tuple[str, ...]] | np.ndarray[tuple[str, ...]],
         weights: list[float] | np.ndarray[float],
         directed: bool,
+        edge_ids: list[str] | None = None,
     ) -> Graph:
-        """Creates an igraph Graph from a list of edges and weights."""
+        """Creates an igraph Graph from a list of edges and weights.
+
+        The edge ids are made from the edges and weights if not given.
+        """
         assert len(edges) == len(weights)
 
         graph = igraph.Graph.TupleList(edges, directed=directed)
 
         graph.es["weight"] = weights
-        graph.es["source_target_weight"] = _edge_ids(edges, weights)
+        graph.es["source_target_weight"] = (
+            edge_ids if edge_ids is not None else _edge_ids(edges, weights)
+        )
         graph.es["edge_tuples"] = edges
         graph.es["source"] = [edge[0] for edge in edges]
         graph.es["target"] = [edge[1] for edge in edges]
@@ -1117,6 +2288,10 @@ class NetworkAnalysis:
         if self.rules._rules_have_changed():
             return False
 
+        network, version = self._network_version
+        if network is not self.network or version != self.network._version:
+            return False
+
         for points in ["origins", "destinations"]:
             if not hasattr(self.wkts, points):
                 return False
@@ -1134,7 +2309,8 @@ class NetworkAnalysis:
         if self.wkts[what] != [geom.wkt for geom in points.geometry]:
             return True
 
-        if not all(x in self.graph.vs["name"] for x in list(points.temp_idx.values)):
+        vertices_in_graph = set(self.graph.vs["name"])
+        if not all(x in vertices_in_graph for x in points.temp_vertex.values):
             return True
 
         return False
@@ -1147,7 +2323,8 @@ class NetworkAnalysis:
         """
         self.wkts = {}
 
-        self.wkts["network"] = [geom.wkt for geom in self.network.gdf.geometry]
+        # the network tracks its own changes, so only the version is stored
+        self._network_version = (self.network, self.network._version)
 
         if not hasattr(self, "origins"):
             return
@@ -1202,3 +2379,54 @@ class NetworkAnalysis:
     def __getitem__(self, item):
         """To be able to write self['origins'] as well as self.origins."""
         return getattr(self, item)
+
+
+_JOB_METHODS = (
+    "od_cost_matrix",
+    "get_route",
+    "get_k_routes",
+    "get_route_frequencies",
+    "service_area",
+)
+
+# the NetworkAnalysis instance of a worker process in run_jobs
+_worker_analysis: NetworkAnalysis | None = None
+
+
+def _init_worker(nwa: NetworkAnalysis) -> None:
+    global _worker_analysis
+    _worker_analysis = nwa
+
+
+def _run_job_in_worker(
+    job: tuple, raise_if_empty: bool
+) -> tuple[DataFrame | GeoDataFrame | None, list[dict], list[dict]]:
+    return _run_job(_worker_analysis, job, raise_if_empty)
+
+
+def _run_job(
+    nwa: NetworkAnalysis, job: tuple, raise_if_empty: bool = True
+) -> tuple[DataFrame | GeoDataFrame | None, list[dict], list[dict]]:
+    """Run one job and return the results, log records and profile records of the job.
+
+    The results are None if no paths were found and 'raise_if_empty' is False.
+    """
+    method, origins, destinations, kwargs = job
+    n_log_rows = len(nwa._log_records)
+    n_records = len(nwa._profiler.records)
+
+    try:
+        if destinations is None:
+            results = getattr(nwa, method)(origins, **kwargs)
+        else:
+            results = getattr(nwa, method)(origins, destinations, **kwargs)
+    except ValueError as e:
+        if raise_if_empty or e.args != (_NO_PATHS_ERROR,):
+            raise
+        results = None
+
+    return (
+        results,
+        nwa._log_records[n_log_rows:],
+        nwa._profiler.records[n_records:],
+    )
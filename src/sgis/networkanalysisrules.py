@@ -58,8 +58,8 @@ class NetworkAnalysisRules:
             to each point will be split in two at the closest part of the line to the
             point. The weight of the split lines are then adjusted to fit the new
             length. Defaults to False because it's faster and doesn't make a huge
-            difference in most cases. Note: the split lines stays with the network
-            until it is re-instantiated.
+            difference in most cases. The lines are only split in the graph, so the
+            network itself is not changed.
         weight_to_nodes_dist: If the weight is 'meters', setting this to True will make
             the edge between origins/destinations and the network count equal to its
             straight line distance.
@@ -0,0 +1,312 @@
+"""Running large network analyses in shards that are saved as they finish.
+
+The origins are split into shards of a fixed number of rows, and the results of each
+shard are written to a parquet file in a local folder. A manifest file in the folder
+keeps track of the finished shards, so that a run that is stopped, for instance by
+a crash or a batch scheduler, can be restarted and will only run the shards that are
+not yet finished.
+
+The module can be run from the command line over parquet files:
+
+    python -m sgis roads.parquet origins.parquet results_folder \\
+        --destinations destinations.parquet --rules rules.json --directed
+"""
+import argparse
+import hashlib
+import json
+import os
+from dataclasses import asdict
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from geopandas import GeoDataFrame
+from pyarrow import parquet
+from shapely import get_coordinates, get_num_coordinates
+
+from ._parquet_sink import ParquetSink
+from .directednetwork import DirectedNetwork
+from .network import Network
+from .networkanalysis import NetworkAnalysis
+from .networkanalysisrules import NetworkAnalysisRules
+
+
+MANIFEST = "manifest.json"
+
+# id column given to the origins and destinations when no id_col is specified, so
+# that the ids are the row numbers of all origins, not of the shard
+_ROW_NUMBER_COL = "_row_number"
+
+# methods that can write their results to parquet chunk by chunk
+_SINK_METHODS = ["od_cost_matrix", "get_route"]
+
+
+def run_in_shards(
+    network: Network,
+    rules: NetworkAnalysisRules,
+    origins: GeoDataFrame,
+    destinations: GeoDataFrame | None,
+    folder: str,
+    *,
+    method: str = "od_cost_matrix",
+    id_col: str | tuple[str, str] | None = None,
+    shard_size: int = 1000,
+    n_jobs: int = 1,
+    **kwargs,
+) -> list[str]:
+    """Runs a network analysis in shards of origins, saving each finished shard.
+
+    The origins are split into shards of 'shard_size' rows, in the order of the
+    rows. The results of each shard are written to a parquet file in 'folder', and
+    the finished shards are recorded in the file 'manifest.json' in the folder.
+    If the folder already has a manifest from an earlier, unfinished run with the
+    same parameters and data, the finished shards are skipped. The data is compared
+    with hashes of the geometries, ids and weights, which are stored in the manifest.
+
+    The graph is made and the points are snapped to the network only once for all
+    shards that are run.
+
+    Args:
+        network: the Network or DirectedNetwork to run the analysis on.
+        rules: the rules of the network analysis.
+        origins: GeoDataFrame of points from where the analysis will start.
+        destinations: GeoDataFrame of points where the analysis will end. None if
+            the method is 'service_area'.
+        folder: path to a local folder to write the shards and manifest to. It is
+            created if it doesn't exist.
+        method: the NetworkAnalysis method to run. Can be 'od_cost_matrix' (default),
+            'get_route', 'get_k_routes', 'get_route_frequencies' or 'service_area'.
+        id_col: optional id column of the origins and destinations, like in the
+            NetworkAnalysis methods. If None, the ids will be the row numbers of all
+            origins and destinations, not only of the shard.
+        shard_size: number of origins in each shard. Defaults to 1000.
+        n_jobs: number of worker processes to run the shards in. Defaults to 1.
+        **kwargs: keyword arguments passed to the method, e.g. 'cutoff' or
+            'breaks'. Must be JSON serializable, since they are stored in the
+            manifest.
+
+    Returns:
+        A list of the paths to the parquet files of the shards, in the order of
+        the origins. Shards without results, i.e. with no routes found, have no
+        file.
+
+    Raises:
+        ValueError: If the folder has a manifest from a run with other parameters
+            or data, or if 'shard_size' is less than 1.
+
+    Examples
+    --------
+    >>> paths = sg.run_in_shards(
+    ...     nw, rules, points, points, "od_results", id_col="idx", cutoff=30
+    ... )
+    >>> od = pd.concat(pd.read_parquet(path) for path in paths)
+
+    If the run stops, calling the function again with the same arguments will only
+    run the shards that were not finished.
+    """
+    if shard_size < 1:
+        raise ValueError(f"'shard_size' must be a positive integer, got {shard_size}")
+
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    origin_col, destination_col = id_col if isinstance(id_col, tuple) else [id_col] * 2
+
+    run = {
+        "method": method,
+        "kwargs": kwargs,
+        "id_col": list(id_col) if isinstance(id_col, tuple) else id_col,
+        "shard_size": shard_size,
+        "n_origins": len(origins),
+        "n_destinations": len(destinations) if destinations is not None else None,
+        "rules": asdict(rules),
+        "directed": network._as_directed,
+        "network_hash": _hash_data(
+            network.gdf, [rules.weight, "both_ways", "minutes_backward"]
+        ),
+        "origins_hash": _hash_data(origins, [origin_col]),
+        "destinations_hash": _hash_data(destinations, [destination_col]),
+    }
+    manifest = _read_manifest(folder, run)
+
+    if id_col is None:
+        id_col = _ROW_NUMBER_COL
+        origins = origins.assign(**{id_col: np.arange(len(origins))})
+        if destinations is not None:
+            destinations = destinations.assign(**{id_col: np.arange(len(destinations))})
+
+    n_shards = int(np.ceil(len(origins) / shard_size))
+    unfinished = [
+        i
+        for i in range(n_shards)
+        if str(i) not in manifest["shards"]
+        or not _shard_is_saved(folder, manifest["shards"][str(i)])
+    ]
+
+    jobs = []
+    for i in unfinished:
+        shard = origins.iloc[i * shard_size : (i + 1) * shard_size]
+        job_kwargs = kwargs | {"id_col": id_col}
+        if method in _SINK_METHODS:
+            job_kwargs["sink"] = str(_temp_path(folder, i))
+        jobs.append((method, shard, destinations, job_kwargs))
+
+    if jobs:
+        nwa = NetworkAnalysis(network=network, rules=rules)
+
+        for i, results in zip(
+            unfinished, nwa.iter_jobs(jobs, n_jobs=n_jobs, raise_if_empty=False)
+        ):
+            manifest["shards"][str(i)] = _save_shard(folder, i, results)
+            _write_json(manifest, folder / MANIFEST)
+
+    return [
+        str(folder / manifest["shards"][str(i)]["file"])
+        for i in range(n_shards)
+        if manifest["shards"][str(i)]["file"] is not None
+    ]
+
+
+def _read_manifest(folder: Path, run: dict) -> dict:
+    """Read the manifest of an earlier run, or make a new one with no shards."""
+    path = folder / MANIFEST
+    if not path.exists():
+        manifest = run | {"shards": {}}
+        _write_json(manifest, path)
+        return manifest
+
+    with open(path) as file:
+        manifest = json.load(file)
+
+    # dump and load to compare the parameters like they are stored in the manifest
+    run = json.loads(json.dumps(run))
+    different = [key for key, value in run.items() if manifest.get(key) != value]
+    if different:
+        raise ValueError(
+            f"The folder {folder} has a manifest from a run with other {different}. "
+            "Use another folder, or remove the manifest and shards to start over."
+        )
+
+    return manifest
+
+
+def _hash_data(gdf: GeoDataFrame | None, columns: list[str | None]) -> str | None:
+    """Hash of the coordinates of the geometries and the values of the columns.
+
+    The hash is made with hashlib, since Python's built-in hash of strings and bytes
+    is different in each process.
+    """
+    if gdf is None:
+        return None
+
+    digest = hashlib.sha256()
+    digest.update(get_num_coordinates(gdf.geometry.values).tobytes())
+    digest.update(get_coordinates(gdf.geometry.values).tobytes())
+
+    columns = [col for col in columns if col in gdf.columns]
+    if columns:
+        hashes = pd.util.hash_pandas_object(gdf[columns], index=False)
+        digest.update(hashes.values.tobytes())
+
+    return digest.hexdigest()
+
+
+def _shard_is_saved(folder: Path, shard: dict) -> bool:
+    return shard["file"] is None or (folder / shard["file"]).exists()
+
+
+def _temp_path(folder: Path, i: int) -> Path:
+    return folder / f"shard_{i:05d}.parquet.tmp"
+
+
+def _save_shard(folder: Path, i: int, results) -> dict:
+    """Move the written shard, or write the results, to the shard's final file.
+
+    The file is written under a temporary name and then renamed, so that a shard
+    file is never half-written if the run is stopped.
+    """
+    temp_path = _temp_path(folder, i)
+
+    if results is not None:
+        with ParquetSink(str(temp_path)) as writer:
+            writer.write(results)
+
+    if not temp_path.exists():
+        return {"file": None, "rows": 0}
+
+    file = f"shard_{i:05d}.parquet"
+    rows = parquet.ParquetFile(temp_path).metadata.num_rows
+    os.replace(temp_path, folder / file)
+
+    return {"file": file, "rows": rows}
+
+
+def _write_json(manifest: dict, path: Path) -> None:
+    temp_path = path.with_name(path.name + ".tmp")
+    with open(temp_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temp_path, path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line entry point of run_in_shards over parquet files."""
+    parser = argparse.ArgumentParser(
+        prog="python -m sgis",
+        description=(
+            "Run a network analysis in shards of origins, saving each finished "
+            "shard, so that a stopped run can be restarted from where it stopped."
+        ),
+    )
+    parser.add_argument("network", help="parquet file with the network lines")
+    parser.add_argument("origins", help="parquet file with the origin points")
+    parser.add_argument("folder", help="folder to write the shards and manifest to")
+    parser.add_argument(
+        "--destinations",
+        help="parquet file with the destination points. Not used for service_area",
+    )
+    parser.add_argument(
+        "--rules",
+        required=True,
+        help="JSON file with the keyword arguments of NetworkAnalysisRules",
+    )
+    parser.add_argument("--method", default="od_cost_matrix")
+    parser.add_argument("--id-col", help="id column of origins and destinations")
+    parser.add_argument("--shard-size", type=int, default=1000)
+    parser.add_argument("--n-jobs", type=int, default=1)
+    parser.add_argument(
+        "--kwargs",
+        default="{}",
+        help="JSON string with keyword arguments to the method, e.g. '{\"cutoff\": 30}'",
+    )
+    parser.add_argument(
+        "--directed",
+        action="store_true",
+        help="the network is directed, e.g. made with make_directed_network",
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.rules) as file:
+        rules = NetworkAnalysisRules(**json.load(file))
+
+    lines = gpd.read_parquet(args.network)
+    network = DirectedNetwork(lines) if args.directed else Network(lines)
+
+    origins = gpd.read_parquet(args.origins)
+    destinations = (
+        gpd.read_parquet(args.destinations) if args.destinations is not None else None
+    )
+
+    paths = run_in_shards(
+        network,
+        rules,
+        origins,
+        destinations,
+        args.folder,
+        method=args.method,
+        id_col=args.id_col,
+        shard_size=args.shard_size,
+        n_jobs=args.n_jobs,
+        **json.loads(args.kwargs),
+    )
+    print(f"{len(paths)} shards in {args.folder}")
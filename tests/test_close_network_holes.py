@@ -4,10 +4,54 @@ from pathlib import Path
 from time import perf_counter
 
 import geopandas as gpd
+from shapely.geometry import LineString
 
 import sgis as sg
 
 
+def test_close_network_holes_known_gaps():
+    lines = gpd.GeoDataFrame(
+        geometry=[
+            # two deadends two meters apart
+            LineString([(0, 0), (10, 0)]),
+            LineString([(12, 0), (22, 0)]),
+            # a deadend three meters from a node that is not a deadend
+            LineString([(30, 0), (40, 0)]),
+            LineString([(40, 0), (50, 0)]),
+            LineString([(40, 20), (40, 3)]),
+        ],
+        crs=25833,
+    )
+
+    def new_lines(**kwargs):
+        holes = sg.close_network_holes(lines.copy(), max_dist=5, **kwargs)
+        assert (holes.hole == 0).sum() == len(lines)
+        return sorted(holes.loc[holes.hole == 1].geometry.to_wkt())
+
+    # the gap between the deadends is closed both ways
+    assert new_lines(deadends_only=True) == [
+        "LINESTRING (10 0, 12 0)",
+        "LINESTRING (12 0, 10 0)",
+    ]
+
+    # the deadend can also be connected to a node that is not a deadend, but only
+    # one way
+    assert new_lines(deadends_only=False) == [
+        "LINESTRING (10 0, 12 0)",
+        "LINESTRING (12 0, 10 0)",
+        "LINESTRING (40 3, 40 0)",
+    ]
+
+    assert new_lines(deadends_only=False, min_dist=2.5) == ["LINESTRING (40 3, 40 0)"]
+
+    # the new lines get the node ids of the nodes they connect
+    nw = sg.Network(lines).close_network_holes(5, fillna=0, deadends_only=False)
+    holes = nw.gdf.loc[nw.gdf.hole == 1]
+    assert (holes.source != holes.target).all()
+    old_nodes = nw.gdf.loc[nw.gdf.hole == 0, ["source", "target"]].stack()
+    assert holes[["source", "target"]].isin(old_nodes.values).all().all()
+
+
 def test_close_network_holes(roads_oslo, points_oslo):
     warnings.filterwarnings(action="ignore", category=UserWarning)
     warnings.filterwarnings(action="ignore", category=FutureWarning)
@@ -42,6 +86,7 @@ def test_close_network_holes(roads_oslo, points_oslo):
 def main():
     from oslo import points_oslo, roads_oslo
 
+    test_close_network_holes_known_gaps()
     test_close_network_holes(roads_oslo(), points_oslo())
 
 
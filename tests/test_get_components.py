@@ -3,10 +3,46 @@ from pathlib import Path
 from time import perf_counter
 
 import geopandas as gpd
+from shapely.geometry import LineString
 
 import sgis as sg
 
 
+def test_component_sizes():
+    lines = gpd.GeoDataFrame(
+        geometry=[
+            # a chain of three lines with four nodes
+            LineString([(0, 0), (1, 0)]),
+            LineString([(1, 0), (2, 0)]),
+            LineString([(2, 0), (3, 0)]),
+            # a self-loop in the chain
+            LineString([(3, 0), (3, 1), (4, 1), (3, 0)]),
+            # an isolated line with two nodes
+            LineString([(10, 10), (11, 10)]),
+            # an isolated self-loop
+            LineString([(20, 20), (20, 21), (21, 21), (20, 20)]),
+        ],
+        crs=25833,
+    )
+
+    # the self-loops start and end in the same node, and are removed
+    sizes = sg.get_component_size(lines.copy())
+    assert list(sizes.index) == [0, 1, 2, 4]
+    assert list(sizes.component_size) == [4, 4, 4, 2]
+
+    largest = sg.get_largest_component(lines.copy())
+    assert list(largest.connected) == [1, 1, 1, 0]
+
+    nw = sg.Network(lines).get_component_size()
+    assert list(nw.gdf.component_size) == [4, 4, 4, 2]
+
+    # existing node ids are used, so the isolated line can be joined to the chain
+    lines, _ = sg.make_node_ids(lines)
+    lines.loc[4, "source"] = lines.loc[0, "source"]
+    sizes = sg.get_component_size(lines)
+    assert list(sizes.component_size) == [5, 5, 5, 5]
+
+
 def not_test_get_components(roads_oslo, points_oslo):
     p = points_oslo
     p["idx"] = p.index
@@ -38,6 +74,7 @@ def not_test_get_components(roads_oslo, points_oslo):
 def main():
     from oslo import points_oslo, roads_oslo
 
+    test_component_sizes()
     not_test_get_components(roads_oslo(), points_oslo())
 
 
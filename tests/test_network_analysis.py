@@ -1,5 +1,7 @@
 # %%
 import sys
+import tempfile
+import tracemalloc
 import warnings
 from pathlib import Path
 
@@ -78,6 +80,137 @@ def test_network_analysis(points_oslo, roads_oslo):
         od = nwa.od_cost_matrix(p, p, rowwise=True)
         assert len(od) == len(p)
 
+        # the matrix formats hold the same costs as the long format
+        od = nwa.od_cost_matrix(p, p, id_col="idx", cutoff=5)
+        matrix, ori_ids, des_ids = nwa.od_cost_matrix(
+            p, p, id_col="idx", cutoff=5, output="sparse"
+        )
+        assert matrix.shape == (len(p), len(p))
+        assert matrix.nnz == len(od)
+        assert list(ori_ids) == list(p.idx)
+        matrix, _, _ = nwa.od_cost_matrix(p, p, id_col="idx", output="array")
+        assert matrix.dtype == np.float32
+        assert np.isclose(np.nanmean(matrix), nwa.log["cost_mean"].iloc[-1])
+
+        # without id_col, the ids are the row numbers, like in the long format
+        od = nwa.od_cost_matrix(p, p.iloc[:5], destination_count=2)
+        matrix, ori_ids, des_ids = nwa.od_cost_matrix(
+            p, p.iloc[:5], destination_count=2, output="sparse"
+        )
+        assert list(ori_ids) == list(range(len(p)))
+        assert list(des_ids) == list(range(5))
+        sparse = matrix.tocoo()
+        assert np.allclose(
+            od.set_index(["origin", "destination"])[nwa.rules.weight]
+            .sort_index()
+            .values,
+            pd.Series(
+                sparse.data,
+                index=pd.MultiIndex.from_arrays(
+                    [ori_ids[sparse.row], des_ids[sparse.col]]
+                ),
+            )
+            .sort_index()
+            .values,
+        )
+
+        # writing to parquet in chunks gives the same results
+        with tempfile.TemporaryDirectory() as folder:
+            path = str(Path(folder) / "od.parquet")
+            assert nwa.od_cost_matrix(p, p, id_col="idx", sink=path) is None
+            od = nwa.od_cost_matrix(p, p, id_col="idx")
+            assert pd.read_parquet(path).equals(od)
+            # the log quantiles are estimated in one pass, within 0.1 percent
+            assert np.isclose(
+                nwa.log["cost_median"].iloc[-1],
+                od[nwa.rules.weight].median(),
+                rtol=1e-3,
+            )
+
+            path = str(Path(folder) / "routes.parquet")
+            nwa.get_route(p.iloc[[0]], p, id_col="idx", sink=path)
+            sp = nwa.get_route(p.iloc[[0]], p, id_col="idx")
+            assert np.isclose(gpd.read_parquet(path).length.sum(), sp.length.sum())
+
+        # the jobs are run with one graph for all points, with the same results
+        od = nwa.od_cost_matrix(p, p.iloc[:10], id_col="idx")
+        sa = nwa.service_area(p.iloc[:3], breaks=5, id_col="idx")
+        od_job, sa_job = nwa.run_jobs(
+            [
+                ("od_cost_matrix", p, p.iloc[:10], {"id_col": "idx"}),
+                ("service_area", p.iloc[:3], None, {"breaks": 5, "id_col": "idx"}),
+            ]
+        )
+        assert np.allclose(
+            od_job[nwa.rules.weight], od[nwa.rules.weight], equal_nan=True
+        )
+        assert len(sa_job) == len(sa)
+        assert list(nwa.log["job"].iloc[-2:]) == [0, 1]
+
+        # running in shards gives the same results. Resuming is tested in test_runner
+        with tempfile.TemporaryDirectory() as folder:
+            paths = sg.run_in_shards(
+                nwa.network,
+                nwa.rules,
+                p,
+                p.iloc[:10],
+                folder,
+                id_col="idx",
+                shard_size=7,
+            )
+            od_shards = pd.concat([pd.read_parquet(path) for path in paths])
+            assert len(paths) == int(np.ceil(len(p) / 7))
+            assert np.allclose(
+                od_shards.sort_values(["origin", "destination"])[nwa.rules.weight],
+                od.sort_values(["origin", "destination"])[nwa.rules.weight],
+                equal_nan=True,
+            )
+
+        # fewer destinations than origins means searching backwards from the
+        # destinations, which should give the same costs
+        od = nwa.od_cost_matrix(p, p, id_col="idx")
+        od_few = nwa.od_cost_matrix(p, p.iloc[:3], id_col="idx")
+        assert nwa.log["search_from"].iloc[-1] == "destinations"
+        od = od.loc[od.destination.isin(p.idx.iloc[:3])]
+        assert np.allclose(
+            od.sort_values(["origin", "destination"])[nwa.rules.weight],
+            od_few.sort_values(["origin", "destination"])[nwa.rules.weight],
+            equal_nan=True,
+        )
+
+        # with a memory_limit, the origins are run in chunks with the same results
+        od = nwa.od_cost_matrix(p, p, id_col="idx")
+        sa = nwa.service_area(p, breaks=5, id_col="idx")
+        nwa.memory_limit = 100_000
+        od_chunked = nwa.od_cost_matrix(p, p, id_col="idx")
+        assert np.allclose(
+            od_chunked[nwa.rules.weight], od[nwa.rules.weight], equal_nan=True
+        )
+        nwa.memory_limit = 2_000_000
+        sa_chunked = nwa.service_area(p, breaks=5, id_col="idx")
+        assert np.isclose(sa_chunked.length.sum(), sa.length.sum())
+        nwa.memory_limit = 1
+        try:
+            nwa.od_cost_matrix(p, p)
+            raise AssertionError("should raise MemoryLimitError")
+        except sg.exceptions.MemoryLimitError:
+            pass
+        nwa.memory_limit = None
+
+        # the progress_hook is called per chunk of origins, and can cancel the run
+        progress = []
+        nwa.progress_hook = progress.append
+        sa_progress = nwa.service_area(p, breaks=5, id_col="idx")
+        assert np.isclose(sa_progress.length.sum(), sa.length.sum())
+        assert progress[-1]["origins_done"] == progress[-1]["origins_total"] == len(p)
+        nwa.progress_hook = lambda progress: progress["origins_done"] >= 1
+        nwa.memory_limit = 100_000
+        od_partial = nwa.od_cost_matrix(p, p, id_col="idx")
+        assert 0 < od_partial["origin"].nunique() < len(p)
+        assert nwa.log["cancelled"].iloc[-1]
+        nwa.progress_hook = None
+        nwa.memory_limit = None
+
         ### GET ROUTE
 
         sp = nwa.get_route(p, p, id_col="idx")
@@ -197,6 +330,51 @@ def test_network_analysis(points_oslo, roads_oslo):
 
     run_analyses(nwa, p)
 
+    # profiling records the stages of each run and passes the records to the hook
+    records = []
+    nwa = sg.NetworkAnalysis(nw, rules=rules, profile=True, profile_hook=records.append)
+    nwa.od_cost_matrix(p, p)
+    nwa.service_area(p.iloc[:3], breaks=5)
+    assert list(nwa.profile["method"]) == ["od_cost_matrix", "service_area"]
+    assert len(records) == 2
+    assert (nwa.profile["search_seconds"] <= nwa.profile["seconds"]).all()
+    assert (nwa.profile[["vertices", "edges", "sources", "reached"]] > 0).all().all()
+
+    # a run that fails is not recorded, and the memory tracing is stopped
+    nwa.memory_limit = 1
+    try:
+        nwa.od_cost_matrix(p, p)
+        raise AssertionError("should raise MemoryLimitError")
+    except sg.exceptions.MemoryLimitError:
+        pass
+    assert not tracemalloc.is_tracing()
+    assert len(records) == 2
+
+    # pruning the dead ends without points should give a smaller graph, same costs
+    od = sg.NetworkAnalysis(nw, rules=rules).od_cost_matrix(p, p)
+    nwa = sg.NetworkAnalysis(nw, rules=rules, profile=True, prune_deadends=True)
+    od_pruned = nwa.od_cost_matrix(p, p)
+    assert (
+        od.minutes.round(6).fillna(-1) == od_pruned.minutes.round(6).fillna(-1)
+    ).all()
+    assert nwa.profile["vertices"].iloc[-1] < records[0]["vertices"]
+
+    # storing the two-way roads once should give fewer rows, same costs and routes
+    nw_once = (
+        sg.DirectedNetwork(r)
+        .make_directed_network_norway(duplicate_both_ways=False)
+        .remove_isolated()
+    )
+    assert len(nw_once.gdf) < len(nw.gdf)
+    assert nw_once.percent_bidirectional == nw.percent_bidirectional
+    nwa = sg.NetworkAnalysis(nw_once, rules=rules)
+    od_once = nwa.od_cost_matrix(p, p)
+    assert (od.minutes.round(6).fillna(-1) == od_once.minutes.round(6).fillna(-1)).all()
+    route = sg.NetworkAnalysis(nw, rules=rules).get_route(p.iloc[[0]], p.iloc[1:10])
+    route_once = nwa.get_route(p.iloc[[0]], p.iloc[1:10])
+    assert (route.minutes.round(6) == route_once.minutes.round(6)).all()
+    run_analyses(nwa, p)
+
 
 def main():
     """
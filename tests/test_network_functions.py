@@ -38,6 +38,17 @@ def test_network_functions(points_oslo, roads_oslo):
     print(holes_closed.hole.value_counts())
     sg.qtm(holes_closed, column="hole", title="holes, deadends_only")
 
+    points = sg.clean_clip(points_oslo, p.buffer(1000))
+    splitted = sg.split_lines_at_closest_point(r, points, max_dist=100)
+    assert splitted.splitted.sum() > 0
+    assert round(splitted.length.sum(), 3) == round(r.length.sum(), 3)
+
+    # the split points are the endpoints of the parts of the split lines
+    splitted, nodes = sg.make_node_ids(splitted)
+    snapped = sg.snap_to(points, r, max_dist=100).dropna(subset="snap_distance")
+    snapped = snapped[["geometry"]]
+    assert sg.snap_to(snapped, nodes, max_dist=1e-6).snap_distance.notna().all()
+
 
 def main():
     from oslo import points_oslo, roads_oslo
@@ -3,6 +3,8 @@ import sys
 from pathlib import Path
 
 import geopandas as gpd
+import numpy as np
+from shapely import get_coordinates
 
 
 src = str(Path(__file__).parent).strip("tests") + "src"
@@ -23,6 +25,20 @@ def test_network_methods(points_oslo, roads_oslo):
     nw1 = sg.Network(r).get_largest_component()
     sg.qtm(nw1.gdf, column="connected", scheme="equalinterval", title="connected")
 
+    # the snapping results are cached, and should be the same when looked up again
+    coords = get_coordinates(points.geometry.values)
+    candidates = nw1._get_node_candidates(
+        coords, search_tolerance=250, search_factor=10
+    )
+    cached = nw1._get_node_candidates(
+        coords[::-1], search_tolerance=250, search_factor=10
+    )
+    assert len(nw1._snap_cache[(250, 10)]["keys"]) == len(
+        points.drop_duplicates("geometry")
+    )
+    assert len(cached[0]) == len(candidates[0])
+    assert set(cached[1]) == set(candidates[1])
+
     len_now = len(nw1.gdf)
 
     nw = nw1.copy().remove_isolated().cut_lines(250)
@@ -33,8 +49,87 @@ def test_network_methods(points_oslo, roads_oslo):
     if (l := max(nw.gdf.length)) > 250 + 1:
         raise ValueError(f"cut_lines did not cut lines. max line length: {l}")
 
+    # the minutes should be divided between the pieces by their length
+    minutes_before = sg.Network(r).gdf.minutes.sum()
+    nw_cut = sg.Network(r).cut_lines(50, adjust_weight_col="minutes")
+    assert round(nw_cut.gdf.minutes.sum(), 3) == round(minutes_before, 3)
+    assert max(nw_cut.gdf.length) <= 50 + 1e-6
+
     sg.qtm(nw.gdf, column="connected", title="after removing isolated")
 
+    # the chains should be merged without changing the lines or the costs
+    nw = sg.Network(r).remove_isolated()
+    simplified = nw.copy().simplify_topology(sum_cols="minutes")
+    assert len(simplified.gdf) < len(nw.gdf)
+    assert round(simplified.gdf.length.sum(), 3) == round(nw.gdf.length.sum(), 3)
+    assert round(simplified.gdf.minutes.sum(), 3) == round(nw.gdf.minutes.sum(), 3)
+
+    rules = sg.NetworkAnalysisRules(weight="meters", split_lines=True, search_factor=0)
+    od = sg.NetworkAnalysis(nw, rules=rules).od_cost_matrix(p, points)
+    od_simplified = sg.NetworkAnalysis(simplified, rules=rules).od_cost_matrix(
+        p, points
+    )
+    assert (od.meters.round(3) == od_simplified.meters.round(3)).all()
+
+    # points on the merged lines should get the costs of the original lines, also
+    # when the weight is not proportional to the length
+    rules = sg.NetworkAnalysisRules(weight="minutes", split_lines=True, search_factor=0)
+    for network in [
+        sg.Network(r).remove_isolated(),
+        sg.DirectedNetwork(r).remove_isolated().make_directed_network_norway(),
+        sg.DirectedNetwork(r)
+        .remove_isolated()
+        .make_directed_network_norway(duplicate_both_ways=False),
+    ]:
+        od = sg.NetworkAnalysis(network.copy(), rules=rules).od_cost_matrix(p, points)
+        network = network.simplify_topology(sum_cols="minutes")
+        od_simplified = sg.NetworkAnalysis(network, rules=rules).od_cost_matrix(
+            p, points
+        )
+        assert np.allclose(od.minutes, od_simplified.minutes, equal_nan=True)
+
+    rules = sg.NetworkAnalysisRules(weight="meters", split_lines=True, search_factor=0)
+
+    # the same points as origins and destinations give symmetric costs, which are
+    # only searched one way. This should give the same costs as searching all pairs
+    nwa = sg.NetworkAnalysis(nw, rules=rules)
+    od = nwa.od_cost_matrix(points, points)
+    od_full = nwa.od_cost_matrix(points, points.iloc[::-1])
+    od_full["destination"] = len(points) - 1 - od_full["destination"]
+    od_full = od_full.sort_values(["origin", "destination"])
+    assert np.allclose(od.meters, od_full.meters, equal_nan=True)
+
+    matrix_full, _, _ = nwa.od_cost_matrix(points, points.iloc[::-1], output="array")
+    expected = np.where(matrix_full[:, ::-1] < 500, matrix_full[:, ::-1], np.nan)
+
+    # a memory_limit of about five origins at a time, so the origins are chunked
+    nwa.memory_limit = 150 * len(points) * 5
+    for output in ["array", "sparse"]:
+        matrix, _, _ = nwa.od_cost_matrix(points, points, output=output, cutoff=500)
+        if output == "sparse":
+            sparse = matrix.tocoo()
+            matrix = np.full(sparse.shape, np.nan)
+            matrix[sparse.row, sparse.col] = sparse.data
+        assert np.allclose(matrix, expected, equal_nan=True)
+
+    # the graph of an undirected network has one undirected edge per line, while
+    # run_jobs gives the lines both directions, so the points cannot be passed
+    # through. This can only make the costs higher
+    nwa = sg.NetworkAnalysis(nw, rules=sg.NetworkAnalysisRules(weight="meters"))
+    od = nwa.od_cost_matrix(p, points)
+    assert not nwa.graph.is_directed()
+    assert nwa.graph.ecount() < len(nw.gdf) * 2
+    (od_job,) = nwa.run_jobs([("od_cost_matrix", p, points)])
+    assert nwa.graph.is_directed()
+    assert nwa.graph.ecount() > len(nw.gdf) * 2
+    assert ((od_job.meters - od.meters).dropna() > -1e-6).all()
+
+    # the service areas should have the original lines
+    sa = sg.NetworkAnalysis(simplified, rules=rules).service_area(
+        p, breaks=500, dissolve=False
+    )
+    assert sa.geometry.isin(nw.gdf.geometry).mean() > 0.5
+
     holes_closed = sg.Network(r).close_network_holes(10.1, fillna=0).gdf
     print(holes_closed.hole.value_counts())
     sg.qtm(holes_closed, column="hole", title="holes")
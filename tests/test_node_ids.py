@@ -23,8 +23,19 @@ def test_node_ids(points_oslo, roads_oslo):
 
     r, nodes = sg.make_node_ids(r)
     print(nodes)
+    assert "source_wkt" in r.columns and "wkt" in nodes.columns
     r, nodes = sg.make_node_ids(r, wkt=False)
     print(nodes)
+    assert r["source"].dtype == r["target"].dtype == nodes["node_id"].dtype == int
+    assert r["source"].max() < len(nodes)
+
+    # endpoints rounded to the same coordinates get the same node id
+    r_snapped, nodes_snapped = sg.make_node_ids(r, tolerance=1)
+    assert len(nodes_snapped) <= len(nodes)
+
+    coords = sg.make_edge_coords_cols(r)
+    assert (coords["source_x"] == coords.geometry.apply(lambda x: x.coords[0][0])).all()
+    assert coords["target_y"].dtype == float
 
     nw = sg.DirectedNetwork(r)
     rules = sg.NetworkAnalysisRules(weight="meters")
@@ -37,6 +48,10 @@ def test_node_ids(points_oslo, roads_oslo):
     nwa.network = nwa.network.remove_isolated()
     nwa.network.gdf["col"] = 1
     nwa.network.gdf = nwa.network.gdf.drop("col", axis=1)
+    # new columns do not change the nodes, but removed rows do
+    assert nwa.network._nodes_are_up_to_date()
+    nwa.network.gdf = nwa.network.gdf.iloc[1:]
+    assert not nwa.network._nodes_are_up_to_date()
 
     nwa.network.gdf = nwa.network.gdf.sjoin(
         sg.buff(p[["geometry"]].sample(1), 2500)
@@ -0,0 +1,175 @@
+# %%
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+src = str(Path(__file__).parent).strip("tests") + "src"
+
+sys.path.insert(0, src)
+
+import sgis as sg
+from sgis import runner
+
+
+def test_runner(points_oslo, roads_oslo):
+    p = points_oslo
+    p = sg.clean_clip(p, p.geometry.iloc[0].buffer(700))
+    p["idx"] = p.index
+
+    r = roads_oslo
+    r = sg.clean_clip(r, p.geometry.iloc[0].buffer(750))
+
+    nw = sg.DirectedNetwork(r).make_directed_network_norway().remove_isolated()
+    rules = sg.NetworkAnalysisRules(weight="minutes")
+
+    od = sg.NetworkAnalysis(nw, rules=rules).od_cost_matrix(
+        p, p.iloc[:10], id_col="idx"
+    )
+
+    def read_shards(paths):
+        return pd.concat(pd.read_parquet(path) for path in paths).sort_values(
+            ["origin", "destination"]
+        )
+
+    def run(folder, network=nw, origins=p, **kwargs):
+        return sg.run_in_shards(
+            network,
+            rules,
+            origins,
+            p.iloc[:10],
+            folder,
+            id_col="idx",
+            **({"shard_size": 7} | kwargs),
+        )
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = run(folder)
+        assert len(paths) == int(np.ceil(len(p) / 7))
+        assert np.allclose(
+            read_shards(paths)["minutes"],
+            od.sort_values(["origin", "destination"])["minutes"],
+            equal_nan=True,
+        )
+
+        with open(Path(folder) / runner.MANIFEST) as file:
+            manifest = json.load(file)
+        assert len(manifest["shards"]) == len(paths)
+
+        # the shards get an old modification time, so the rerun shards can be found
+        for path in paths:
+            os.utime(path, ns=(0, 0))
+
+        # a rerun of a finished run skips all shards
+        assert run(folder) == paths
+        assert all(os.stat(path).st_mtime_ns == 0 for path in paths)
+
+        # after removing a shard, only this shard is run again
+        os.remove(paths[1])
+        assert run(folder) == paths
+        rerun = [path for path in paths if os.stat(path).st_mtime_ns != 0]
+        assert rerun == [paths[1]]
+        assert np.allclose(
+            read_shards(paths)["minutes"],
+            od.sort_values(["origin", "destination"])["minutes"],
+            equal_nan=True,
+        )
+
+        # a run with other parameters, or other data of the same size, cannot
+        # continue from the manifest
+        moved = p.copy()
+        moved.geometry = moved.translate(1)
+        other_ids = p.assign(idx=p["idx"] + 1)
+        slower = nw.copy()
+        slower.gdf = slower.gdf.assign(minutes=slower.gdf["minutes"] * 2)
+
+        for kwargs in [
+            {"shard_size": 5},
+            {"cutoff": 5},
+            {"origins": moved},
+            {"origins": other_ids},
+            {"network": slower},
+        ]:
+            try:
+                run(folder, **kwargs)
+                raise AssertionError("should raise ValueError")
+            except ValueError as e:
+                assert "manifest" in str(e)
+
+        # the shards are unchanged
+        assert run(folder) == paths
+        assert all(os.stat(path).st_mtime_ns == 0 for path in paths if path != paths[1])
+
+    # origins far from the network give a shard without routes, which has no file
+    far_away = p.iloc[:7].copy()
+    far_away.geometry = far_away.translate(100_000)
+    far_away["idx"] = -1 - np.arange(len(far_away))
+    origins = pd.concat([far_away, p], ignore_index=True)
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = sg.run_in_shards(
+            nw,
+            rules,
+            origins,
+            p.iloc[:3],
+            folder,
+            method="get_route",
+            id_col="idx",
+            shard_size=7,
+        )
+        assert len(paths) == int(np.ceil(len(origins) / 7)) - 1
+        with open(Path(folder) / runner.MANIFEST) as file:
+            manifest = json.load(file)
+        assert manifest["shards"]["0"] == {"file": None, "rows": 0}
+
+        routes = read_shards(paths)
+        assert not routes["origin"].isin(far_away["idx"]).any()
+        assert routes["origin"].isin(p["idx"]).all()
+
+    # the command line entry point runs the same analysis from parquet files
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+        nw.gdf.to_parquet(folder / "network.parquet")
+        p.to_parquet(folder / "origins.parquet")
+        p.iloc[:10].to_parquet(folder / "destinations.parquet")
+        with open(folder / "rules.json", "w") as file:
+            json.dump({"weight": "minutes"}, file)
+
+        runner.main(
+            [
+                str(folder / "network.parquet"),
+                str(folder / "origins.parquet"),
+                str(folder / "shards"),
+                "--destinations",
+                str(folder / "destinations.parquet"),
+                "--rules",
+                str(folder / "rules.json"),
+                "--id-col",
+                "idx",
+                "--shard-size",
+                "7",
+                "--directed",
+            ]
+        )
+        paths = sorted((folder / "shards").glob("shard_*.parquet"))
+        assert len(paths) == int(np.ceil(len(p) / 7))
+        assert np.allclose(
+            read_shards(paths)["minutes"],
+            od.sort_values(["origin", "destination"])["minutes"],
+            equal_nan=True,
+        )
+
+
+def main():
+    from oslo import points_oslo, roads_oslo
+
+    test_runner(points_oslo(), roads_oslo())
+
+
+if __name__ == "__main__":
+    main()
@@ -45,7 +45,12 @@ def test_split_lines(points_oslo, roads_oslo):
 
     nwa.rules.split_lines = True
 
+    rows_before = len(nwa.network.gdf)
+
     od = nwa.od_cost_matrix(points, points)
+
+    # the lines should only be split in the graph
+    assert len(nwa.network.gdf) == rows_before
     print(nwa.log[["method", "cost_mean", "percent_missing"]])
     # repeat to see if something dodgy happens
     for _ in range(3):